@@ -0,0 +1,171 @@
+import argparse
+import asyncio
+import csv
+import json
+import logging
+import os
+import time
+import config
+import llm_service
+import pipeline
+import semantic_layer
+import sql_cache
+import startup
+import tracing
+
+logger = logging.getLogger(__name__)
+
+# Result fields written per question; the answer context is left out (it can be large)
+RECORD_FIELDS = ("sql", "columns", "row_count", "rows", "truncated", "path", "answer", "answer_error", "error",
+                 "error_detail", "repair", "result_cached", "shared_execution", "timings")
+
+
+def read_questions(path: str, question_field: str = "question", id_field: str = "id") -> list[dict]:
+    """
+    Questions as [{"id", "question"}] from a CSV file with a header row (by extension)
+    or a JSONL file of objects or plain strings. Without an id field a question is
+    identified by its line or row number, which stays stable between runs for resuming.
+    """
+    if path.lower().endswith(".csv"):
+        with open(path, newline="", encoding="utf-8") as f:
+            entries = [(str(number), row) for number, row in enumerate(csv.DictReader(f), start=1)]
+    else:
+        with open(path, encoding="utf-8") as f:
+            entries = [(str(number), json.loads(line)) for number, line in enumerate(f, start=1) if line.strip()]
+    questions = []
+    for number, entry in entries:
+        if isinstance(entry, str):
+            entry = {question_field: entry}
+        elif not isinstance(entry, dict): # e.g. a number or a list on a JSONL line
+            logger.warning("Skipping entry %s of %s: not an object or a string", number, path)
+            continue
+        question = (entry.get(question_field) or "").strip()
+        if not question:
+            logger.warning("Skipping entry %s of %s: no %r", number, path, question_field)
+            continue
+        questions.append({"id": str(entry.get(id_field) or number), "question": question})
+    return questions
+
+
+def load_checkpoint(output_path: str, retry_errors: bool = False) -> dict:
+    """
+    Records already written to `output_path`, by question id. The file is rewritten
+    without a line torn by an interruption and, with `retry_errors`, without failed
+    records, so those questions are answered again and appended.
+    """
+    if not os.path.exists(output_path):
+        return {}
+    done = {}
+    with open(output_path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue # Cut off mid-write
+            if not (retry_errors and record.get("error")):
+                done[record["id"]] = record
+    temporary = output_path + ".tmp"
+    with open(temporary, "w", encoding="utf-8") as f:
+        for record in done.values():
+            f.write(json.dumps(record, default=str) + "\n")
+    os.replace(temporary, output_path)
+    return done
+
+
+def _record(item: dict, result: dict, duplicate_of: str | None = None) -> dict:
+    return {"id": item["id"], "question": item["question"], "duplicate_of": duplicate_of,
+            **{field: result[field] for field in RECORD_FIELDS}}
+
+
+async def run_batch(questions: list[dict], output_path: str, concurrency: int | None = None, resume: bool = False,
+                    retry_errors: bool = False) -> dict:
+    """
+    Answers `questions` ([{"id", "question"}]) and appends one JSON record per question
+    to `output_path` as soon as it is answered, so the file doubles as the checkpoint:
+    with `resume`, questions already in it are skipped. Questions that are the same
+    after case, whitespace and trailing punctuation are answered once. The distinct
+    ones are embedded together in batchEmbedContents calls, answered at most
+    `concurrency` at a time (default BATCH_CONCURRENCY), and share their executions,
+    so each distinct normalized SQL query runs (and is stored in the vector DB) once.
+    Returns counts for the run.
+    """
+    concurrency = concurrency or config.BATCH_CONCURRENCY
+    started = time.perf_counter()
+    done = load_checkpoint(output_path, retry_errors) if resume else {}
+    pending = [item for item in questions if item["id"] not in done]
+
+    groups = {} # normalized question -> items asking it, the first one answered for all
+    for item in pending:
+        groups.setdefault(sql_cache.normalize_question(item["question"]), []).append(item)
+    distinct = [items[0]["question"] for items in groups.values()]
+    with tracing.span("batch.embed", questions=len(distinct)):
+        embeddings = await llm_service.embed_texts_async(distinct) if distinct else []
+
+    layer = semantic_layer.get_layer() # One version for the whole batch
+    executions = {}
+    semaphore = asyncio.Semaphore(concurrency)
+    counts = {"questions": len(questions), "resumed": len(questions) - len(pending), "answered": 0, "failed": 0,
+              "duplicate_questions": len(pending) - len(groups), "shared_executions": 0}
+
+    with open(output_path, "a" if resume else "w", encoding="utf-8") as output:
+        completed = 0 # Distinct questions done, for progress
+
+        async def answer(items: list[dict], question_embedding):
+            nonlocal completed
+            try:
+                async with semaphore:
+                    result = await pipeline.answer_question_async(
+                        items[0]["question"], layer.prompt_text, schema_index=layer.schema_index,
+                        question_embedding=question_embedding, executions=executions
+                    )
+            except Exception as e: # One question failing must not stop the rest of the batch
+                logger.exception("Question %s failed", items[0]["id"])
+                result = {**dict.fromkeys(RECORD_FIELDS), "error": f"Unexpected error: {type(e).__name__}: {e}",
+                          "shared_execution": False}
+            counts["failed" if result["error"] else "answered"] += len(items)
+            counts["shared_executions"] += result["shared_execution"]
+            for item in items:
+                record = _record(item, result, None if item is items[0] else items[0]["id"])
+                output.write(json.dumps(record, default=str) + "\n")
+            output.flush() # Everything written so far survives an interruption
+            completed += 1
+            logger.info("Answered %s (%d of %d distinct)", items[0]["id"], completed, len(groups))
+
+        await asyncio.gather(*(answer(items, embedding) for items, embedding in zip(groups.values(), embeddings)))
+
+    counts["distinct_sql"] = len(executions)
+    counts["seconds"] = time.perf_counter() - started
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Answer a file of questions and write the results as JSONL")
+    parser.add_argument("input", help="Questions: JSONL (objects or strings) or CSV with a header row")
+    parser.add_argument("output", help="Results, one JSON object per line; also the checkpoint for --resume")
+    parser.add_argument("--question-field", default="question")
+    parser.add_argument("--id-field", default="id", help="Defaults to the line/row number when absent")
+    parser.add_argument("--concurrency", type=int, default=config.BATCH_CONCURRENCY, help="Questions in flight")
+    parser.add_argument("--resume", action="store_true", help="Skip questions already in the output file")
+    parser.add_argument("--retry-errors", action="store_true", help="With --resume, answer failed questions again")
+    args = parser.parse_args()
+
+    tracing.configure_logging()
+    questions = read_questions(args.input, args.question_field, args.id_field)
+    try:
+        status = startup.warmup()["components"]
+    except ValueError as e:
+        raise SystemExit(f"Cannot start: {e}")
+    failed = [f"{name} ({status[name]['error']})" for name in ("semantic_layer", "vector_store", "database")
+              if status[name]["state"] != "ready"]
+    if failed:
+        raise SystemExit(f"Cannot start: {', '.join(failed)}")
+
+    counts = asyncio.run(run_batch(questions, args.output, args.concurrency, args.resume, args.retry_errors))
+    print(f"{counts['questions']} questions: {counts['answered']} answered, {counts['failed']} failed, "
+          f"{counts['resumed']} already in {args.output}; {counts['duplicate_questions']} duplicate questions, "
+          f"{counts['distinct_sql']} distinct SQL queries ({counts['shared_executions']} reused) "
+          f"in {counts['seconds']:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
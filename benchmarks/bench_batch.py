@@ -0,0 +1,130 @@
+"""
+Benchmark: answering a file of questions with batch.py vs one question at a time.
+
+Builds a batch from the corpus in benchmarks/questions.json with three variants
+of every question: the question itself, an exact duplicate differing only in case
+and punctuation, and a rephrasing whose canned SQL is the same query laid out
+differently (equivalent after normalization). Both modes answer it against the
+fake Gemini server and a synthetic database, at the same concurrency and with the
+SQL, embedding and result caches off:
+    per-question  pipeline.answer_question_async for every question
+    batch         batch.run_batch: duplicates answered once, questions embedded
+                  in batchEmbedContents calls, each distinct SQL executed once
+Reports wall time, Gemini requests by endpoint, SQL executions and result sets
+written to the vector DB:
+
+    python benchmarks/bench_batch.py --orders 20000 --latency-ms 20 --concurrency 8
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "utils"))
+
+from fake_gemini_server import start_server
+from run_benchmark import DEFAULT_CORPUS, prepare_database
+
+
+def variants(corpus: list[dict]) -> list[dict]:
+    """Each corpus entry, an exact duplicate of its question and a rephrasing with equivalent SQL."""
+    entries = []
+    for entry in corpus:
+        question = entry["question"]
+        relaid = entry["sql"].rstrip().rstrip(";").replace(" FROM ", "\n  FROM ").replace(" WHERE ", "\n  WHERE ") + ";"
+        entries.append(entry)
+        entries.append({**entry, "question": question.lower().rstrip("?") + "!"})
+        entries.append({**entry, "question": f"For the report: {question}", "sql": relaid})
+    return entries
+
+
+def counters(server, tracing) -> dict:
+    stages = tracing.stats()
+    return {
+        "requests": dict(server.request_counts),
+        "executions": stages.get("execute", {}).get("count", 0),
+        "vector_writes": stages.get("vector.add", {}).get("count", 0),
+    }
+
+
+async def per_question(pipeline, layer, questions: list[dict], concurrency: int) -> int:
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def ask(item):
+        async with semaphore:
+            result = await pipeline.answer_question_async(item["question"], layer.prompt_text,
+                                                          schema_index=layer.schema_index)
+            return result["error"] is None
+
+    return sum(await asyncio.gather(*(ask(item) for item in questions)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Batch mode vs per-question benchmark")
+    parser.add_argument("--orders", type=int, default=20000, help="Orders in the generated database")
+    parser.add_argument("--latency-ms", type=float, default=20.0, help="Fake server latency per request")
+    parser.add_argument("--concurrency", type=int, default=8, help="Questions in flight in both modes")
+    args = parser.parse_args()
+
+    with open(DEFAULT_CORPUS, encoding="utf-8") as f:
+        corpus = variants(json.load(f))
+    workdir = tempfile.mkdtemp(prefix="bench_batch_")
+    database_path = os.path.join(workdir, "bench.db")
+    prepare_database(database_path, args.orders, max(5, args.orders // 10), 42)
+
+    server = start_server(latency_ms=args.latency_ms, corpus=corpus)
+    os.environ.update({
+        "GEMINI_API_BASE_URL": server.base_url,
+        "GOOGLE_API_KEY": os.environ.get("GOOGLE_API_KEY", "fake-key"),
+        "DATABASE_PATH": database_path,
+        "SEMANTIC_LAYER_PATH": os.path.join(ROOT, "data", "semantic_layer.json"),
+        "CHROMA_DB_PATH": os.path.join(workdir, "chroma"),
+        "SQL_CACHE_ENABLED": "false",
+        "EMBED_CACHE_ENABLED": "false",
+        "RESULT_CACHE_ENABLED": "false",
+        "WORKLOAD_LOG_ENABLED": "false",
+        "TRACING_ENABLED": "true",
+        "TRACING_EXPORTERS": "histogram",
+        "LOG_LEVEL": "WARNING",
+    })
+
+    import batch
+    import pipeline
+    import semantic_layer
+    import startup
+    import tracing
+    tracing.configure_logging()
+    startup.warmup()
+    layer = semantic_layer.get_layer()
+    questions = [{"id": str(i), "question": entry["question"]} for i, entry in enumerate(corpus, start=1)]
+    print(f"{len(questions)} questions ({len(corpus) // 3} distinct x 3 variants), {args.orders:,} orders, "
+          f"{args.latency_ms} ms/request, {args.concurrency} in flight\n")
+
+    rows = []
+    for mode in ("per-question", "batch"):
+        server.request_counts.clear()
+        tracing.histogram().clear()
+        start = time.perf_counter()
+        if mode == "batch":
+            counts = asyncio.run(batch.run_batch(questions, os.path.join(workdir, "results.jsonl"), args.concurrency))
+            answered = counts["answered"]
+        else:
+            answered = asyncio.run(per_question(pipeline, layer, questions, args.concurrency))
+        rows.append((mode, time.perf_counter() - start, answered, counters(server, tracing)))
+
+    endpoints = sorted({endpoint for *_, counted in rows for endpoint in counted["requests"]})
+    print(f"{'mode':>13} {'seconds':>8} {'answered':>9} {'executions':>11} {'vector writes':>14} "
+          + " ".join(f"{endpoint:>22}" for endpoint in endpoints))
+    for mode, seconds, answered, counted in rows:
+        print(f"{mode:>13} {seconds:8.2f} {answered:9d} {counted['executions']:11d} {counted['vector_writes']:14d} "
+              + " ".join(f"{counted['requests'].get(endpoint, 0):22d}" for endpoint in endpoints))
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
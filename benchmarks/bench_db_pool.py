@@ -0,0 +1,97 @@
+"""
+Benchmark: queries/sec with the pooled read-only connections in database_service
+versus opening a fresh sqlite3 connection per query (the previous behaviour).
+
+    python benchmarks/bench_db_pool.py --orders 2000 --threads 1,4,8
+"""
+import argparse
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+QUERIES = [
+    "SELECT COUNT(*) FROM orders",
+    "SELECT name FROM customers WHERE state = 'CA'",
+    "SELECT SUM(amount) FROM orders WHERE customer_id = 3",
+    "SELECT c.state, COUNT(*) FROM orders o JOIN customers c ON o.customer_id = c.customer_id GROUP BY c.state",
+    "SELECT order_id, amount FROM orders WHERE order_id = 42",
+]
+
+
+def build_database(path: str, customers: int, orders: int):
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE customers (customer_id INTEGER PRIMARY KEY, name TEXT NOT NULL, state TEXT NOT NULL)")
+    conn.execute('''CREATE TABLE orders (order_id INTEGER PRIMARY KEY, customer_id INTEGER, order_date TEXT NOT NULL,
+                    amount REAL NOT NULL, FOREIGN KEY (customer_id) REFERENCES customers(customer_id))''')
+    rng = random.Random(0)
+    conn.executemany("INSERT INTO customers VALUES (?, ?, ?)",
+                     [(i, f"Customer {i}", rng.choice(["CA", "NY", "TX"])) for i in range(1, customers + 1)])
+    conn.executemany("INSERT INTO orders (customer_id, order_date, amount) VALUES (?, ?, ?)",
+                     [(rng.randint(1, customers), f"2024-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}",
+                       round(rng.uniform(5, 500), 2)) for _ in range(orders)])
+    conn.commit()
+    conn.close()
+
+
+def per_call_connect(sql: str):
+    conn = sqlite3.connect(os.environ["DATABASE_PATH"])
+    try:
+        return conn.execute(sql).fetchall()
+    finally:
+        conn.close()
+
+
+def run(execute, threads: int, per_thread: int) -> float:
+    def worker():
+        for i in range(per_thread):
+            execute(QUERIES[i % len(QUERIES)])
+
+    workers = [threading.Thread(target=worker) for _ in range(threads)]
+    start = time.perf_counter()
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join()
+    return threads * per_thread / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="SQLite connection pool benchmark")
+    parser.add_argument("--customers", type=int, default=500)
+    parser.add_argument("--orders", type=int, default=2000)
+    parser.add_argument("--threads", default="1,4,8")
+    parser.add_argument("--queries", type=int, default=2000, help="Queries per thread")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="bench_db_pool_")
+    os.environ["DATABASE_PATH"] = os.path.join(workdir, "bench.db")
+    build_database(os.environ["DATABASE_PATH"], args.customers, args.orders)
+    os.environ["RESULT_CACHE_ENABLED"] = "false" # Measure SQLite, not the result cache
+
+    import database_service
+
+    def pooled(sql):
+        results, _, error = database_service.execute_sql_query(sql)
+        assert error is None, error
+
+    rows = []
+    for threads in [int(t) for t in args.threads.split(",")]:
+        per_call_qps = run(per_call_connect, threads, args.queries)
+        pooled_qps = run(pooled, threads, args.queries)
+        rows.append((threads, per_call_qps, pooled_qps))
+
+    print(f"{args.customers} customers, {args.orders} orders, {args.queries} queries/thread")
+    print(f"{'threads':>8} {'per-call q/s':>14} {'pooled q/s':>12} {'speedup':>9}")
+    for threads, per_call_qps, pooled_qps in rows:
+        print(f"{threads:>8} {per_call_qps:14.0f} {pooled_qps:12.0f} {pooled_qps / per_call_qps:8.2f}x")
+    print(f"Pool stats: {database_service.pool_stats()}")
+
+
+if __name__ == "__main__":
+    main()
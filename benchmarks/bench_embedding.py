@@ -0,0 +1,67 @@
+"""
+Benchmark: embedding throughput for result rows, per-row embed_text vs batched embed_texts.
+
+Runs entirely against the local fake Gemini server, e.g.
+    python benchmarks/bench_embedding.py --latency-ms 10
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fake_gemini_server import start_server
+
+
+def make_rows(n: int) -> list[str]:
+    states = ["CA", "NY", "TX"]
+    return [
+        f"SQL Result (Query ID: bench, Row {i+1}): customer_id: {i % 500}, state: {states[i % 3]}, amount: {10 + i * 0.5:.2f}"
+        for i in range(n)
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Embedding throughput benchmark")
+    parser.add_argument("--sizes", default="100,1000,10000", help="Comma-separated row counts")
+    parser.add_argument("--latency-ms", type=float, default=10.0, help="Fake server latency per request")
+    parser.add_argument("--serial-limit", type=int, default=1000,
+                        help="Skip the per-row baseline above this many rows (it is slow by design)")
+    args = parser.parse_args()
+
+    server = start_server(latency_ms=args.latency_ms)
+    os.environ["GEMINI_API_BASE_URL"] = server.base_url
+    os.environ.setdefault("GOOGLE_API_KEY", "fake-key")
+
+    import config
+    import llm_service
+
+    print(f"Fake Gemini server at {server.base_url} (latency {args.latency_ms} ms/request)")
+    print(f"Batch size {config.EMBED_BATCH_SIZE}, concurrency {config.EMBED_MAX_CONCURRENCY}\n")
+    print(f"{'rows':>8} {'per-row rows/s':>16} {'batched rows/s':>16} {'speedup':>9}")
+
+    for n in [int(size) for size in args.sizes.split(",")]:
+        rows = make_rows(n)
+
+        serial_rate = None
+        if n <= args.serial_limit:
+            start = time.perf_counter()
+            serial = [llm_service.embed_text(row) for row in rows]
+            serial_rate = n / (time.perf_counter() - start)
+            assert all(e is not None for e in serial)
+
+        start = time.perf_counter()
+        batched = llm_service.embed_texts(rows)
+        batched_rate = n / (time.perf_counter() - start)
+        assert len(batched) == n and all(e is not None for e in batched)
+
+        serial_text = f"{serial_rate:16.1f}" if serial_rate else f"{'skipped':>16}"
+        speedup_text = f"{batched_rate / serial_rate:8.1f}x" if serial_rate else f"{'-':>9}"
+        print(f"{n:>8} {serial_text} {batched_rate:16.1f} {speedup_text}")
+
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""
+Benchmark: the shared async Gemini client against the local fake server.
+
+Reports
+  * sequential latency: new connection per call vs the shared keep-alive client
+  * throughput of concurrent generate_sql_async calls under the concurrency limit
+  * success rate with injected 503s, with retries disabled vs enabled
+
+    python benchmarks/bench_gemini_client.py --latency-ms 20 --error-rate 0.2
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx
+from fake_gemini_server import start_server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Gemini client benchmark")
+    parser.add_argument("--latency-ms", type=float, default=20.0)
+    parser.add_argument("--error-rate", type=float, default=0.2)
+    parser.add_argument("--calls", type=int, default=200)
+    args = parser.parse_args()
+
+    server = start_server(latency_ms=args.latency_ms)
+    os.environ["GEMINI_API_BASE_URL"] = server.base_url
+    os.environ.setdefault("GOOGLE_API_KEY", "fake-key")
+    os.environ["SQL_CACHE_ENABLED"] = "false"
+    os.environ["EMBED_CACHE_ENABLED"] = "false"
+    os.environ["GEMINI_BACKOFF_BASE_SECONDS"] = "0.01"
+
+    import logging
+    import config
+    import llm_service
+    from gemini_client import client
+
+    logging.disable(logging.CRITICAL) # Injected 503s are logged as retries and failures
+    try:
+        url = llm_service.GEMINI_EMBED_URL.format(model=llm_service.EMBEDDING_MODEL_NAME) + "?key=fake"
+        body = {"content": {"parts": [{"text": "How many orders are there?"}]}}
+        sequential = 50
+
+        start = time.perf_counter()
+        for _ in range(sequential):
+            with httpx.Client() as one_shot: # What a session-less requests.post does
+                one_shot.post(url, json=body)
+        fresh_ms = (time.perf_counter() - start) / sequential * 1000
+
+        llm_service.embed_text("warm up the shared client")
+        start = time.perf_counter()
+        for _ in range(sequential):
+            llm_service._call_gemini_api(url.split("?")[0], body)
+        shared_ms = (time.perf_counter() - start) / sequential * 1000
+
+        async def burst(n):
+            results = await asyncio.gather(*(
+                llm_service.generate_sql_async(f"question {i}", "schema", use_cache=False) for i in range(n)
+            ))
+            return sum(1 for r in results if r)
+
+        start = time.perf_counter()
+        asyncio.run(burst(args.calls))
+        burst_elapsed = time.perf_counter() - start
+
+        server.error_rate = args.error_rate
+        success = {}
+        for retries in (0, config.GEMINI_MAX_RETRIES or 3):
+            config.GEMINI_MAX_RETRIES = retries
+            success[retries] = asyncio.run(burst(args.calls)) / args.calls
+    finally:
+        logging.disable(logging.NOTSET)
+
+    print(f"Fake server latency {args.latency_ms} ms, concurrency limit {config.GEMINI_MAX_CONCURRENCY}")
+    print(f"Sequential call latency: new connection {fresh_ms:.2f} ms, shared client {shared_ms:.2f} ms")
+    print(f"{args.calls} concurrent generate_sql_async calls: {burst_elapsed:.2f}s ({args.calls / burst_elapsed:.0f} calls/s)")
+    for retries, rate in success.items():
+        print(f"Success rate with {args.error_rate:.0%} injected 503s, max_retries={retries}: {rate:.1%}")
+    print(f"Client stats: {client.stats()}")
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
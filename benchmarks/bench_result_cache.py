@@ -0,0 +1,117 @@
+"""
+Benchmark: database time per request with and without the query result cache
+under dashboard-style traffic.
+
+A fixed set of dashboard queries (a few templates x parameter values) is drawn
+with a Zipf-like skew, in randomly re-formatted variants (case, whitespace,
+trailing semicolon) as different phrasings of a question would produce. Every
+--write-every requests a separate connection commits an insert, which must
+invalidate the cache; the cached run checks every result against an uncached one.
+
+    python benchmarks/bench_result_cache.py --orders 200000 --requests 5000 --write-every 500
+"""
+import argparse
+import os
+import random
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_db_pool import build_database
+
+TEMPLATES = [
+    "SELECT COUNT(*), SUM(amount) FROM orders WHERE order_date LIKE '2024-{month:02d}-%'",
+    "SELECT name FROM customers WHERE state = '{state}' ORDER BY name LIMIT 20",
+    "SELECT c.state, SUM(o.amount) FROM orders o JOIN customers c ON o.customer_id = c.customer_id "
+    "WHERE o.order_date >= '2024-{month:02d}-01' GROUP BY c.state",
+    "SELECT customer_id, SUM(amount) AS total FROM orders GROUP BY customer_id ORDER BY total DESC LIMIT 10",
+    "SELECT substr(order_date, 1, 7) AS month, COUNT(*) FROM orders WHERE customer_id % 7 = {bucket} GROUP BY month",
+]
+
+
+def dashboard_queries() -> list[str]:
+    queries = []
+    for template in TEMPLATES:
+        for month in range(1, 13):
+            for state in ("CA", "NY", "TX"):
+                queries.append(template.format(month=month, state=state, bucket=month % 7))
+    return list(dict.fromkeys(queries))
+
+
+def reformat(sql: str, rng: random.Random) -> str:
+    """Same query as another phrasing might generate it: keyword case, spacing and a trailing semicolon vary."""
+    words = []
+    for word in sql.split(" "):
+        if "'" not in word and rng.random() < 0.3:
+            word = word.lower() if word.isupper() else word.upper()
+        words.append(word)
+    return rng.choice([" ", "  ", "\n"]).join(words) + rng.choice(["", ";", " ;"])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Query result cache benchmark")
+    parser.add_argument("--customers", type=int, default=20000)
+    parser.add_argument("--orders", type=int, default=100000)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--write-every", type=int, default=500, help="Commit a write every N requests (0: never)")
+    parser.add_argument("--skew", type=float, default=1.1, help="Zipf exponent of query popularity")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="bench_result_cache_")
+    os.environ["DATABASE_PATH"] = os.path.join(workdir, "bench.db")
+    os.environ["WORKLOAD_LOG_ENABLED"] = "false"
+    build_database(os.environ["DATABASE_PATH"], args.customers, args.orders)
+
+    import config
+    import database_service
+    import result_cache
+
+    queries = dashboard_queries()
+    rng = random.Random(0)
+    weights = [1 / (rank + 1) ** args.skew for rank in range(len(queries))]
+    traffic = [reformat(rng.choices(queries, weights)[0], rng) for _ in range(args.requests)]
+
+    writer = sqlite3.connect(os.environ["DATABASE_PATH"])
+    expected = {}
+    runs = {}
+    try:
+        for enabled in (False, True):
+            config.RESULT_CACHE_ENABLED = enabled
+            timings = []
+            for i, sql in enumerate(traffic):
+                if args.write_every and i and i % args.write_every == 0:
+                    writer.execute("INSERT INTO orders (customer_id, order_date, amount) VALUES (1, '2024-01-15', 1.0)")
+                    writer.commit()
+                start = time.perf_counter()
+                rows, _, error = database_service.execute_sql_query(sql)
+                timings.append(time.perf_counter() - start)
+                assert error is None, error
+                if enabled:
+                    # Same data state as in the uncached run, so the rows must match exactly
+                    assert rows == expected[i], f"stale or wrong result for request {i}: {sql}"
+                else:
+                    expected[i] = rows
+            writer.execute("DELETE FROM orders WHERE order_id > ?", (args.orders,)) # Same data for the next run
+            writer.commit()
+            runs[enabled] = (timings, result_cache.stats() if enabled else None)
+    finally:
+        writer.close()
+
+    print(f"{args.customers} customers, {args.orders} orders, {len(queries)} distinct queries, "
+          f"{args.requests} requests, write every {args.write_every or 'never'}")
+    print(f"{'cache':>6} {'mean ms':>9} {'p50 ms':>9} {'p95 ms':>9} {'total s':>9}")
+    for enabled in (False, True):
+        timings = runs[enabled][0]
+        ordered = sorted(timings)
+        print(f"{'on' if enabled else 'off':>6} {statistics.mean(timings) * 1000:9.3f} "
+              f"{ordered[len(ordered) // 2] * 1000:9.3f} {ordered[int(len(ordered) * 0.95)] * 1000:9.3f} "
+              f"{sum(timings):9.2f}")
+    print(f"Result cache stats: {runs[True][1]}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,185 @@
+"""
+Benchmark: size of stored result rows and answer contexts per row format, and
+embedding calls per result set as rows are grouped into multi-row documents.
+
+Runs the large-result questions of benchmarks/questions.json against a
+synthetic database (generated in a temporary directory unless --database is
+given) and serializes every result set in the original per-row format
+("SQL Result (Query ID: <uuid>, Row i): col: val, ...") and in each row format
+at each chunk size. Reports, per result row:
+    doc bytes / doc tokens   stored document text, i.e. embedding input
+    ctx tokens/row           answer context built from the 5 best documents
+                             (which hold more rows as documents grow)
+and per result set the number of documents (one embedding each) and
+batchEmbedContents requests. Tokens are estimated at ~4 characters per token,
+as for the prompt budgets. With --store, every variant is also written through
+vector_db_service.add_result_batches against the fake Gemini server (in-memory
+backend, embedding cache off) to time it and count the requests actually sent:
+
+    python benchmarks/bench_row_format.py --orders 100000 --chunks 1,5,10,25 --store
+"""
+import argparse
+import json
+import math
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+import uuid
+from datetime import date
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "utils"))
+
+os.environ["TRACING_ENABLED"] = "false"
+os.environ["EMBED_CACHE_ENABLED"] = "false"
+os.environ["VECTOR_BACKEND"] = "memory"
+os.environ["VECTOR_GC_INTERVAL_SECONDS"] = "0"
+os.environ.setdefault("GOOGLE_API_KEY", "fake-key")
+
+QUESTIONS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "questions.json")
+RETRIEVED_DOCUMENTS = 5
+
+
+def legacy_documents(column_names, rows, query_id: str) -> list[str]:
+    """The original vector_db_service document per row."""
+    return [
+        f"SQL Result (Query ID: {query_id}, Row {i + 1}): " + ", ".join(f"{col}: {val}" for col, val in zip(column_names, row))
+        for i, row in enumerate(rows)
+    ]
+
+
+def load_result_sets(database: str, kinds: set[str]) -> list[tuple[str, list[str], list[tuple]]]:
+    with open(QUESTIONS_PATH, encoding="utf-8") as f:
+        questions = [q for q in json.load(f) if q["kind"] in kinds]
+    conn = sqlite3.connect(database)
+    try:
+        result_sets = []
+        for question in questions:
+            cursor = conn.execute(question["sql"])
+            result_sets.append((question["question"], [d[0] for d in cursor.description], cursor.fetchall()))
+        return result_sets
+    finally:
+        conn.close()
+
+
+def measure(estimate_tokens, documents: list[str], rows: int, context: str, context_rows: int, batch_size: int) -> dict:
+    return {
+        "rows": rows,
+        "documents": len(documents),
+        "embed_requests": math.ceil(len(documents) / batch_size) if documents else 0,
+        "document_bytes": sum(len(d.encode("utf-8")) for d in documents),
+        "document_tokens": sum(estimate_tokens(d) for d in documents),
+        "context_rows": context_rows,
+        "context_tokens": estimate_tokens(context),
+    }
+
+
+def variants(formats: list[str], chunks: list[int]) -> list[tuple[str, str | None, int]]:
+    return [("legacy", None, 1)] + [(f"{name} x{size}", name, size) for name in formats for size in chunks]
+
+
+def serialize(result_sets, formats, chunks, float_digits, max_chars, batch_size) -> dict:
+    import row_format
+    from result_summary import estimate_tokens
+
+    totals = {}
+    for label, format_name, rows_per_chunk in variants(formats, chunks):
+        total = {}
+        for _, columns, rows in result_sets:
+            if format_name is None:
+                documents = legacy_documents(columns, rows, str(uuid.uuid4()))
+                context = "\n".join(documents[:RETRIEVED_DOCUMENTS])
+                context_rows = min(len(rows), RETRIEVED_DOCUMENTS)
+            else:
+                formatter = row_format.RowFormatter(columns, format_name, float_digits)
+                chunked = list(row_format.chunk_blocks([rows], formatter, rows_per_chunk, max_chars))
+                documents = [block for _, _, block in chunked]
+                context = formatter.merge(documents[:RETRIEVED_DOCUMENTS])
+                context_rows = sum(count for _, count, _ in chunked[:RETRIEVED_DOCUMENTS])
+            for key, value in measure(estimate_tokens, documents, len(rows), context, context_rows, batch_size).items():
+                total[key] = total.get(key, 0) + value
+        totals[label] = total
+    return totals
+
+
+def store(result_sets, formats, chunks, server, float_digits, chunk_max_tokens) -> dict:
+    import config
+    import row_format
+    import vector_db_service
+
+    config.VECTOR_CHUNK_MAX_TOKENS = chunk_max_tokens
+    timings = {}
+    for label, format_name, rows_per_chunk in variants(formats, chunks):
+        if format_name is None:
+            continue # The original document format is no longer produced by the service
+        config.VECTOR_ROWS_PER_CHUNK = rows_per_chunk
+        server.request_counts.clear()
+        start = time.perf_counter()
+        for _, columns, rows in result_sets:
+            formatter = row_format.RowFormatter(columns, format_name, float_digits)
+            vector_db_service.add_result_batches([rows], columns, str(uuid.uuid4()), formatter)
+        timings[label] = {"seconds": time.perf_counter() - start,
+                          "embed_requests": server.request_counts.get("batchEmbedContents", 0)}
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Row format size and embedding-call benchmark")
+    parser.add_argument("--database", help="SQLite database to query (default: generate one)")
+    parser.add_argument("--orders", type=int, default=20000, help="Orders in the generated database")
+    parser.add_argument("--kinds", default="large_result", help="Question kinds from questions.json to run")
+    parser.add_argument("--formats", default="verbose,tsv,markdown,jsonl")
+    parser.add_argument("--chunks", default="1,5,10,25", help="Rows per document to compare")
+    parser.add_argument("--float-digits", type=int, default=4, help="Decimal places for floats (negative: full precision)")
+    parser.add_argument("--chunk-max-tokens", type=int, default=1500)
+    parser.add_argument("--store", action="store_true", help="Also write every variant through the vector DB service")
+    parser.add_argument("--latency-ms", type=float, default=5.0, help="Fake server latency per request (--store)")
+    args = parser.parse_args()
+
+    database = args.database
+    if not database:
+        import setup_database
+        database = os.path.join(tempfile.mkdtemp(prefix="bench_row_format_"), "bench.db")
+        setup_database.create_database(database)
+        setup_database.generate_data(database, max(5, args.orders // 10), args.orders, date(2023, 1, 1), 730)
+
+    from fake_gemini_server import start_server
+    server = start_server(latency_ms=args.latency_ms) if args.store else None
+    if server:
+        os.environ["GEMINI_API_BASE_URL"] = server.base_url
+
+    import config
+    formats = args.formats.split(",")
+    chunks = [int(size) for size in args.chunks.split(",")]
+    float_digits = args.float_digits if args.float_digits >= 0 else None
+    max_chars = args.chunk_max_tokens * 4 if args.chunk_max_tokens > 0 else None
+
+    result_sets = load_result_sets(database, set(args.kinds.split(",")))
+    row_total = sum(len(rows) for _, _, rows in result_sets)
+    print(f"{len(result_sets)} result sets, {row_total} rows ({args.kinds}); "
+          f"floats to {args.float_digits} places, embed batch size {config.EMBED_BATCH_SIZE}")
+
+    totals = serialize(result_sets, formats, chunks, float_digits, max_chars, config.EMBED_BATCH_SIZE)
+    baseline = totals["legacy"]
+    print(f"{'variant':>14} {'doc bytes/row':>14} {'doc tokens/row':>15} {'ctx tokens/row':>15} "
+          f"{'docs/set':>9} {'requests/set':>13} {'tokens vs legacy':>17}")
+    for label, total in totals.items():
+        rows = max(1, total["rows"])
+        print(f"{label:>14} {total['document_bytes'] / rows:14.1f} {total['document_tokens'] / rows:15.1f} "
+              f"{total['context_tokens'] / max(1, total['context_rows']):15.1f} "
+              f"{total['documents'] / len(result_sets):9.1f} "
+              f"{total['embed_requests'] / len(result_sets):13.1f} "
+              f"{total['document_tokens'] / baseline['document_tokens'] - 1:+17.0%}")
+
+    if server:
+        print(f"\nStored through vector_db_service (fake server, {args.latency_ms} ms/request)")
+        print(f"{'variant':>14} {'seconds':>9} {'requests':>9}")
+        for label, timing in store(result_sets, formats, chunks, server, float_digits, args.chunk_max_tokens).items():
+            print(f"{label:>14} {timing['seconds']:9.3f} {timing['embed_requests']:9d}")
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,227 @@
+"""
+Benchmark: SQL prompt schema size and table/column recall with schema pruning.
+
+Builds a synthetic warehouse semantic layer (areas x entities, default 300 tables)
+with a labeled question set, and a small hand-labeled set for the shipped
+data/semantic_layer.json. For every question it compares the full schema text with
+the pruned one from SchemaIndex and checks that the labeled tables and columns
+were kept. Runs keyword-only and keyword + embeddings; embeddings come from the
+local fake Gemini server (hashed bag-of-words, so they only capture word overlap).
+
+    python benchmarks/bench_schema_pruning.py --areas 12 --questions 200
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fake_gemini_server import start_server
+
+AREAS = ["sales", "finance", "hr", "marketing", "logistics", "support", "product", "procurement",
+         "legal", "it", "operations", "analytics", "retail", "wholesale", "partner", "research"]
+
+# entity: (singular, synonym used in questions, related entities referenced by *_id columns)
+ENTITIES = {
+    "customers": ("customer", "clients", ["region"]),
+    "orders": ("order", "purchases", ["customer", "product"]),
+    "products": ("product", "items", ["supplier"]),
+    "suppliers": ("supplier", "providers", ["region"]),
+    "employees": ("employee", "staff members", ["department"]),
+    "departments": ("department", "teams", []),
+    "invoices": ("invoice", "bills", ["customer", "order"]),
+    "payments": ("payment", "transactions", ["invoice"]),
+    "shipments": ("shipment", "deliveries", ["order", "warehouse"]),
+    "warehouses": ("warehouse", "depots", ["region"]),
+    "returns": ("return", "returned goods", ["order"]),
+    "campaigns": ("campaign", "promotions", []),
+    "leads": ("lead", "prospects", ["campaign"]),
+    "tickets": ("ticket", "support cases", ["customer", "employee"]),
+    "subscriptions": ("subscription", "plans", ["customer"]),
+    "contracts": ("contract", "agreements", ["supplier"]),
+    "expenses": ("expense", "costs", ["employee", "department"]),
+    "projects": ("project", "initiatives", ["department"]),
+    "reviews": ("review", "ratings", ["product", "customer"]),
+    "regions": ("region", "territories", []),
+}
+
+# column: (human names, description, type, value_map)
+ATTRIBUTES = {
+    "amount": (["Amount", "Total"], "Monetary amount in USD.", "REAL", None),
+    "status": (["Status", "State"], "Current lifecycle status.", "TEXT",
+               {"A": "Active", "C": "Closed", "P": "Pending"}),
+    "created_date": (["Created Date", "Date"], "Date the record was created.", "TEXT", None),
+    "name": (["Name", "Title"], "Display name.", "TEXT", None),
+    "priority": (["Priority", "Urgency"], "Priority level.", "TEXT", {"H": "High", "M": "Medium", "L": "Low"}),
+    "quantity": (["Quantity", "Units"], "Number of units.", "INTEGER", None),
+    "discount": (["Discount", "Rebate"], "Discount applied in percent.", "REAL", None),
+    "country": (["Country", "Nation"], "Country code.", "TEXT", {"US": "United States", "DE": "Germany", "IN": "India"}),
+    "score": (["Score", "Rating"], "Quality score from 1 to 5.", "INTEGER", None),
+    "channel": (["Channel", "Source"], "Acquisition or sales channel.", "TEXT",
+                {"WEB": "Online", "STORE": "In store", "PHONE": "Phone"}),
+    "owner_email": (["Owner Email", "Contact"], "Email of the responsible person.", "TEXT", None),
+    "weight_kg": (["Weight", "Mass"], "Weight in kilograms.", "REAL", None),
+}
+
+
+def make_warehouse(area_count: int, seed: int = 0) -> dict:
+    """Synthetic semantic layer: one table per (area, entity) with 4-7 attributes and *_id join keys."""
+    rng = random.Random(seed)
+    tables = []
+    for area in AREAS[:area_count]:
+        for entity, (singular, synonym, related) in ENTITIES.items():
+            columns = [{"technical_name": f"{singular}_id", "human_names": [f"{singular.title()} ID", "ID"],
+                        "description": f"Unique identifier for a {singular}.", "data_type": "INTEGER"}]
+            for other in related:
+                columns.append({"technical_name": f"{other}_id", "human_names": [f"{other.title()} ID"],
+                                "description": f"Identifier linking to the {area} {other} table.",
+                                "data_type": "INTEGER"})
+            for attribute in rng.sample(sorted(ATTRIBUTES), rng.randint(4, 7)):
+                human_names, description, data_type, value_map = ATTRIBUTES[attribute]
+                column = {"technical_name": attribute, "human_names": human_names,
+                          "description": description, "data_type": data_type}
+                if value_map:
+                    column["value_map"] = value_map
+                columns.append(column)
+            tables.append({
+                "technical_name": f"{area}_{entity}",
+                "human_names": [f"{area.title()} {entity.title()}", f"{area.title()} {synonym.title()}"],
+                "description": f"{entity.title()} records of the {area} business area.",
+                "columns": columns,
+            })
+    return {
+        "database": {"technical_name": "warehouse", "human_name": "Synthetic Warehouse",
+                     "description": "Synthetic multi-area warehouse for schema pruning benchmarks."},
+        "tables": tables,
+    }
+
+
+def make_questions(semantic_config: dict, count: int, seed: int = 0) -> list[tuple[str, dict]]:
+    """Labeled questions: (question, {table: {columns needed}})."""
+    rng = random.Random(seed)
+    tables = {table["technical_name"]: table for table in semantic_config["tables"]}
+    questions = []
+    while len(questions) < count:
+        table = rng.choice(semantic_config["tables"])
+        area, entity = table["technical_name"].split("_", 1)
+        singular, synonym, related = ENTITIES[entity]
+        noun = rng.choice([entity, synonym])
+        attributes = [c for c in table["columns"] if c["technical_name"] in ATTRIBUTES]
+        column = rng.choice(attributes)
+        human = rng.choice(column["human_names"]).lower()
+        kind = rng.randrange(3)
+        if kind == 1 and column.get("value_map"):
+            meaning = rng.choice(list(column["value_map"].values()))
+            questions.append((f"How many {area} {noun} have {human} {meaning}?",
+                              {table["technical_name"]: {column["technical_name"]}}))
+        elif kind == 2 and related:
+            other = rng.choice(related)
+            other_table = tables[f"{area}_{other}s" if f"{area}_{other}s" in tables else f"{area}_{other}"]
+            other_column = rng.choice([c for c in other_table["columns"] if c["technical_name"] in ATTRIBUTES])
+            other_human = rng.choice(other_column["human_names"]).lower()
+            questions.append((f"Show the {human} of {area} {noun} together with the {other} {other_human}",
+                              {table["technical_name"]: {column["technical_name"], f"{other}_id"},
+                               other_table["technical_name"]: {other_column["technical_name"], f"{other}_id"}}))
+        else:
+            questions.append((f"What is the average {human} of {area} {noun}?",
+                              {table["technical_name"]: {column["technical_name"]}}))
+    return questions
+
+
+# Hand-labeled questions for the shipped semantic layer
+SHIPPED_QUESTIONS = [
+    ("How many orders were placed?", {"orders": {"order_id"}}),
+    ("What is the total sales amount?", {"orders": {"amount"}}),
+    ("List the names of clients in California", {"customers": {"name", "state"}}),
+    ("Which customers live in Texas?", {"customers": {"name", "state"}}),
+    ("Total order amount per customer name",
+     {"orders": {"amount", "customer_id"}, "customers": {"name", "customer_id"}}),
+    ("How much did customers from New York spend?",
+     {"orders": {"amount", "customer_id"}, "customers": {"state", "customer_id"}}),
+    ("Show the most recent order date", {"orders": {"order_date"}}),
+]
+
+
+def evaluate(index, questions, use_embeddings: bool, llm_service, estimate_tokens) -> dict:
+    full_tokens = estimate_tokens(index.full_text)
+    table_hits = column_hits = table_total = column_total = complete = 0
+    pruned_tokens = []
+    select_seconds = 0.0
+    for question, gold in questions:
+        embedding = llm_service.embed_text(question) if use_embeddings else None
+        start = time.perf_counter()
+        selection = index.select(question, embedding)
+        select_seconds += time.perf_counter() - start
+        if selection is None:
+            selected = {name: {column.technical_name for column in table.columns}
+                        for name, table in index.tables.items()}
+            pruned_tokens.append(full_tokens)
+        else:
+            selected = {name: set(columns) for name, columns in selection["tables"].items()}
+            pruned_tokens.append(estimate_tokens(index.format_selection(selection)))
+        all_found = True
+        for table_name, gold_columns in gold.items():
+            table_total += 1
+            column_total += len(gold_columns)
+            found_columns = selected.get(table_name, set()) & gold_columns
+            table_hits += table_name in selected
+            column_hits += len(found_columns)
+            all_found &= table_name in selected and found_columns == gold_columns
+        complete += all_found
+    return {
+        "full_tokens": full_tokens,
+        "pruned_tokens": sum(pruned_tokens) / len(pruned_tokens),
+        "table_recall": table_hits / table_total,
+        "column_recall": column_hits / column_total,
+        "complete": complete / len(questions),
+        "select_ms": select_seconds / len(questions) * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Schema pruning prompt size and recall benchmark")
+    parser.add_argument("--areas", type=int, default=15, help="Business areas; tables = areas x 20 entities")
+    parser.add_argument("--questions", type=int, default=200)
+    parser.add_argument("--top-k-tables", type=int, default=5)
+    parser.add_argument("--top-k-columns", type=int, default=10)
+    args = parser.parse_args()
+
+    server = start_server()
+    os.environ["GEMINI_API_BASE_URL"] = server.base_url
+    os.environ.setdefault("GOOGLE_API_KEY", "fake-key")
+    os.environ.setdefault("EMBED_CACHE_ENABLED", "false")
+    os.environ["SCHEMA_TOP_K_TABLES"] = str(args.top_k_tables)
+    os.environ["SCHEMA_TOP_K_COLUMNS"] = str(args.top_k_columns)
+
+    import config
+    import llm_service
+    import schema_index
+    import semantic_layer
+    from result_summary import estimate_tokens
+
+    warehouse = make_warehouse(min(args.areas, len(AREAS)))
+    suites = [
+        (f"synthetic ({len(warehouse['tables'])} tables)", warehouse, make_questions(warehouse, args.questions)),
+        ("shipped semantic layer", semantic_layer.load_semantic_layer(config.SEMANTIC_LAYER_PATH), SHIPPED_QUESTIONS),
+    ]
+    print(f"top-k tables {config.SCHEMA_TOP_K_TABLES}, top-k columns {config.SCHEMA_TOP_K_COLUMNS}\n")
+    print(f"{'schema':>26} {'mode':>9} {'full tok':>9} {'pruned tok':>11} {'table rec':>10} "
+          f"{'column rec':>11} {'complete':>9} {'select ms':>10} {'build s':>8}")
+    for name, semantic_config, questions in suites:
+        if not semantic_config:
+            continue
+        for use_embeddings in (False, True):
+            start = time.perf_counter()
+            index = schema_index.SchemaIndex(semantic_layer.compile_semantic_layer(semantic_config),
+                                             use_embeddings=use_embeddings)
+            build_seconds = time.perf_counter() - start
+            r = evaluate(index, questions, use_embeddings, llm_service, estimate_tokens)
+            print(f"{name:>26} {'hybrid' if use_embeddings else 'keyword':>9} {r['full_tokens']:9d} "
+                  f"{r['pruned_tokens']:11.0f} {r['table_recall']:10.3f} {r['column_recall']:11.3f} "
+                  f"{r['complete']:9.3f} {r['select_ms']:10.2f} {build_seconds:8.2f}")
+
+
+if __name__ == "__main__":
+    main()
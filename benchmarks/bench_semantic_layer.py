@@ -0,0 +1,80 @@
+"""
+Benchmark: semantic layer prompt cost per request and reload cost after an edit.
+
+Uses the synthetic warehouse from bench_schema_pruning (default 300 tables):
+  - per request: formatting the schema from the raw config every time vs reading
+    the compiled layer's prompt text vs rendering a pruned selection from cached fragments
+  - reload: compiling from scratch vs recompiling after one table changed, and
+    rebuilding the schema index with and without the previous version's embeddings
+
+    python benchmarks/bench_semantic_layer.py --areas 15
+"""
+import argparse
+import copy
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fake_gemini_server import start_server
+from bench_schema_pruning import make_warehouse
+
+
+def timed(function, repeat: int) -> float:
+    """Mean milliseconds per call."""
+    start = time.perf_counter()
+    for _ in range(repeat):
+        function()
+    return (time.perf_counter() - start) / repeat * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Semantic layer compile/reload benchmark")
+    parser.add_argument("--areas", type=int, default=15, help="Business areas; tables = areas x 20 entities")
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    server = start_server()
+    os.environ["GEMINI_API_BASE_URL"] = server.base_url
+    os.environ.setdefault("GOOGLE_API_KEY", "fake-key")
+    os.environ.setdefault("EMBED_CACHE_ENABLED", "false")
+
+    import schema_index
+    import semantic_layer
+
+    raw = make_warehouse(args.areas)
+    layer = semantic_layer.compile_semantic_layer(raw)
+    index = schema_index.SchemaIndex(layer, use_embeddings=False)
+    selection = index.select("average amount of sales orders by customer name")
+    print(f"{len(layer.tables)} tables, full prompt {len(layer.prompt_text)} chars\n")
+
+    print("Per request:")
+    print(f"  format from raw config      {timed(lambda: semantic_layer.format_semantic_layer_for_prompt(raw), 20):9.3f} ms")
+    print(f"  compiled prompt_text        {timed(lambda: layer.prompt_text, args.repeat):9.4f} ms")
+    print(f"  pruned selection render     {timed(lambda: index.format_selection(selection), args.repeat):9.4f} ms")
+
+    edited = copy.deepcopy(raw)
+    edited["tables"][0]["description"] += " Edited."
+    print("\nReload after editing one table:")
+    print(f"  compile from scratch        {timed(lambda: semantic_layer.compile_semantic_layer(edited), 20):9.3f} ms")
+    print(f"  incremental compile         "
+          f"{timed(lambda: semantic_layer.compile_semantic_layer(edited, layer), 20):9.3f} ms")
+
+    edited_layer = semantic_layer.compile_semantic_layer(edited, layer)
+    server.request_counts.clear()
+    start = time.perf_counter()
+    embedded_index = schema_index.SchemaIndex(layer)
+    full_seconds = time.perf_counter() - start
+    full_requests = sum(server.request_counts.values())
+    server.request_counts.clear()
+    start = time.perf_counter()
+    schema_index.SchemaIndex(edited_layer, embedded_index)
+    incremental_seconds = time.perf_counter() - start
+    incremental_requests = sum(server.request_counts.values())
+    print(f"  schema index from scratch   {full_seconds * 1000:9.1f} ms ({full_requests} embedding requests)")
+    print(f"  schema index incremental    {incremental_seconds * 1000:9.1f} ms ({incremental_requests} embedding requests)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+"""
+Benchmark: import time of the entry-point modules and time until the services are ready.
+
+Import time is measured with `python -X importtime -c "import <module>"` in a fresh
+interpreter per run (median of --repeat runs, cumulative microseconds of the module
+as reported by the interpreter), together with the heaviest imports it pulls in.
+Point --root at another checkout to compare, e.g. the previous commit:
+
+    git worktree add /tmp/before HEAD~1
+    python benchmarks/bench_startup.py --root /tmp/before
+    python benchmarks/bench_startup.py
+
+With --warmup, a fresh interpreter also runs startup.warmup() against the fake
+Gemini server (embedding cache off, so the schema index is embedded every time)
+and reports the time until every service is ready, initialized one after another
+vs in parallel.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+def import_times(root: str, module: str) -> dict[str, int]:
+    """Cumulative import time in microseconds of every module `import module` loads."""
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"], cwd=root,
+                            env={**os.environ, "PYTHONDONTWRITEBYTECODE": "1"}, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1])
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        if cumulative.strip().isdigit():
+            times[name.strip()] = int(cumulative)
+    return times
+
+
+def measure_imports(root: str, module: str, repeat: int) -> tuple[float, dict[str, int]]:
+    import_times(root, module) # Writes any missing bytecode outside the timed runs
+    runs = [import_times(root, module) for _ in range(repeat)]
+    return statistics.median(run[module] for run in runs) / 1000, runs[-1]
+
+
+WARMUP_SCRIPT = """
+import json, sys, time
+start = time.perf_counter()
+import startup
+imported = time.perf_counter()
+status = startup.warmup(parallel=sys.argv[1] == "parallel")
+print(json.dumps({"import": imported - start, "warmup": time.perf_counter() - imported, **status}))
+"""
+
+
+def measure_warmup(root: str, parallel: bool, env: dict) -> dict:
+    result = subprocess.run([sys.executable, "-c", WARMUP_SCRIPT, "parallel" if parallel else "sequential"],
+                            cwd=root, env=env, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip())
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Import time and warmup benchmark")
+    parser.add_argument("--root", default=ROOT, help="Checkout to measure (default: this one)")
+    parser.add_argument("--modules", default="config,pipeline,main,server")
+    parser.add_argument("--repeat", type=int, default=7, help="Interpreter runs per module")
+    parser.add_argument("--top", type=int, default=5, help="Heaviest imports to list per module")
+    parser.add_argument("--warmup", action="store_true", help="Also time startup.warmup(), sequential vs parallel")
+    parser.add_argument("--latency-ms", type=float, default=50.0, help="Fake server latency per request (--warmup)")
+    args = parser.parse_args()
+
+    root = os.path.abspath(args.root)
+    print(f"Import time in {root} (median of {args.repeat} runs)")
+    for module in args.modules.split(","):
+        try:
+            total_ms, times = measure_imports(root, module, args.repeat)
+        except RuntimeError as e:
+            print(f"{module:>10}  failed: {e}")
+            continue
+        heaviest = sorted(((t, name) for name, t in times.items() if name != module and "." not in name), reverse=True)
+        listed = ", ".join(f"{name} {t / 1000:.0f}" for t, name in heaviest[:args.top])
+        print(f"{module:>10} {total_ms:8.1f} ms   heaviest (ms): {listed}")
+
+    if args.warmup:
+        from fake_gemini_server import start_server
+        server = start_server(latency_ms=args.latency_ms)
+        workdir = tempfile.mkdtemp(prefix="bench_startup_")
+        env = {**os.environ,
+               "GEMINI_API_BASE_URL": server.base_url,
+               "GOOGLE_API_KEY": os.environ.get("GOOGLE_API_KEY", "fake-key"),
+               "DATABASE_PATH": os.path.join(ROOT, "data", "mydatabase.db"),
+               "SEMANTIC_LAYER_PATH": os.path.join(ROOT, "data", "semantic_layer.json"),
+               "CHROMA_DB_PATH": os.path.join(workdir, "chroma"),
+               "EMBED_CACHE_ENABLED": "false",
+               "LOG_LEVEL": "WARNING"}
+        print(f"\nstartup.warmup() in a fresh interpreter (fake server, {args.latency_ms} ms/request)")
+        print(f"{'mode':>10} {'import s':>9} {'warmup s':>9} {'ready':>6}  slowest component")
+        for parallel in (False, True):
+            start = time.perf_counter()
+            try:
+                outcome = measure_warmup(root, parallel, env)
+            except RuntimeError as e:
+                print(f"{'parallel' if parallel else 'sequential':>10}  failed: {str(e).splitlines()[-1]}")
+                continue
+            slowest = max(outcome["components"].items(), key=lambda item: item[1]["seconds"] or 0)
+            print(f"{'parallel' if parallel else 'sequential':>10} {outcome['import']:9.3f} {outcome['warmup']:9.3f} "
+                  f"{str(outcome['ready']):>6}  {slowest[0]} {slowest[1]['seconds']:.3f}s "
+                  f"(process {time.perf_counter() - start:.2f}s)")
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""
+Benchmark: cost of the tracing instrumentation per span.
+
+Times an empty `with tracing.span(...)` block (nested one level, with
+attributes set, as the pipeline stages do) with tracing off, with the in-memory
+histogram exporter, and with histogram + JSON lines + OTLP/JSON exporters
+writing to a temporary directory. Compare against the per-stage latencies in
+GET /stats: a question opens roughly 10-30 spans.
+
+    python benchmarks/bench_tracing.py --iterations 200000
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+os.environ["TRACING_ENABLED"] = "false"
+
+import tracing
+
+
+def run(iterations: int) -> float:
+    """Seconds per traced stage: one child span with attributes inside a root span per iteration."""
+    start = time.perf_counter()
+    for i in range(iterations):
+        with tracing.trace("bench-query"):
+            with tracing.span("stage", rows=i) as stage:
+                stage.set(cache_hit=False, bytes=128)
+    return (time.perf_counter() - start) / iterations / 2 # Two spans per iteration
+
+
+def baseline(iterations: int) -> float:
+    start = time.perf_counter()
+    for i in range(iterations):
+        pass
+    return (time.perf_counter() - start) / iterations / 2
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Tracing overhead benchmark")
+    parser.add_argument("--iterations", type=int, default=100000)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="bench_tracing_")
+    setups = {
+        "off": [],
+        "histogram": [tracing.HistogramExporter()],
+        "all": [
+            tracing.HistogramExporter(),
+            tracing.JsonLinesExporter(os.path.join(workdir, "traces.jsonl")),
+            tracing.OtlpJsonExporter(os.path.join(workdir, "traces.otlp.jsonl")),
+        ],
+    }
+
+    loop = baseline(args.iterations)
+    print(f"{args.iterations} iterations, 2 spans each")
+    print(f"{'exporters':>10} {'us/span':>9}")
+    for name, exporters in setups.items():
+        for exporter in exporters:
+            tracing.add_exporter(exporter)
+        try:
+            per_span = run(args.iterations) - loop
+        finally:
+            for exporter in exporters:
+                tracing.remove_exporter(exporter)
+                if hasattr(exporter, "close"):
+                    exporter.close()
+        print(f"{name:>10} {per_span * 1e6:9.3f}")
+
+
+if __name__ == "__main__":
+    main()
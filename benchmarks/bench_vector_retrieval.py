@@ -0,0 +1,84 @@
+"""
+Benchmark: retrieval latency as stored result history grows. Compares searching
+the whole sql_results collection, a Chroma `where` filter on query_id, and the
+query-scoped path used by retrieve_data_from_vector_db (fetch the result set's
+rows by id, rank locally).
+
+Fills a throwaway Chroma directory with synthetic result sets (random vectors)
+and times queries at each history size. 1M rows takes a while to build:
+
+    python benchmarks/bench_vector_retrieval.py --sizes 1000,10000,100000,1000000
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Scoped vs unscoped vector retrieval latency")
+    parser.add_argument("--sizes", default="1000,10000,100000", help="Total stored rows at each measurement")
+    parser.add_argument("--rows-per-query", type=int, default=50, help="Rows per stored result set")
+    parser.add_argument("--dim", type=int, default=128, help="Embedding dimension of the synthetic vectors")
+    parser.add_argument("--queries", type=int, default=50, help="Timed queries per size")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="bench_vector_retrieval_")
+    os.environ["CHROMA_DB_PATH"] = workdir
+    os.environ["VECTOR_GC_INTERVAL_SECONDS"] = "0"
+    os.environ["VECTOR_BACKEND"] = "chroma"
+
+    import vector_db_service
+    store = vector_db_service.get_store()
+    collection = store.collection
+    rng = np.random.default_rng(0)
+
+    def add_result_set(query_number: int):
+        query_id = f"bench-{query_number}"
+        vectors = rng.standard_normal((args.rows_per_query, args.dim), dtype=np.float32)
+        created_at = time.time()
+        collection.add(
+            ids=[vector_db_service._row_id(query_id, i) for i in range(args.rows_per_query)],
+            embeddings=vectors,
+            documents=[f"SQL Result (Query ID: {query_id}, Row {i + 1})" for i in range(args.rows_per_query)],
+            metadatas=[{"query_id": query_id, "row_index": i, "created_at": created_at} for i in range(args.rows_per_query)],
+        )
+        vector_db_service._register_result_set(query_id, created_at, args.rows_per_query, args.rows_per_query)
+        return query_id
+
+    def time_queries(search) -> float:
+        latencies = []
+        for _ in range(args.queries):
+            query_vector = rng.standard_normal(args.dim, dtype=np.float32)
+            start = time.perf_counter()
+            search(query_vector)
+            latencies.append(time.perf_counter() - start)
+        return float(np.median(latencies)) * 1000
+
+    print(f"{args.rows_per_query} rows per result set, dim {args.dim}, median of {args.queries} queries")
+    print(f"{'stored rows':>12} {'unscoped ms':>12} {'where ms':>10} {'scoped ms':>10}")
+    stored = 0
+    query_number = 0
+    for size in [int(s) for s in args.sizes.split(",")]:
+        while stored < size:
+            add_result_set(query_number)
+            query_number += 1
+            stored += args.rows_per_query
+        target = f"bench-{query_number - 1}" # Most recent result set, as in the pipeline
+        unscoped = time_queries(lambda v: collection.query(query_embeddings=[v], n_results=5))
+        where = time_queries(lambda v: collection.query(query_embeddings=[v], n_results=5, where={"query_id": target}))
+        row_ids = vector_db_service._result_set_row_ids(target)
+        scoped = time_queries(lambda v: store.query_result_set(target, row_ids, v, 5))
+        print(f"{stored:>12} {unscoped:12.2f} {where:10.2f} {scoped:10.2f}")
+
+    shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+"""
+Benchmark: add and query latency and memory of the vector store backends.
+
+Each (backend, size) pair runs in a fresh subprocess so memory numbers are not
+polluted by earlier runs. Backends:
+  chroma        ChromaVectorStore (persistent, throwaway directory)
+  memory-exact  InMemoryVectorStore, NumPy matrix + argpartition top-k
+  memory-hnsw   InMemoryVectorStore with the HNSW index (needs hnswlib)
+
+    python benchmarks/bench_vector_store.py --sizes 1000,100000,1000000 --dim 256
+"""
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+
+ADD_BATCH = 5000 # Below Chroma's maximum batch size
+
+
+def rss_bytes() -> int:
+    """Current resident set size (Linux /proc; falls back to peak RSS elsewhere)."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def run_worker(backend: str, size: int, dim: int, queries: int) -> dict:
+    from vector_store import ChromaVectorStore, InMemoryVectorStore
+
+    workdir = tempfile.mkdtemp(prefix="bench_vector_store_")
+    rng = np.random.default_rng(0)
+    baseline = rss_bytes()
+    if backend == "chroma":
+        store = ChromaVectorStore(workdir, "bench")
+    elif backend == "memory-hnsw":
+        store = InMemoryVectorStore(hnsw_threshold=1)
+    else:
+        store = InMemoryVectorStore(hnsw_threshold=size + 1)
+
+    add_seconds = 0.0
+    for start in range(0, size, ADD_BATCH):
+        count = min(ADD_BATCH, size - start)
+        vectors = rng.standard_normal((count, dim), dtype=np.float32)
+        ids = [f"query_bench_row_{i}" for i in range(start, start + count)]
+        documents = [f"row {i}" for i in range(start, start + count)]
+        metadatas = [{"query_id": "bench", "row_index": i} for i in range(start, start + count)]
+        began = time.perf_counter()
+        store.add(ids, vectors, documents, metadatas)
+        add_seconds += time.perf_counter() - began
+    memory = rss_bytes() - baseline
+
+    latencies = []
+    for _ in range(queries):
+        query_vector = rng.standard_normal(dim, dtype=np.float32)
+        began = time.perf_counter()
+        if backend == "chroma":
+            store.query(query_vector, 5)
+        else:
+            store.query_result_set("bench", None, query_vector, 5)
+        latencies.append(time.perf_counter() - began)
+
+    shutil.rmtree(workdir, ignore_errors=True)
+    return {
+        "backend": backend,
+        "size": size,
+        "add_vectors_per_s": size / add_seconds if add_seconds else 0.0,
+        "query_p50_ms": float(np.percentile(latencies, 50)) * 1000,
+        "query_p95_ms": float(np.percentile(latencies, 95)) * 1000,
+        "memory_mb": memory / 1e6,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Vector store backend benchmark")
+    parser.add_argument("--sizes", default="1000,100000")
+    parser.add_argument("--dim", type=int, default=256)
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--backends", default="chroma,memory-exact,memory-hnsw")
+    parser.add_argument("--worker", nargs=2, metavar=("BACKEND", "SIZE"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        print(json.dumps(run_worker(args.worker[0], int(args.worker[1]), args.dim, args.queries)))
+        return
+
+    print(f"dim {args.dim}, {args.queries} queries, top-5")
+    print(f"{'backend':>13} {'vectors':>9} {'add vec/s':>11} {'query p50 ms':>13} {'query p95 ms':>13} {'memory MB':>10}")
+    for size in [int(s) for s in args.sizes.split(",")]:
+        for backend in args.backends.split(","):
+            if backend == "memory-hnsw":
+                try:
+                    import hnswlib # noqa: F401
+                except ImportError:
+                    print(f"{backend:>13} {size:>9}  skipped (hnswlib not installed)")
+                    continue
+            output = subprocess.run(
+                [sys.executable, __file__, "--worker", backend, str(size), "--dim", str(args.dim),
+                 "--queries", str(args.queries)],
+                capture_output=True, text=True, check=True,
+            ).stdout
+            r = json.loads(output.strip().splitlines()[-1])
+            print(f"{backend:>13} {size:>9} {r['add_vectors_per_s']:11.0f} {r['query_p50_ms']:13.3f} "
+                  f"{r['query_p95_ms']:13.3f} {r['memory_mb']:10.1f}")
+
+
+if __name__ == "__main__":
+    main()
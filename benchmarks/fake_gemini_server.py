@@ -0,0 +1,286 @@
+"""
+Local stand-in for the Gemini REST API, used by the benchmark scripts.
+
+Serves the endpoints llm_service talks to with deterministic canned responses,
+an optional artificial latency per request (separately for generation and
+embedding calls) and optional injected errors (e.g. 429/503 on a fraction of
+requests, or a scripted sequence of them), so benchmarks measure our side of
+the pipeline without network noise or API cost. The tests use it too. Loading a question corpus (benchmarks/questions.json) makes
+it answer each question with that question's SQL and answer.
+
+Run standalone:
+    python benchmarks/fake_gemini_server.py --port 8765 --latency-ms 20 --error-rate 0.1
+    python benchmarks/fake_gemini_server.py --corpus benchmarks/questions.json --generate-latency-ms 400 --embed-latency-ms 30
+then point the app at it with GEMINI_API_BASE_URL=http://127.0.0.1:8765/v1beta
+"""
+import argparse
+import hashlib
+import json
+import math
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+EMBEDDING_DIM = 768
+# Where llm_service's prompts put the user's question
+_SQL_PROMPT_QUESTION = re.compile(r"User Question:\n(.*?)\n\s*SQL Query:", re.S)
+_ANSWER_PROMPT_QUESTION = re.compile(r'The user asked the following question: "(.*?)"\n', re.S)
+# Where the SQL repair prompt puts the query to fix
+_REPAIR_PROMPT_SQL = re.compile(r"Failing SQL Query:\n(.*?)\n\s*SQLite Error:", re.S)
+
+
+def fake_embedding(text: str, dim: int = EMBEDDING_DIM) -> list[float]:
+    """Hashed bag-of-words vector: texts sharing words get similar embeddings."""
+    vector = [0.0] * dim
+    for token in re.findall(r"\w+", text.lower()):
+        digest = hashlib.md5(token.encode("utf-8")).digest()
+        index = int.from_bytes(digest[:4], "little") % dim
+        vector[index] += 1.0 if digest[4] & 1 else -1.0
+    norm = math.sqrt(sum(v * v for v in vector)) or 1.0
+    return [v / norm for v in vector]
+
+
+class FakeGeminiHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Headers and body go out as separate writes; without TCP_NODELAY, Nagle plus the
+    # client's delayed ACK adds ~40ms to every response on a keep-alive connection
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass  # Keep benchmark output clean
+
+    def _send_json(self, status: int, payload: dict, headers: dict | None = None):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        try:
+            self.wfile.write(body)
+        except (BrokenPipeError, ConnectionResetError):
+            self.close_connection = True # Client gave up waiting (e.g. a request deadline passed)
+
+    def _send_event(self, payload: dict):
+        data = f"data: {json.dumps(payload)}\r\n\r\n".encode("utf-8")
+        self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n") # One HTTP chunk per event
+        self.wfile.flush()
+
+    def _send_stream(self, text: str):
+        """streamGenerateContent?alt=sse: the text in chunks of a few words, one server-sent event each."""
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        words = re.findall(r"\S+\s*", text)
+        size = self.server.stream_chunk_words
+        pieces = ["".join(words[i:i + size]) for i in range(0, len(words), size)] or [""]
+        try:
+            self._write_events(pieces, len(words))
+        except (BrokenPipeError, ConnectionResetError):
+            self.close_connection = True # Client stopped reading partway, as a cancelled stream does
+
+    def _write_events(self, pieces: list[str], word_count: int):
+        for i, piece in enumerate(pieces):
+            if i and self.server.stream_chunk_delay_s:
+                time.sleep(self.server.stream_chunk_delay_s)
+            if self.server.stream_break_after is not None and i >= self.server.stream_break_after:
+                self.close_connection = True # Hang up without ending the body, as a dropped connection would
+                return
+            if self.server.stream_block_after is not None and i >= self.server.stream_block_after:
+                self._send_event({"candidates": [{"finishReason": "SAFETY", "index": 0}]})
+                break
+            candidate = {"content": {"parts": [{"text": piece}], "role": "model"}, "index": 0}
+            event = {"candidates": [candidate]}
+            if i == len(pieces) - 1:
+                candidate["finishReason"] = "STOP"
+                event["usageMetadata"] = {"promptTokenCount": 0, "candidatesTokenCount": word_count}
+            self._send_event(event)
+        self.wfile.write(b"0\r\n\r\n")
+        self.wfile.flush()
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        try:
+            request_body = json.loads(self.rfile.read(length) or b"{}")
+        except json.JSONDecodeError:
+            self._send_json(400, {"error": {"message": "Invalid JSON payload"}})
+            return
+
+        self.server.record_request(self.path)
+        self.server.track_in_flight(1)
+        try:
+            self._respond(request_body)
+        finally:
+            self.server.track_in_flight(-1)
+
+    def _respond(self, request_body: dict):
+        latency_s = self.server.latency_for(self.path)
+        if latency_s:
+            time.sleep(latency_s)
+        error_status = self.server.next_error_status()
+        if error_status:
+            self.server.record_request(":injected_error")
+            headers = {"Retry-After": str(self.server.retry_after)} if self.server.retry_after is not None else None
+            self._send_json(error_status, {"error": {"code": error_status, "message": "Injected error"}}, headers)
+            return
+
+        path = self.path.split("?", 1)[0]
+        if path.endswith(":batchEmbedContents"):
+            embeddings = [
+                {"values": fake_embedding(req["content"]["parts"][0]["text"])}
+                for req in request_body.get("requests", [])
+            ]
+            self._send_json(200, {"embeddings": embeddings})
+        elif path.endswith(":embedContent"):
+            text = request_body["content"]["parts"][0]["text"]
+            self._send_json(200, {"embedding": {"values": fake_embedding(text)}})
+        elif path.endswith(":streamGenerateContent"):
+            prompt = request_body["contents"][0]["parts"][0]["text"]
+            self._send_stream(self.server.response_for(prompt))
+        elif path.endswith(":generateContent"):
+            prompt = request_body["contents"][0]["parts"][0]["text"]
+            text = self.server.response_for(prompt)
+            self._send_json(200, {"candidates": [{"content": {"parts": [{"text": text}], "role": "model"}}]})
+        else:
+            self._send_json(404, {"error": {"message": f"Unknown endpoint {path}"}})
+
+
+class FakeGeminiServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, latency_ms: float = 0.0, error_rate: float = 0.0, error_status: int = 503, seed: int = 0,
+                 generate_latency_ms: float | None = None, embed_latency_ms: float | None = None):
+        super().__init__(address, FakeGeminiHandler)
+        self.latency_s = latency_ms / 1000.0
+        # Per-kind overrides of latency_s for generateContent and embedding calls
+        self.generate_latency_s = None if generate_latency_ms is None else generate_latency_ms / 1000.0
+        self.embed_latency_s = None if embed_latency_ms is None else embed_latency_ms / 1000.0
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self._random = random.Random(seed)
+        self.sql_response = "SELECT COUNT(*) FROM orders;"
+        self.answer_response = "There are 20 orders in total."
+        self.canned_sql = {} # Question -> SQL, overriding sql_response
+        # streamGenerateContent: words per event, delay between events, and optionally a
+        # safety block (finishReason SAFETY) in place of the Nth event
+        self.stream_chunk_words = 3
+        self.stream_chunk_delay_s = 0.0
+        self.stream_block_after = None
+        self.stream_break_after = None # Drop the connection after this many events
+        self.scripted_errors = [] # Statuses for the next requests, in order, ahead of error_rate
+        self.retry_after = None # Retry-After header (seconds) sent with injected errors
+        self.in_flight = 0
+        self.max_in_flight = 0 # Most requests handled at the same time
+        self.canned_answers = {} # Question -> answer, overriding answer_response
+        self.canned_broken_sql = {} # Question -> faulty SQL, served instead of canned_sql with inject_errors
+        self.canned_repairs = {} # Faulty SQL -> fixed SQL returned by repair prompts (unknown SQL comes back unchanged)
+        self.inject_errors = False
+        self.request_counts = {}
+        self._lock = threading.Lock()
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/v1beta"
+
+    def latency_for(self, path: str) -> float:
+        method = path.split("?", 1)[0].rsplit(":", 1)[-1]
+        if method in ("generateContent", "streamGenerateContent") and self.generate_latency_s is not None:
+            return self.generate_latency_s
+        if method in ("embedContent", "batchEmbedContents") and self.embed_latency_s is not None:
+            return self.embed_latency_s
+        return self.latency_s
+
+    def load_corpus(self, corpus: list[dict]):
+        """
+        Canned responses per question from a corpus of {"question", "sql", "answer"} entries.
+        An entry's optional "broken_sql" is served instead of its SQL when inject_errors is
+        set; repair prompts for it return the entry's SQL unless "repairable" is false.
+        """
+        for entry in corpus:
+            self.canned_sql[entry["question"]] = entry["sql"]
+            if entry.get("answer"):
+                self.canned_answers[entry["question"]] = entry["answer"]
+            if entry.get("broken_sql"):
+                self.canned_broken_sql[entry["question"]] = entry["broken_sql"]
+                if entry.get("repairable", True):
+                    self.canned_repairs[entry["broken_sql"].strip()] = entry["sql"]
+
+    def response_for(self, prompt: str) -> str:
+        match = _REPAIR_PROMPT_SQL.search(prompt)
+        if match:
+            failing_sql = match.group(1).strip()
+            return self.canned_repairs.get(failing_sql, failing_sql)
+        match = _SQL_PROMPT_QUESTION.search(prompt)
+        if match:
+            question = match.group(1).strip()
+            if self.inject_errors and question in self.canned_broken_sql:
+                return self.canned_broken_sql[question]
+            return self.canned_sql.get(question, self.sql_response)
+        match = _ANSWER_PROMPT_QUESTION.search(prompt)
+        if match:
+            return self.canned_answers.get(match.group(1).strip(), self.answer_response)
+        return self.answer_response
+
+    def next_error_status(self) -> int | None:
+        """Status of the error to inject for this request, if any."""
+        with self._lock:
+            if self.scripted_errors:
+                return self.scripted_errors.pop(0)
+            if self.error_rate > 0 and self._random.random() < self.error_rate:
+                return self.error_status
+            return None
+
+    def track_in_flight(self, delta: int):
+        with self._lock:
+            self.in_flight += delta
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+
+    def record_request(self, path: str):
+        endpoint = path.split("?", 1)[0].rsplit(":", 1)[-1]
+        with self._lock:
+            self.request_counts[endpoint] = self.request_counts.get(endpoint, 0) + 1
+
+
+def start_server(host: str = "127.0.0.1", port: int = 0, latency_ms: float = 0.0,
+                 error_rate: float = 0.0, error_status: int = 503, generate_latency_ms: float | None = None,
+                 embed_latency_ms: float | None = None, corpus: list[dict] | None = None) -> FakeGeminiServer:
+    """Starts the fake server on a background thread (port 0 picks a free port)."""
+    server = FakeGeminiServer((host, port), latency_ms=latency_ms, error_rate=error_rate, error_status=error_status,
+                              generate_latency_ms=generate_latency_ms, embed_latency_ms=embed_latency_ms)
+    if corpus:
+        server.load_corpus(corpus)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run a local fake Gemini API server.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="Artificial latency added to every request")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests answered with --error-status")
+    parser.add_argument("--error-status", type=int, default=503)
+    parser.add_argument("--generate-latency-ms", type=float, help="Latency of generateContent calls (default: --latency-ms)")
+    parser.add_argument("--embed-latency-ms", type=float, help="Latency of embedding calls (default: --latency-ms)")
+    parser.add_argument("--corpus", help="Question corpus JSON whose SQL/answers are served per question")
+    parser.add_argument("--inject-errors", action="store_true", help="Serve the corpus' broken_sql to exercise SQL repair")
+    args = parser.parse_args()
+
+    server = FakeGeminiServer((args.host, args.port), latency_ms=args.latency_ms,
+                              error_rate=args.error_rate, error_status=args.error_status,
+                              generate_latency_ms=args.generate_latency_ms, embed_latency_ms=args.embed_latency_ms)
+    if args.corpus:
+        with open(args.corpus, "r", encoding="utf-8") as f:
+            server.load_corpus(json.load(f))
+    server.inject_errors = args.inject_errors
+    print(f"Fake Gemini server listening on {server.base_url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,120 @@
+"""
+Load test for the HTTP server mode (server.py) with a stubbed LLM.
+
+Starts the fake Gemini server and the FastAPI app in-process against a copy of
+data/mydatabase.db and a throwaway Chroma directory, then fires POST /ask at
+increasing concurrency and reports latency percentiles and throughput.
+
+    python benchmarks/load_test.py --concurrency 1,4,16,64 --requests 200 --latency-ms 50
+"""
+import argparse
+import asyncio
+import os
+import shutil
+import socket
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import httpx
+from fake_gemini_server import start_server
+
+
+def percentile(sorted_values: list[float], pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, round(pct / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+async def run_level(base_url: str, concurrency: int, total: int, offset: int) -> tuple[list[float], int, float]:
+    latencies = []
+    errors = 0
+    queue = asyncio.Queue()
+    for i in range(total):
+        queue.put_nowait(f"How many orders are there? (load test question {offset + i})")
+
+    async def worker(client):
+        nonlocal errors
+        while not queue.empty():
+            question = queue.get_nowait()
+            start = time.perf_counter()
+            response = await client.post(f"{base_url}/ask", json={"question": question})
+            latencies.append(time.perf_counter() - start)
+            if response.status_code != 200 or response.json().get("error"):
+                errors += 1
+
+    limits = httpx.Limits(max_connections=concurrency)
+    async with httpx.AsyncClient(timeout=120, limits=limits) as client:
+        start = time.perf_counter()
+        await asyncio.gather(*(worker(client) for _ in range(concurrency)))
+        elapsed = time.perf_counter() - start
+    return sorted(latencies), errors, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Server load test with a stubbed LLM")
+    parser.add_argument("--concurrency", default="1,4,16,64")
+    parser.add_argument("--requests", type=int, default=200, help="Requests per concurrency level")
+    parser.add_argument("--latency-ms", type=float, default=50.0, help="Fake Gemini latency per call")
+    parser.add_argument("--with-caches", action="store_true", help="Keep the SQL, embedding and result caches on")
+    args = parser.parse_args()
+
+    gemini = start_server(latency_ms=args.latency_ms)
+    workdir = tempfile.mkdtemp(prefix="load_test_")
+    shutil.copy(os.path.join(ROOT, "data", "mydatabase.db"), os.path.join(workdir, "mydatabase.db"))
+    os.environ.update({
+        "GEMINI_API_BASE_URL": gemini.base_url,
+        "GOOGLE_API_KEY": os.environ.get("GOOGLE_API_KEY", "fake-key"),
+        "DATABASE_PATH": os.path.join(workdir, "mydatabase.db"),
+        "SEMANTIC_LAYER_PATH": os.path.join(ROOT, "data", "semantic_layer.json"),
+        "CHROMA_DB_PATH": os.path.join(workdir, "chroma"),
+        "EMBED_CACHE_PATH": os.path.join(workdir, "embedding_cache.db"),
+    })
+    if not args.with_caches:
+        os.environ["SQL_CACHE_ENABLED"] = "false"
+        os.environ["EMBED_CACHE_ENABLED"] = "false"
+        os.environ["RESULT_CACHE_ENABLED"] = "false"
+
+    os.environ["LOG_LEVEL"] = "WARNING" # The services log every step at INFO
+    import uvicorn
+
+    import server
+    port = free_port()
+    uvicorn_server = uvicorn.Server(uvicorn.Config(server.app, host="127.0.0.1", port=port, log_level="warning"))
+    threading.Thread(target=uvicorn_server.run, daemon=True).start()
+    while not uvicorn_server.started:
+        time.sleep(0.05)
+    base_url = f"http://127.0.0.1:{port}"
+
+    results = []
+    try:
+        offset = 0
+        for concurrency in [int(c) for c in args.concurrency.split(",")]:
+            latencies, errors, elapsed = asyncio.run(run_level(base_url, concurrency, args.requests, offset))
+            offset += args.requests
+            results.append((concurrency, latencies, errors, elapsed))
+    finally:
+        uvicorn_server.should_exit = True
+        gemini.shutdown()
+
+    print(f"Stubbed LLM latency {args.latency_ms} ms/call, {args.requests} requests per level")
+    print(f"{'conc':>5} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'req/s':>8} {'errors':>7}")
+    for concurrency, latencies, errors, elapsed in results:
+        print(f"{concurrency:>5} {percentile(latencies, 50) * 1000:9.1f} {percentile(latencies, 95) * 1000:9.1f} "
+              f"{percentile(latencies, 99) * 1000:9.1f} {len(latencies) / elapsed:8.1f} {errors:>7}")
+    shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,303 @@
+"""
+Reproducible end-to-end benchmark of the ask pipeline, fully offline.
+
+Generates (or reuses) a synthetic database at the requested scale with
+utils/setup_database.py, starts the fake Gemini server with canned SQL and
+answers for the question corpus (benchmarks/questions.json) and a configurable
+latency, then answers the corpus --passes times at --concurrency questions in
+flight. Reports end-to-end and time-to-first-answer-token latency percentiles,
+throughput, latency per question kind and per pipeline stage (from the tracing
+histogram), and saves everything as JSON so runs can be compared locally:
+
+    python benchmarks/run_benchmark.py --orders 1000000 --database /tmp/bench_1m.db --output before.json
+    # ... change something ...
+    python benchmarks/run_benchmark.py --orders 1000000 --database /tmp/bench_1m.db --output after.json --compare before.json
+
+A --database that does not exist yet is generated there and kept for later runs.
+The SQL, embedding and result caches are off unless --with-caches is given, so
+every question does the full work.
+
+--inject-errors makes the fake server answer the corpus questions that have a
+"broken_sql" with that faulty query (unknown columns and tables, a syntax error,
+an ambiguous column, one the model cannot fix) and answer repair prompts with the
+correct SQL, to measure the SQL repair loop: success rate, model calls, fixes
+served from the fix cache and the latency the repair adds. The fix cache is
+cleared after the warmup, so measured passes include first-time repairs;
+--no-fix-cache turns it off to time model repairs only.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import shutil
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import date, datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "utils"))
+
+from fake_gemini_server import start_server
+
+DEFAULT_CORPUS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "questions.json")
+
+
+def percentile(sorted_values: list[float], pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, round(pct / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def latency_summary(latencies: list[float], errors: int = 0) -> dict:
+    ordered = sorted(latencies)
+    return {
+        "count": len(ordered),
+        "errors": errors,
+        "mean_ms": round(sum(ordered) / len(ordered) * 1000, 3) if ordered else 0.0,
+        "p50_ms": round(percentile(ordered, 50) * 1000, 3),
+        "p95_ms": round(percentile(ordered, 95) * 1000, 3),
+        "p99_ms": round(percentile(ordered, 99) * 1000, 3),
+        "max_ms": round(ordered[-1] * 1000, 3) if ordered else 0.0,
+    }
+
+
+def git_revision() -> str | None:
+    try:
+        revision = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True,
+                                  timeout=10).stdout.strip()
+        dirty = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=ROOT,
+                               capture_output=True, text=True, timeout=30).stdout.strip()
+        return f"{revision}{'-dirty' if dirty else ''}" if revision else None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def prepare_database(path: str, orders: int, customers: int, seed: int) -> dict:
+    """Generates the synthetic database unless `path` already exists; returns its table sizes."""
+    if not os.path.exists(path):
+        import setup_database
+        setup_database.create_database(path)
+        setup_database.generate_data(path, customers, orders, date(2023, 1, 1), 730, seed)
+    conn = sqlite3.connect(path)
+    try:
+        return {table: conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0] for table in ("customers", "orders")}
+    finally:
+        conn.close()
+
+
+async def run_corpus(pipeline, layer, corpus: list[dict], passes: int, concurrency: int) -> tuple[list[dict], float]:
+    """Answers every corpus question `passes` times with at most `concurrency` in flight; returns per-question records."""
+    semaphore = asyncio.Semaphore(concurrency)
+    records = []
+
+    async def ask(entry):
+        async with semaphore:
+            start = time.perf_counter()
+            result = await pipeline.answer_question_async(entry["question"], layer.prompt_text,
+                                                          schema_index=layer.schema_index)
+            records.append({
+                "kind": entry.get("kind", "other"),
+                "seconds": time.perf_counter() - start,
+                "first_token": result["timings"].get("first_token"),
+                "overlap_saved": result["timings"].get("overlap_saved", 0.0),
+                "speculative_wasted": result["timings"].get("speculative_wasted", 0.0),
+                "error": result["error"],
+                "path": result["path"],
+                "rows": result["row_count"],
+                "repair": result["repair"],
+            })
+
+    start = time.perf_counter()
+    await asyncio.gather(*(ask(entry) for _ in range(passes) for entry in corpus))
+    return records, time.perf_counter() - start
+
+
+def repair_summary(records: list[dict]) -> dict:
+    """Outcome of the SQL repair loop over every question that needed it."""
+    repairs = [r["repair"] for r in records if r["repair"]]
+    fixed_by = {}
+    for repair in repairs:
+        source = repair["fixed_by"] or "failed"
+        fixed_by[source] = fixed_by.get(source, 0) + 1
+    return {
+        "attempted": len(repairs),
+        "repaired": sum(1 for repair in repairs if repair["repaired"]),
+        "success_rate": round(sum(1 for repair in repairs if repair["repaired"]) / len(repairs), 3) if repairs else 0.0,
+        "llm_calls": sum(repair["llm_calls"] for repair in repairs),
+        "fixed_by": fixed_by,
+        # Time the repair loop added to each question that needed it, overall and per fix source
+        "added": latency_summary([repair["seconds"] for repair in repairs]),
+        "added_by_source": {
+            source: latency_summary([repair["seconds"] for repair in repairs if (repair["fixed_by"] or "failed") == source])
+            for source in fixed_by
+        },
+    }
+
+
+def compare(baseline: dict, report: dict):
+    """Prints p50/p95 of end-to-end and per-stage latency next to a saved baseline run."""
+    print(f"\nComparison with baseline ({baseline['meta'].get('git_revision')}, {baseline['meta'].get('timestamp')})")
+    for key in ("tables", "questions"):
+        if baseline["meta"].get(key) != report["meta"][key]:
+            print(f"Warning: baseline {key} differ ({baseline['meta'].get(key)} vs {report['meta'][key]})")
+    for key in ("passes", "concurrency", "latency_ms", "generate_latency_ms", "embed_latency_ms", "with_caches"):
+        if baseline["meta"]["args"].get(key) != report["meta"]["args"][key]:
+            print(f"Warning: baseline --{key.replace('_', '-')} differs "
+                  f"({baseline['meta']['args'].get(key)} vs {report['meta']['args'][key]})")
+    print(f"{'':>22} {'p50 before':>11} {'p50 now':>9} {'change':>8} {'p95 before':>11} {'p95 now':>9} {'change':>8}")
+    rows = [("end_to_end", baseline["end_to_end"], report["end_to_end"])]
+    if baseline.get("first_token", {}).get("count") and report["first_token"]["count"]:
+        rows.append(("first_token", baseline["first_token"], report["first_token"]))
+    rows += [(name, baseline["stages"][name], stage) for name, stage in report["stages"].items()
+             if name in baseline.get("stages", {})]
+    for name, before, now in rows:
+        line = f"{name:>22}"
+        for key in ("p50_ms", "p95_ms"):
+            change = (now[key] - before[key]) / before[key] * 100 if before[key] else 0.0
+            line += f" {before[key]:11.1f} {now[key]:9.1f} {change:+7.1f}%"
+        print(line)
+    before_qps = baseline["throughput_qps"]
+    print(f"{'throughput q/s':>22} {before_qps:11.2f} {report['throughput_qps']:9.2f} "
+          f"{(report['throughput_qps'] - before_qps) / before_qps * 100 if before_qps else 0.0:+7.1f}%")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline end-to-end pipeline benchmark")
+    parser.add_argument("--orders", type=int, default=100000, help="Synthetic orders to generate (1000 to 50000000)")
+    parser.add_argument("--customers", type=int, help="Synthetic customers (default: orders / 10)")
+    parser.add_argument("--database", help="Database to use; generated there if missing (default: a temporary copy)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--corpus", default=DEFAULT_CORPUS, help="Question corpus JSON")
+    parser.add_argument("--kinds", help="Comma-separated question kinds to run (default: all)")
+    parser.add_argument("--passes", type=int, default=3, help="Times the corpus is answered")
+    parser.add_argument("--warmup", type=int, default=1, help="Untimed passes before measuring")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="Fake Gemini latency per call")
+    parser.add_argument("--generate-latency-ms", type=float, help="Fake generateContent latency (default: --latency-ms)")
+    parser.add_argument("--embed-latency-ms", type=float, help="Fake embedding latency (default: --latency-ms)")
+    parser.add_argument("--with-caches", action="store_true", help="Keep the SQL, embedding and result caches on")
+    parser.add_argument("--inject-errors", action="store_true",
+                        help="Serve the corpus' broken_sql so the SQL repair loop runs")
+    parser.add_argument("--no-fix-cache", action="store_true", help="Turn the SQL repair fix cache off")
+    parser.add_argument("--output", help="Write the report as JSON to this file")
+    parser.add_argument("--compare", help="Baseline report JSON to compare against")
+    args = parser.parse_args()
+
+    with open(args.corpus, "r", encoding="utf-8") as f:
+        corpus = json.load(f)
+    if args.kinds:
+        kinds = {kind.strip() for kind in args.kinds.split(",")}
+        corpus = [entry for entry in corpus if entry.get("kind") in kinds]
+    if not corpus:
+        parser.error("no questions to run")
+
+    workdir = tempfile.mkdtemp(prefix="run_benchmark_")
+    database_path = args.database or os.path.join(workdir, "bench.db")
+    tables = prepare_database(database_path, args.orders, args.customers or max(5, args.orders // 10), args.seed)
+
+    gemini = start_server(latency_ms=args.latency_ms, generate_latency_ms=args.generate_latency_ms,
+                          embed_latency_ms=args.embed_latency_ms, corpus=corpus)
+    gemini.inject_errors = args.inject_errors
+    os.environ.update({
+        "GEMINI_API_BASE_URL": gemini.base_url,
+        "GOOGLE_API_KEY": os.environ.get("GOOGLE_API_KEY", "fake-key"),
+        "DATABASE_PATH": database_path,
+        "SEMANTIC_LAYER_PATH": os.path.join(ROOT, "data", "semantic_layer.json"),
+        "CHROMA_DB_PATH": os.path.join(workdir, "chroma"),
+        "EMBED_CACHE_PATH": os.path.join(workdir, "embedding_cache.db"),
+        "WORKLOAD_LOG_ENABLED": "false",
+        "TRACING_ENABLED": "true",
+        "TRACING_EXPORTERS": "histogram",
+        "LOG_LEVEL": "WARNING", # The services log every step at INFO
+    })
+    if not args.with_caches:
+        os.environ["SQL_CACHE_ENABLED"] = "false"
+        os.environ["EMBED_CACHE_ENABLED"] = "false"
+        os.environ["RESULT_CACHE_ENABLED"] = "false"
+    if args.no_fix_cache:
+        os.environ["SQL_REPAIR_CACHE_ENABLED"] = "false"
+
+    import pipeline
+    import semantic_layer
+    import sql_repair
+    import tracing
+    tracing.configure_logging()
+
+    try:
+        layer = semantic_layer.get_layer()
+        if args.warmup:
+            asyncio.run(run_corpus(pipeline, layer, corpus, args.warmup, args.concurrency))
+        tracing.histogram().clear()
+        gemini.request_counts.clear()
+        if sql_repair.get_cache():
+            sql_repair.get_cache().clear()
+        records, elapsed = asyncio.run(run_corpus(pipeline, layer, corpus, args.passes, args.concurrency))
+    finally:
+        gemini.shutdown()
+
+    by_kind = {}
+    for kind in sorted({record["kind"] for record in records}):
+        selected = [record for record in records if record["kind"] == kind]
+        by_kind[kind] = latency_summary([r["seconds"] for r in selected], sum(1 for r in selected if r["error"]))
+    report = {
+        "meta": {
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "git_revision": git_revision(),
+            "python": platform.python_version(),
+            "sqlite": sqlite3.sqlite_version,
+            "platform": platform.platform(),
+            "args": vars(args),
+            "tables": tables,
+            "questions": len(corpus),
+        },
+        "end_to_end": latency_summary([r["seconds"] for r in records], sum(1 for r in records if r["error"])),
+        "first_token": latency_summary([r["first_token"] for r in records if r["first_token"] is not None]),
+        "throughput_qps": round(len(records) / elapsed, 3),
+        # Stage work taken off the critical path by running concurrently, and speculative work left unused
+        "overlap_saved_ms_mean": round(sum(r["overlap_saved"] for r in records) / len(records) * 1000, 3),
+        "speculative_wasted_ms_mean": round(sum(r["speculative_wasted"] for r in records) / len(records) * 1000, 3),
+        "by_kind": by_kind,
+        "paths": {path or "failed": sum(1 for r in records if r["path"] == path) for path in ("direct", "vector", None)},
+        "stages": tracing.stats(),
+        "gemini_requests": dict(gemini.request_counts),
+        "repair": repair_summary(records),
+    }
+
+    print(f"{tables['orders']:,} orders, {tables['customers']:,} customers; {len(corpus)} questions x {args.passes} "
+          f"passes at concurrency {args.concurrency}; fake Gemini latency {args.latency_ms} ms")
+    print(f"{'':>22} {'count':>6} {'errors':>6} {'mean ms':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    rows = [("end_to_end", report["end_to_end"]), ("first_token", report["first_token"])]
+    rows += [(f"kind:{kind}", summary) for kind, summary in by_kind.items()]
+    rows += [(f"stage:{name}", summary) for name, summary in report["stages"].items()]
+    for name, summary in rows:
+        print(f"{name:>22} {summary['count']:>6} {summary['errors']:>6} {summary['mean_ms']:9.1f} "
+              f"{summary['p50_ms']:9.1f} {summary['p95_ms']:9.1f} {summary['p99_ms']:9.1f}")
+    print(f"Throughput: {report['throughput_qps']:.2f} questions/s; Gemini requests: {report['gemini_requests']}")
+    print(f"Overlapped stage work: {report['overlap_saved_ms_mean']:.1f} ms saved per question on average, "
+          f"{report['speculative_wasted_ms_mean']:.1f} ms of speculative work unused")
+    repair = report["repair"]
+    if repair["attempted"]:
+        print(f"SQL repair: {repair['repaired']}/{repair['attempted']} repaired ({repair['success_rate']:.0%}), "
+              f"{repair['llm_calls']} model calls, fixed by {repair['fixed_by']}")
+        for source, summary in [("all", repair["added"]), *repair["added_by_source"].items()]:
+            print(f"{'repair:' + source:>22} {summary['count']:>6} {'':>6} {summary['mean_ms']:9.1f} "
+                  f"{summary['p50_ms']:9.1f} {summary['p95_ms']:9.1f} {summary['p99_ms']:9.1f}")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"Report written to {args.output}")
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            compare(json.load(f), report)
+    shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
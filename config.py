@@ -6,4 +6,145 @@ load_dotenv() # Load variables from .env file
 GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
 DATABASE_PATH = os.getenv("DATABASE_PATH")
 SEMANTIC_LAYER_PATH = os.getenv("SEMANTIC_LAYER_PATH")
-CHROMA_DB_PATH = os.getenv("CHROMA_DB_PATH")
\ No newline at end of file
+CHROMA_DB_PATH = os.getenv("CHROMA_DB_PATH")
+
+# Gemini API endpoint root (override to point at a local stub server)
+GEMINI_API_BASE_URL = os.getenv("GEMINI_API_BASE_URL", "https://generativelanguage.googleapis.com/v1beta")
+
+# Batch embedding settings (batchEmbedContents accepts at most 100 requests per call)
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "100"))
+EMBED_MAX_CONCURRENCY = int(os.getenv("EMBED_MAX_CONCURRENCY", "4"))
+
+# Persistent embedding cache (SQLite, LRU-evicted beyond EMBED_CACHE_MAX_ENTRIES vectors)
+EMBED_CACHE_ENABLED = os.getenv("EMBED_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+EMBED_CACHE_PATH = os.getenv("EMBED_CACHE_PATH", "data/embedding_cache.db")
+EMBED_CACHE_MAX_ENTRIES = int(os.getenv("EMBED_CACHE_MAX_ENTRIES", "100000"))
+
+# SQL generation cache: exact tier (normalized question + schema hash) and
+# near-duplicate tier (question embedding cosine similarity >= threshold)
+SQL_CACHE_ENABLED = os.getenv("SQL_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+SQL_CACHE_SIMILARITY_ENABLED = os.getenv("SQL_CACHE_SIMILARITY_ENABLED", "true").lower() in ("1", "true", "yes")
+SQL_CACHE_SIMILARITY_THRESHOLD = float(os.getenv("SQL_CACHE_SIMILARITY_THRESHOLD", "0.97"))
+SQL_CACHE_MAX_ENTRIES = int(os.getenv("SQL_CACHE_MAX_ENTRIES", "1000"))
+SQL_CACHE_TTL_SECONDS = float(os.getenv("SQL_CACHE_TTL_SECONDS", "3600"))
+
+# SQLite connection pool (read-only connections reused across queries)
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "4"))
+DB_POOL_TIMEOUT_SECONDS = float(os.getenv("DB_POOL_TIMEOUT_SECONDS", "10"))
+DB_MMAP_SIZE = int(os.getenv("DB_MMAP_SIZE", str(256 * 1024 * 1024)))
+DB_CACHE_SIZE_KIB = int(os.getenv("DB_CACHE_SIZE_KIB", str(64 * 1024)))
+DB_STATEMENT_CACHE_SIZE = int(os.getenv("DB_STATEMENT_CACHE_SIZE", "256"))
+# Opt-in: switching to WAL persists in the database file and needs write access to it
+DB_ENABLE_WAL = os.getenv("DB_ENABLE_WAL", "false").lower() in ("1", "true", "yes")
+
+# Result fetching: rows are streamed in fetchmany batches and capped by count and approximate size
+QUERY_FETCH_BATCH_SIZE = int(os.getenv("QUERY_FETCH_BATCH_SIZE", "500"))
+QUERY_MAX_ROWS = int(os.getenv("QUERY_MAX_ROWS", "100000"))
+QUERY_MAX_BYTES = int(os.getenv("QUERY_MAX_BYTES", str(64 * 1024 * 1024)))
+
+# SQL guard: generated SQL is compiled under a read-only authorizer and its query plan checked
+# before it runs. Queries whose full table scans multiply to more than SQL_GUARD_MAX_SCAN_ROWS rows
+# are rejected (0 disables); SQL_GUARD_TIMEOUT_SECONDS caps the SQLite time per query (0 disables).
+SQL_GUARD_ENABLED = os.getenv("SQL_GUARD_ENABLED", "true").lower() in ("1", "true", "yes")
+SQL_GUARD_MAX_SCAN_ROWS = int(os.getenv("SQL_GUARD_MAX_SCAN_ROWS", "100000000"))
+SQL_GUARD_LARGE_TABLE_ROWS = int(os.getenv("SQL_GUARD_LARGE_TABLE_ROWS", "1000000")) # Full scans above this are warned about
+SQL_GUARD_TIMEOUT_SECONDS = float(os.getenv("SQL_GUARD_TIMEOUT_SECONDS", "30"))
+# Inject LIMIT QUERY_MAX_ROWS + 1 into queries without one, so SQLite stops at the row cap
+SQL_AUTO_LIMIT = os.getenv("SQL_AUTO_LIMIT", "true").lower() in ("1", "true", "yes")
+
+# SQL repair: a query rejected by SQLite (syntax error, unknown table or column, too expensive) is sent
+# back to the model with the error and the relevant schema for a minimal fix, at most
+# SQL_REPAIR_MAX_ATTEMPTS times within SQL_REPAIR_DEADLINE_SECONDS. Fixes that worked are cached per
+# error fingerprint, so recurring mistakes are fixed locally without another LLM call
+SQL_REPAIR_ENABLED = os.getenv("SQL_REPAIR_ENABLED", "true").lower() in ("1", "true", "yes")
+SQL_REPAIR_MAX_ATTEMPTS = int(os.getenv("SQL_REPAIR_MAX_ATTEMPTS", "2"))
+SQL_REPAIR_DEADLINE_SECONDS = float(os.getenv("SQL_REPAIR_DEADLINE_SECONDS", "20"))
+SQL_REPAIR_CACHE_ENABLED = os.getenv("SQL_REPAIR_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+SQL_REPAIR_CACHE_MAX_ENTRIES = int(os.getenv("SQL_REPAIR_CACHE_MAX_ENTRIES", "1000"))
+
+# Workload log: every executed query is recorded by fingerprint (normalized SQL) with its call
+# count and SQLite time; utils/index_advisor.py reads it to propose indexes
+WORKLOAD_LOG_ENABLED = os.getenv("WORKLOAD_LOG_ENABLED", "true").lower() in ("1", "true", "yes")
+WORKLOAD_LOG_PATH = os.getenv("WORKLOAD_LOG_PATH", "data/workload.db")
+
+# Query result cache: completed results keyed by normalized SQL, LRU-evicted beyond RESULT_CACHE_MAX_BYTES
+# and dropped whenever the database changes (PRAGMA data_version)
+RESULT_CACHE_ENABLED = os.getenv("RESULT_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+RESULT_CACHE_MAX_BYTES = int(os.getenv("RESULT_CACHE_MAX_BYTES", str(128 * 1024 * 1024)))
+RESULT_CACHE_MAX_ENTRY_BYTES = int(os.getenv("RESULT_CACHE_MAX_ENTRY_BYTES", str(8 * 1024 * 1024))) # Larger results are not cached
+RESULT_CACHE_TTL_SECONDS = float(os.getenv("RESULT_CACHE_TTL_SECONDS", "3600"))
+
+# Gemini HTTP client: one pooled keep-alive client shared by all calls
+GEMINI_TIMEOUT_SECONDS = float(os.getenv("GEMINI_TIMEOUT_SECONDS", "60"))
+GEMINI_CONNECT_TIMEOUT_SECONDS = float(os.getenv("GEMINI_CONNECT_TIMEOUT_SECONDS", "10"))
+GEMINI_MAX_RETRIES = int(os.getenv("GEMINI_MAX_RETRIES", "3"))
+GEMINI_BACKOFF_BASE_SECONDS = float(os.getenv("GEMINI_BACKOFF_BASE_SECONDS", "0.5"))
+GEMINI_BACKOFF_MAX_SECONDS = float(os.getenv("GEMINI_BACKOFF_MAX_SECONDS", "8"))
+GEMINI_MAX_CONCURRENCY = int(os.getenv("GEMINI_MAX_CONCURRENCY", "16"))
+GEMINI_RATE_LIMIT_RPS = float(os.getenv("GEMINI_RATE_LIMIT_RPS", "0")) # 0 disables the token bucket
+
+# Answer generation: stream the answer with streamGenerateContent so it can be shown as it is written
+ANSWER_STREAMING_ENABLED = os.getenv("ANSWER_STREAMING_ENABLED", "true").lower() in ("1", "true", "yes")
+
+# The question is embedded once per question and shared by the SQL cache, schema pruning and retrieval;
+# for retrieval it starts as soon as execution picks the vector path, alongside storing the rows.
+# SPECULATIVE_EMBEDDING_ENABLED starts it when the question arrives instead, concurrently with SQL
+# generation, at the cost of an unused embedding call whenever nothing ends up needing it
+SPECULATIVE_EMBEDDING_ENABLED = os.getenv("SPECULATIVE_EMBEDDING_ENABLED", "false").lower() in ("1", "true", "yes")
+
+# Server mode: worker threads for blocking SQLite / ChromaDB work shared by all requests
+DB_WORKERS = int(os.getenv("DB_WORKERS", "8"))
+SERVER_HOST = os.getenv("SERVER_HOST", "127.0.0.1")
+SERVER_PORT = int(os.getenv("SERVER_PORT", "8000"))
+
+# Batch mode (batch.py): questions answered at once; LLM calls are further bounded by GEMINI_MAX_CONCURRENCY
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "8"))
+
+# Answer routing: results within this budget go straight into the answer prompt;
+# larger ones are embedded and retrieved, with a column summary added to the context
+DIRECT_CONTEXT_MAX_ROWS = int(os.getenv("DIRECT_CONTEXT_MAX_ROWS", "50"))
+DIRECT_CONTEXT_MAX_TOKENS = int(os.getenv("DIRECT_CONTEXT_MAX_TOKENS", "2000"))
+RESULT_SUMMARY_TOP_K = int(os.getenv("RESULT_SUMMARY_TOP_K", "5"))
+
+# Row serialization for answer contexts and vector DB documents: "tsv" (default), "markdown" and
+# "jsonl" write the column names once per block of rows, "verbose" repeats them per value.
+# Floats are rounded to ROW_FLOAT_DIGITS decimal places (negative keeps full precision).
+# Stored result rows are grouped VECTOR_ROWS_PER_CHUNK to a document (one embedding each), with
+# documents kept under about VECTOR_CHUNK_MAX_TOKENS tokens
+ROW_FORMAT = os.getenv("ROW_FORMAT", "tsv").lower()
+ROW_FLOAT_DIGITS = int(os.getenv("ROW_FLOAT_DIGITS", "4"))
+VECTOR_ROWS_PER_CHUNK = int(os.getenv("VECTOR_ROWS_PER_CHUNK", "1"))
+VECTOR_CHUNK_MAX_TOKENS = int(os.getenv("VECTOR_CHUNK_MAX_TOKENS", "1500"))
+
+# Lifecycle of stored result sets in the sql_results collection
+VECTOR_RESULT_TTL_SECONDS = float(os.getenv("VECTOR_RESULT_TTL_SECONDS", str(24 * 3600)))
+VECTOR_MAX_ROWS = int(os.getenv("VECTOR_MAX_ROWS", "1000000"))
+VECTOR_GC_INTERVAL_SECONDS = float(os.getenv("VECTOR_GC_INTERVAL_SECONDS", "300")) # 0 disables background GC
+VECTOR_SCOPED_FETCH_MAX_ROWS = int(os.getenv("VECTOR_SCOPED_FETCH_MAX_ROWS", "10000"))
+
+# Vector store backend: "chroma" (persistent, CHROMA_DB_PATH) or "memory" (process-local NumPy
+# matrices, with an HNSW index for result sets of VECTOR_HNSW_THRESHOLD+ rows if hnswlib is installed)
+VECTOR_BACKEND = os.getenv("VECTOR_BACKEND", "chroma").lower()
+VECTOR_HNSW_THRESHOLD = int(os.getenv("VECTOR_HNSW_THRESHOLD", "20000"))
+
+# Schema-pruned SQL prompts: only the top-k tables (and top-k columns per table) matching the
+# question, plus the join keys between them, are sent. Matching blends keyword and embedding scores.
+SCHEMA_PRUNING_ENABLED = os.getenv("SCHEMA_PRUNING_ENABLED", "true").lower() in ("1", "true", "yes")
+SCHEMA_TOP_K_TABLES = int(os.getenv("SCHEMA_TOP_K_TABLES", "5"))
+SCHEMA_TOP_K_COLUMNS = int(os.getenv("SCHEMA_TOP_K_COLUMNS", "10"))
+SCHEMA_EMBEDDING_WEIGHT = float(os.getenv("SCHEMA_EMBEDDING_WEIGHT", "0.5"))
+
+# Semantic layer hot reload: the file is checked for edits this often (0 disables reloading)
+SEMANTIC_LAYER_RELOAD_INTERVAL_SECONDS = float(os.getenv("SEMANTIC_LAYER_RELOAD_INTERVAL_SECONDS", "2"))
+
+# Logging and tracing: diagnostics go through the logging module at LOG_LEVEL. With TRACING_ENABLED,
+# every pipeline stage is recorded as a span (tagged with the query_sequence_id) and sent to the
+# TRACING_EXPORTERS: "histogram" (in-memory latency percentiles, GET /stats), "jsonl" (one span per
+# line in TRACING_JSONL_PATH) and "otlp" (OpenTelemetry OTLP/JSON traces in TRACING_OTLP_PATH)
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+LOG_FORMAT = os.getenv("LOG_FORMAT", "%(asctime)s %(levelname)s %(name)s [%(query_id)s] %(message)s")
+TRACING_ENABLED = os.getenv("TRACING_ENABLED", "false").lower() in ("1", "true", "yes")
+TRACING_EXPORTERS = os.getenv("TRACING_EXPORTERS", "histogram")
+TRACING_JSONL_PATH = os.getenv("TRACING_JSONL_PATH", "data/traces.jsonl")
+TRACING_OTLP_PATH = os.getenv("TRACING_OTLP_PATH", "data/traces.otlp.jsonl")
+TRACING_HISTOGRAM_SAMPLES = int(os.getenv("TRACING_HISTOGRAM_SAMPLES", "10000"))
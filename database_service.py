@@ -1,28 +1,402 @@
+import logging
+import os
+import queue
 import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from urllib.request import pathname2url
 import config
+import result_cache
+import sql_guard
+import tracing
+import workload
+from sql_guard import QueryError
+
+logger = logging.getLogger(__name__)
+
+
+class PoolTimeoutError(Exception):
+    """Raised when no pooled connection becomes free within the checkout timeout."""
+
+
+class ConnectionPool:
+    """
+    Bounded pool of read-only SQLite connections.
+    Connections are opened lazily up to `size`, handed out LIFO so the most
+    recently used (warmest) connection is reused first, and keep their
+    compiled-statement cache and page cache between queries.
+    """
+
+    def __init__(self, database_path: str, size: int, timeout: float):
+        self.database_path = database_path
+        self.size = size
+        self.timeout = timeout
+        self._idle = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._open = 0
+        self.checkouts = 0
+        self.waits = 0
+        self.wait_time = 0.0
+        if config.DB_ENABLE_WAL:
+            self._enable_wal()
+
+    def _enable_wal(self):
+        # journal_mode is persistent in the database file, but can only be
+        # changed from a writable connection; pooled connections are read-only.
+        # mode=rw so that a mistyped path fails here instead of creating an empty database
+        conn = None
+        try:
+            conn = sqlite3.connect(f"file:{pathname2url(os.path.abspath(self.database_path))}?mode=rw", uri=True)
+            conn.execute("PRAGMA journal_mode=WAL")
+        except sqlite3.Error as e:
+            logger.warning("Could not enable WAL mode on %s: %s", self.database_path, e)
+        finally:
+            if conn:
+                conn.close()
+
+    def _connect(self) -> sqlite3.Connection:
+        uri = f"file:{pathname2url(os.path.abspath(self.database_path))}?mode=ro"
+        conn = sqlite3.connect(
+            uri,
+            uri=True,
+            check_same_thread=False, # Connections move between worker threads, one user at a time
+            cached_statements=config.DB_STATEMENT_CACHE_SIZE,
+        )
+        conn.execute(f"PRAGMA mmap_size={int(config.DB_MMAP_SIZE)}")
+        conn.execute(f"PRAGMA cache_size={-int(config.DB_CACHE_SIZE_KIB)}") # Negative value = KiB
+        conn.execute("PRAGMA query_only=ON")
+        return conn
+
+    def _acquire(self) -> sqlite3.Connection:
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            if self._open < self.size:
+                self._open += 1
+                create = True
+            else:
+                create = False
+                self.waits += 1
+        if create:
+            try:
+                return self._connect()
+            except Exception:
+                with self._lock:
+                    self._open -= 1
+                raise
+        wait_start = time.perf_counter()
+        try:
+            return self._idle.get(timeout=self.timeout)
+        except queue.Empty:
+            raise PoolTimeoutError(f"No database connection available after {self.timeout}s")
+        finally:
+            with self._lock:
+                self.wait_time += time.perf_counter() - wait_start
+
+    def checkout(self) -> sqlite3.Connection:
+        """Takes a connection out of the pool; it must be handed back with `release`."""
+        conn = self._acquire()
+        with self._lock:
+            self.checkouts += 1
+        return conn
+
+    def release(self, conn: sqlite3.Connection):
+        if conn.in_transaction:
+            conn.rollback()
+        self._idle.put(conn)
+
+    @contextmanager
+    def connection(self):
+        """Checks a connection out of the pool for the duration of the with-block."""
+        conn = self.checkout()
+        try:
+            yield conn
+        finally:
+            self.release(conn)
+
+    def close(self):
+        """Closes idle connections; connections checked out are closed by nobody, so call when idle."""
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            conn.close()
+            with self._lock:
+                self._open -= 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "size": self.size,
+                "open_connections": self._open,
+                "idle_connections": self._idle.qsize(),
+                "checkouts": self.checkouts,
+                "waits": self.waits,
+                "wait_time_s": round(self.wait_time, 6),
+            }
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool() -> ConnectionPool:
+    """Returns the shared connection pool for config.DATABASE_PATH, creating it on first use."""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                if not config.DATABASE_PATH:
+                    raise RuntimeError("DATABASE_PATH is not set")
+                _pool = ConnectionPool(config.DATABASE_PATH, config.DB_POOL_SIZE, config.DB_POOL_TIMEOUT_SECONDS)
+    return _pool
+
+
+def pool_stats() -> dict:
+    return get_pool().stats()
+
+
+def _row_size(row) -> int:
+    """Rough in-memory footprint of a result row, used for the byte cap."""
+    size = 0
+    for value in row:
+        if isinstance(value, (str, bytes)):
+            size += len(value)
+        else:
+            size += 8
+    return size
+
+
+class QueryResultStream:
+    """
+    Result rows of an executing query, produced as fetchmany batches.
+    Holds a pooled connection until the rows are exhausted or `close` is called,
+    so use it as a context manager. Stops early once `max_rows` rows or roughly
+    `max_bytes` bytes have been produced and sets `truncated`. An error raised
+    while fetching (including running out of the time budget) ends iteration
+    and is kept in `error` as a QueryError. With a `cache_key`, the rows are kept
+    while they fit RESULT_CACHE_MAX_ENTRY_BYTES and stored in the result cache once
+    the stream has run to completion.
+    """
+
+    cached = False
+
+    def __init__(self, pool: ConnectionPool, conn: sqlite3.Connection, cursor: sqlite3.Cursor, sql_query: str,
+                 batch_size: int, max_rows: int, max_bytes: int, budget: sql_guard.TimeBudget,
+                 check: sql_guard.QueryCheck | None = None, cache_key=None, cache_generation: int | None = None):
+        self.sql_query = sql_query
+        self.check = check
+        self.column_names = [description[0] for description in cursor.description] if cursor.description else []
+        self.batch_size = batch_size
+        self.max_rows = max_rows
+        self.max_bytes = max_bytes
+        self.row_count = 0
+        self.byte_count = 0
+        self.truncated = False
+        self.error = None
+        self._pool = pool
+        self._conn = conn
+        self._cursor = cursor
+        self._budget = budget
+        self._cache_key = cache_key
+        self._cache_generation = cache_generation
+        self._cache_rows = [] if cache_key is not None else None
+
+    def __iter__(self):
+        try:
+            while self._cursor is not None and self.row_count < self.max_rows:
+                with self._budget:
+                    rows = self._cursor.fetchmany(min(self.batch_size, self.max_rows - self.row_count))
+                if not rows:
+                    break
+                batch = []
+                for row in rows:
+                    self.byte_count += _row_size(row)
+                    batch.append(row)
+                    if self.byte_count >= self.max_bytes:
+                        self.truncated = True
+                        break
+                self.row_count += len(batch)
+                if self._cache_rows is not None:
+                    self._cache_rows.extend(batch)
+                    if self.byte_count > config.RESULT_CACHE_MAX_ENTRY_BYTES:
+                        self._cache_rows = None # Too large to cache, stop keeping rows
+                yield batch
+                if self.truncated:
+                    break
+            else:
+                # Hit the row cap: truncated only if the query had more rows to give
+                if self._cursor is not None:
+                    with self._budget:
+                        self.truncated = self._cursor.fetchone() is not None
+            self._store_in_cache()
+        except sqlite3.Error as e:
+            self.error = _query_error(e, self.sql_query, self._budget)
+            logger.error("Database error while fetching results: %s [SQL: %s]", self.error, self.sql_query)
+        finally:
+            self.close()
+
+    def _store_in_cache(self):
+        """Caches the complete result; only reached when iteration finished without an error."""
+        cache = result_cache.get_cache()
+        if cache and self._cache_rows is not None:
+            cache.put(self._cache_key, self._cache_generation, result_cache.CachedResult(
+                self.sql_query, self.check, self.column_names, self._cache_rows, self.truncated, self.byte_count
+            ))
+        self._cache_rows = None
+
+    def close(self):
+        """Returns the connection to the pool and logs the query to the workload log; safe to call more than once."""
+        if self._cursor is not None:
+            self._cursor.close()
+            self._cursor = None
+            self._pool.release(self._conn)
+            self._conn = None
+            workload.record(self.sql_query, self._budget.used, self.row_count, self.error is not None)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+class CachedResultStream:
+    """A result served from the result cache, with the same interface as QueryResultStream."""
+
+    cached = True
+
+    def __init__(self, entry: result_cache.CachedResult, batch_size: int):
+        self.sql_query = entry.sql
+        self.check = entry.check
+        self.column_names = entry.column_names
+        self.batch_size = batch_size
+        self.row_count = len(entry.rows)
+        self.byte_count = entry.byte_count
+        self.truncated = entry.truncated
+        self.error = None
+        self._rows = entry.rows
+
+    def __iter__(self):
+        for start in range(0, len(self._rows), self.batch_size):
+            yield self._rows[start:start + self.batch_size]
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+def _query_error(error: sqlite3.Error, sql_query: str, budget: sql_guard.TimeBudget) -> QueryError:
+    if budget.expired:
+        return budget.error(sql_query)
+    return QueryError("database", f"Database Error: {error}", sql_query)
+
+
+def execute_sql_query_stream(sql_query: str, batch_size: int | None = None, max_rows: int | None = None,
+                             max_bytes: int | None = None, limit: int | None = None,
+                             timeout_seconds: float | None = None):
+    """
+    Executes a query and returns (stream, error). Rows are not fetched until the
+    stream is iterated, so memory stays bounded by one batch no matter how many
+    rows the query produces.
+    Unless SQL_GUARD_ENABLED is off, the SQL is first checked by sql_guard (read-only,
+    estimated scan cost; a LIMIT is injected when `limit` is given), and the SQLite
+    time spent executing and fetching is capped at `timeout_seconds`
+    (SQL_GUARD_TIMEOUT_SECONDS by default). `error` is a sql_guard.QueryError.
+    When the result cache holds a complete result for the same normalized SQL and
+    caps, a CachedResultStream is returned instead and SQLite is not touched.
+    """
+    with tracing.span("db.query") as span:
+        stream, error = _open_stream(sql_query, batch_size, max_rows, max_bytes, limit, timeout_seconds)
+        if error:
+            span.set(error=error.code)
+        else:
+            span.set(result_cache_hit=stream.cached)
+            if stream.check:
+                span.set(estimated_rows_scanned=stream.check.estimated_rows_scanned,
+                         full_scans=len(stream.check.full_scans), limit_injected=stream.check.limit_injected)
+        return stream, error
+
+
+def _open_stream(sql_query: str, batch_size: int | None, max_rows: int | None, max_bytes: int | None,
+                 limit: int | None, timeout_seconds: float | None):
+    batch_size = batch_size or config.QUERY_FETCH_BATCH_SIZE
+    max_rows = max_rows if max_rows is not None else config.QUERY_MAX_ROWS
+    max_bytes = max_bytes if max_bytes is not None else config.QUERY_MAX_BYTES
+    cache = result_cache.get_cache()
+    key = generation = None
+    if cache and result_cache.is_cacheable(sql_query):
+        key = result_cache.cache_key(sql_query, limit, max_rows, max_bytes)
+        entry, generation = cache.lookup(key)
+        if entry is not None:
+            logger.info("Cached result for SQL: %s", entry.sql)
+            # Counted as a call that spent no SQLite time, so call counts reflect what is asked
+            workload.record(sql_query, 0.0, len(entry.rows))
+            return CachedResultStream(entry, batch_size), None
 
-def execute_sql_query(sql_query: str):
-    """Executes a given SQL query against the database and returns results."""
     conn = None
-    results = []
-    column_names = []
+    check = None
     try:
-        conn = sqlite3.connect(config.DATABASE_PATH)
-        cursor = conn.cursor()
-        cursor.execute(sql_query)
-        results = cursor.fetchall()
-        column_names = [description[0] for description in cursor.description] if cursor.description else []
-        print(f"Executed SQL: {sql_query}")
-        # print(f"Results: {results}") # Optional: print results for debugging
-    except sqlite3.Error as e:
-        print(f"Database error executing query: {e}")
-        print(f"SQL Query: {sql_query}")
-        return None, None, f"Database Error: {e}" # Return error message
+        pool = get_pool()
+        conn = pool.checkout()
+        if config.SQL_GUARD_ENABLED:
+            check = sql_guard.check_query(conn, sql_query, limit)
+            sql_query = check.sql
+            if check.warnings:
+                logger.warning("SQL warnings: %s", "; ".join(check.warnings))
+        budget = sql_guard.TimeBudget(
+            conn, config.SQL_GUARD_TIMEOUT_SECONDS if timeout_seconds is None else timeout_seconds
+        )
+        try:
+            with budget:
+                cursor = conn.execute(sql_query)
+        except sqlite3.Error as e:
+            workload.record(sql_query, budget.used, 0, failed=True)
+            raise _query_error(e, sql_query, budget)
+        logger.info("Executed SQL: %s", sql_query)
+        stream = QueryResultStream(pool, conn, cursor, sql_query, batch_size, max_rows, max_bytes, budget, check,
+                                   key, generation)
+        return stream, None
+    except QueryError as e:
+        if conn is not None:
+            pool.release(conn)
+        logger.warning("Query rejected or failed (%s): %s [SQL: %s]", e.code, e, sql_query)
+        return None, e
+    except PoolTimeoutError as e:
+        logger.warning("Database busy: %s", e)
+        return None, QueryError("pool_timeout", f"Database busy: {e}", sql_query)
     except Exception as e:
-        print(f"An unexpected error occurred during database execution: {e}")
-        print(f"SQL Query: {sql_query}")
-        return None, None, f"Execution Error: {e}" # Return error message
-    finally:
-        if conn:
-            conn.close()
-    return results, column_names, None # Return results, columns, no error
\ No newline at end of file
+        if conn is not None:
+            pool.release(conn)
+        logger.exception("An unexpected error occurred during database execution: %s [SQL: %s]", e, sql_query)
+        return None, QueryError("database", f"Execution Error: {e}", sql_query)
+
+
+def execute_sql_query(sql_query: str):
+    """
+    Executes a given SQL query against the database and returns results.
+    Results are capped by QUERY_MAX_ROWS / QUERY_MAX_BYTES; use
+    execute_sql_query_stream to consume large results incrementally.
+    The error, if any, is a sql_guard.QueryError.
+    """
+    stream, error = execute_sql_query_stream(sql_query)
+    if error:
+        return None, None, error
+    results = []
+    with stream:
+        for batch in stream:
+            results.extend(batch)
+    if stream.error:
+        return None, None, stream.error
+    if stream.truncated:
+        logger.info("Results truncated to %d rows.", stream.row_count)
+    return results, stream.column_names, None # Return results, columns, no error
@@ -0,0 +1,182 @@
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import time
+from array import array
+import config
+
+logger = logging.getLogger(__name__)
+
+# SQLite limits the number of host parameters per statement; stay well below it
+_SQL_CHUNK_SIZE = 500
+
+
+def _cache_key(model: str, text: str) -> str:
+    """Content address of an embedding: hash of model name plus the exact text."""
+    return hashlib.sha256(f"{model}\0{text}".encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    """
+    On-disk embedding cache stored in SQLite.
+    Vectors are stored as packed float32 blobs. Once the cache holds more than
+    `max_entries` vectors, the least recently used ones are evicted.
+    """
+
+    def __init__(self, path: str, max_entries: int):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        # Autocommit mode; every write below is a single statement or explicit transaction
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute('''
+            CREATE TABLE IF NOT EXISTS embeddings (
+                key TEXT PRIMARY KEY,
+                vector BLOB NOT NULL,
+                last_used REAL NOT NULL
+            )
+        ''')
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_embeddings_last_used ON embeddings(last_used)")
+        self._count = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+
+    def get_many(self, model: str, texts: list[str]) -> list[list[float] | None]:
+        """Returns cached embeddings aligned with `texts` (None for misses)."""
+        keys = [_cache_key(model, text) for text in texts]
+        found = {}
+        with self._lock:
+            for start in range(0, len(keys), _SQL_CHUNK_SIZE):
+                chunk = keys[start:start + _SQL_CHUNK_SIZE]
+                placeholders = ",".join("?" * len(chunk))
+                rows = self._conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", chunk
+                ).fetchall()
+                found.update(rows)
+                if rows:
+                    # Touch hits so LRU eviction keeps them
+                    hit_keys = [key for key, _ in rows]
+                    self._conn.execute(
+                        f"UPDATE embeddings SET last_used = ? WHERE key IN ({','.join('?' * len(hit_keys))})",
+                        [time.time(), *hit_keys]
+                    )
+            hits = sum(1 for key in keys if key in found)
+            self.hits += hits
+            self.misses += len(keys) - hits
+
+        results = []
+        for key in keys:
+            blob = found.get(key)
+            if blob is None:
+                results.append(None)
+            else:
+                vector = array('f')
+                vector.frombytes(blob)
+                results.append(vector.tolist())
+        return results
+
+    def put_many(self, model: str, texts: list[str], embeddings: list[list[float]]):
+        """Stores embeddings for `texts`, then evicts least recently used entries if over capacity."""
+        now = time.time()
+        rows = [
+            (_cache_key(model, text), array('f', embedding).tobytes(), now)
+            for text, embedding in zip(texts, embeddings)
+            if embedding is not None
+        ]
+        if not rows:
+            return
+        with self._lock:
+            before = self._conn.total_changes
+            self._conn.execute("BEGIN")
+            try:
+                self._conn.executemany(
+                    "INSERT OR IGNORE INTO embeddings (key, vector, last_used) VALUES (?, ?, ?)", rows
+                )
+            except BaseException:
+                self._conn.execute("ROLLBACK") # Otherwise the connection stays inside the failed transaction
+                raise
+            self._conn.execute("COMMIT")
+            self._count += self._conn.total_changes - before
+
+            overflow = self._count - self.max_entries
+            if overflow > 0:
+                self._conn.execute(
+                    "DELETE FROM embeddings WHERE key IN (SELECT key FROM embeddings ORDER BY last_used LIMIT ?)",
+                    (overflow,)
+                )
+                self._count -= overflow
+                self.evictions += overflow
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM embeddings")
+            self._count = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": self._count,
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+            }
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_cache() -> EmbeddingCache | None:
+    """Returns the shared cache, creating it on first use. None when disabled or unavailable."""
+    global _cache
+    if not config.EMBED_CACHE_ENABLED:
+        return None
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                try:
+                    _cache = EmbeddingCache(config.EMBED_CACHE_PATH, config.EMBED_CACHE_MAX_ENTRIES)
+                except sqlite3.Error as e:
+                    logger.error("Error opening embedding cache at %s: %s", config.EMBED_CACHE_PATH, e)
+                    config.EMBED_CACHE_ENABLED = False # Don't retry on every call
+                    return None
+    return _cache
+
+
+def lookup(model: str, texts: list[str]) -> list[list[float] | None]:
+    """Cached embeddings aligned with `texts`; all None when the cache is off."""
+    cache = get_cache()
+    if cache is None:
+        return [None] * len(texts)
+    try:
+        return cache.get_many(model, texts)
+    except sqlite3.Error as e:
+        logger.warning("Embedding cache lookup failed: %s", e)
+        return [None] * len(texts)
+
+
+def store(model: str, texts: list[str], embeddings: list[list[float] | None]):
+    """Adds freshly generated embeddings to the cache (None entries are skipped)."""
+    cache = get_cache()
+    if cache is None:
+        return
+    try:
+        cache.put_many(model, texts, embeddings)
+    except sqlite3.Error as e:
+        logger.warning("Embedding cache write failed: %s", e)
+
+
+def stats() -> dict:
+    cache = get_cache()
+    return cache.stats() if cache else {"enabled": False}
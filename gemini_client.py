@@ -0,0 +1,303 @@
+import asyncio
+import concurrent.futures
+import json
+import logging
+import random
+import threading
+import time
+from typing import TYPE_CHECKING
+import config
+import tracing
+
+if TYPE_CHECKING:
+    import httpx
+
+logger = logging.getLogger(__name__)
+
+# Status codes worth retrying: rate limiting and transient server errors
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+
+
+class GeminiError(Exception):
+    """A streamed request failed: the request was rejected, retries ran out or the stream broke off."""
+
+
+class TokenBucket:
+    """Async token-bucket rate limiter: `rate` requests per second with bursts up to `burst`."""
+
+    def __init__(self, rate: float, burst: int | None = None):
+        self.rate = rate
+        self.capacity = burst or max(1, int(rate))
+        self._tokens = float(self.capacity)
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+class GeminiClient:
+    """
+    Shared HTTP client for the Gemini API.
+    A single httpx.AsyncClient (keep-alive connection pool) lives on a dedicated
+    event-loop thread, so every caller reuses the same TCP/TLS connections:
+    sync code blocks on `run`, async code on any loop awaits `post_json` or
+    iterates `stream_json`. All requests share one concurrency semaphore, an
+    optional token bucket, per-call timeouts and exponential-backoff retries on
+    429/5xx (for streams, only until the first chunk has arrived).
+    """
+
+    def __init__(self):
+        self._loop = None
+        self._client = None
+        self._semaphore = None
+        self._rate_limiter = None
+        self._start_lock = threading.Lock()
+        self.requests = 0
+        self.retries = 0
+        self.failures = 0
+
+    def _ensure_started(self) -> asyncio.AbstractEventLoop:
+        if self._loop is None:
+            with self._start_lock:
+                if self._loop is None:
+                    loop = asyncio.new_event_loop()
+                    threading.Thread(target=loop.run_forever, name="gemini-client", daemon=True).start()
+                    asyncio.run_coroutine_threadsafe(self._setup(), loop).result()
+                    self._loop = loop
+        return self._loop
+
+    def start(self):
+        """Starts the event-loop thread and the HTTP client now rather than on the first request."""
+        self._ensure_started()
+
+    @property
+    def started(self) -> bool:
+        return self._loop is not None
+
+    async def _setup(self):
+        import httpx # Imported on first use: it is the heaviest import on the CLI path
+        self._client = httpx.AsyncClient(
+            timeout=httpx.Timeout(config.GEMINI_TIMEOUT_SECONDS, connect=config.GEMINI_CONNECT_TIMEOUT_SECONDS),
+            limits=httpx.Limits(
+                max_connections=config.GEMINI_MAX_CONCURRENCY,
+                max_keepalive_connections=config.GEMINI_MAX_CONCURRENCY,
+            ),
+            headers={'Content-Type': 'application/json'},
+        )
+        self._semaphore = asyncio.Semaphore(config.GEMINI_MAX_CONCURRENCY)
+        if config.GEMINI_RATE_LIMIT_RPS > 0:
+            self._rate_limiter = TokenBucket(config.GEMINI_RATE_LIMIT_RPS)
+
+    def run(self, coro):
+        """Runs a coroutine on the client's event loop and blocks until it finishes."""
+        loop = self._ensure_started()
+        if threading.current_thread().name == "gemini-client":
+            coro.close()
+            raise RuntimeError("GeminiClient.run() called from the client's own event loop; await the coroutine instead.")
+        return asyncio.run_coroutine_threadsafe(coro, loop).result()
+
+    def submit(self, coro) -> concurrent.futures.Future:
+        """Schedules a coroutine on the client's event loop without waiting for it."""
+        return asyncio.run_coroutine_threadsafe(coro, self._ensure_started())
+
+    async def post_json(self, url: str, data: dict) -> dict | None:
+        """POSTs `data` as JSON and returns the decoded response, or None after logging the error."""
+        loop = self._ensure_started()
+        if asyncio.get_running_loop() is loop:
+            return await self._post_with_retries(url, data)
+        # Called from another event loop: the request still runs on the shared client's loop
+        return await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(self._post_with_retries(url, data), loop))
+
+    def _backoff_delay(self, attempt: int, response: "httpx.Response | None") -> float:
+        retry_after = response.headers.get("Retry-After") if response is not None else None
+        if retry_after:
+            try:
+                return min(float(retry_after), config.GEMINI_BACKOFF_MAX_SECONDS)
+            except ValueError:
+                pass
+        delay = min(config.GEMINI_BACKOFF_BASE_SECONDS * (2 ** attempt), config.GEMINI_BACKOFF_MAX_SECONDS)
+        return delay * random.uniform(0.5, 1.0) # Jitter so concurrent retries spread out
+
+    async def _post_with_retries(self, url: str, data: dict) -> dict | None:
+        # "models/<model>:<method>" without the API key query string
+        with tracing.span("gemini.request", endpoint=url.split("?", 1)[0].rsplit("/", 2)[-1]) as span:
+            result = await self._post_attempts(url, data, span)
+            span.set(ok=result is not None)
+            return result
+
+    async def _post_attempts(self, url: str, data: dict, span) -> dict | None:
+        import httpx
+        for attempt in range(config.GEMINI_MAX_RETRIES + 1):
+            response = None
+            error = None
+            try:
+                if self._rate_limiter:
+                    await self._rate_limiter.acquire()
+                async with self._semaphore:
+                    self.requests += 1
+                    response = await self._client.post(url, json=data)
+                span.set(attempts=attempt + 1, status=response.status_code,
+                         request_bytes=len(response.request.content), response_bytes=len(response.content))
+                if response.status_code not in RETRYABLE_STATUS_CODES:
+                    response.raise_for_status() # Raises HTTPStatusError for other 4xx/5xx
+                    result = response.json()
+                    usage = result.get("usageMetadata") if isinstance(result, dict) else None
+                    if usage:
+                        span.set(prompt_tokens=usage.get("promptTokenCount", 0),
+                                 output_tokens=usage.get("candidatesTokenCount", 0))
+                    return result
+                error = f"HTTP {response.status_code}"
+            except httpx.TransportError as e: # Connection errors and timeouts are retried
+                error = f"{type(e).__name__}: {e}"
+            except httpx.HTTPStatusError as e:
+                logger.error("API request failed: %s (status %s). Response body: %s",
+                             e, e.response.status_code, e.response.text)
+                self.failures += 1
+                return None
+            except json.JSONDecodeError:
+                logger.error("API response was not valid JSON.")
+                self.failures += 1
+                return None
+
+            if attempt < config.GEMINI_MAX_RETRIES:
+                self.retries += 1
+                delay = self._backoff_delay(attempt, response)
+                logger.warning("API request attempt %d failed (%s), retrying in %.2fs", attempt + 1, error, delay)
+                await asyncio.sleep(delay)
+
+        span.set(attempts=config.GEMINI_MAX_RETRIES + 1, error=error)
+        logger.error("API request failed after %d attempts: %s. Response body: %s", config.GEMINI_MAX_RETRIES + 1,
+                     error, response.text if response is not None else None)
+        self.failures += 1
+        return None
+
+    async def stream_json(self, url: str, data: dict):
+        """
+        POSTs `data` to a server-sent-events endpoint (e.g. streamGenerateContent?alt=sse)
+        and yields each decoded event as it arrives. Raises GeminiError if the request
+        fails or the stream breaks off. Usable from any event loop: the request always
+        runs in one task on the client's loop and events are handed over through a queue.
+        """
+        caller = asyncio.get_running_loop()
+        events = asyncio.Queue()
+
+        def put(item):
+            try:
+                caller.call_soon_threadsafe(events.put_nowait, item)
+            except RuntimeError:
+                pass # The caller's loop has closed: nobody is reading any more
+
+        async def pump():
+            try:
+                async for event in self._stream_with_retries(url, data):
+                    put((True, event))
+                put((False, None))
+            except BaseException as e: # Including cancellation, so the consumer never waits forever
+                put((False, e))
+                if isinstance(e, asyncio.CancelledError):
+                    raise
+
+        future = self.submit(pump())
+        try:
+            while True:
+                is_event, value = await events.get()
+                if is_event:
+                    yield value
+                elif value is None:
+                    return
+                elif isinstance(value, asyncio.CancelledError):
+                    raise GeminiError("Stream cancelled")
+                else:
+                    raise value
+        finally:
+            future.cancel() # Consumer stopped early: close the HTTP stream
+
+    async def _stream_with_retries(self, url: str, data: dict):
+        with tracing.span("gemini.request", endpoint=url.split("?", 1)[0].rsplit("/", 2)[-1], streamed=True) as span:
+            started = time.perf_counter()
+            chunks = 0
+            try:
+                async for event in self._stream_attempts(url, data, span):
+                    if chunks == 0:
+                        span.set(first_chunk_ms=round((time.perf_counter() - started) * 1000, 3))
+                    chunks += 1
+                    usage = event.get("usageMetadata") if isinstance(event, dict) else None
+                    if usage:
+                        span.set(prompt_tokens=usage.get("promptTokenCount", 0),
+                                 output_tokens=usage.get("candidatesTokenCount", 0))
+                    yield event
+                span.set(ok=True)
+            except BaseException:
+                span.set(ok=False)
+                raise
+            finally:
+                span.set(chunks=chunks)
+
+    async def _stream_attempts(self, url: str, data: dict, span):
+        import httpx
+        for attempt in range(config.GEMINI_MAX_RETRIES + 1):
+            response = None
+            status = None
+            body = None
+            received = 0
+            try:
+                if self._rate_limiter:
+                    await self._rate_limiter.acquire()
+                async with self._semaphore:
+                    self.requests += 1
+                    async with self._client.stream("POST", url, json=data) as response:
+                        status = response.status_code
+                        span.set(attempts=attempt + 1, status=status)
+                        if status >= 400:
+                            body = (await response.aread()).decode("utf-8", "replace")
+                        else:
+                            async for line in response.aiter_lines():
+                                if not line.startswith("data:"):
+                                    continue # Blank separators and SSE comments
+                                received += 1
+                                yield json.loads(line[5:])
+                            return
+            except httpx.TransportError as e:
+                if received:
+                    # Text was already handed out; a retry would repeat it
+                    self.failures += 1
+                    logger.error("Stream broke off after %d events: %s: %s", received, type(e).__name__, e)
+                    raise GeminiError(f"Stream interrupted: {type(e).__name__}: {e}") from e
+                error = f"{type(e).__name__}: {e}"
+            except json.JSONDecodeError as e:
+                self.failures += 1
+                logger.error("Stream event was not valid JSON: %s", e)
+                raise GeminiError("Stream event was not valid JSON.") from e
+            else:
+                error = f"HTTP {status}"
+                if status not in RETRYABLE_STATUS_CODES:
+                    self.failures += 1
+                    logger.error("API stream request failed (status %s). Response body: %s", status, body)
+                    raise GeminiError(f"API request failed with status {status}")
+
+            if attempt < config.GEMINI_MAX_RETRIES:
+                self.retries += 1
+                delay = self._backoff_delay(attempt, response) # Headers stay readable after the stream closes
+                logger.warning("API stream attempt %d failed (%s), retrying in %.2fs", attempt + 1, error, delay)
+                await asyncio.sleep(delay)
+
+        span.set(error=error)
+        self.failures += 1
+        logger.error("API stream request failed after %d attempts: %s. Response body: %s",
+                     config.GEMINI_MAX_RETRIES + 1, error, body)
+        raise GeminiError(f"API request failed after {config.GEMINI_MAX_RETRIES + 1} attempts: {error}")
+
+    def stats(self) -> dict:
+        return {"requests": self.requests, "retries": self.retries, "failures": self.failures}
+
+
+client = GeminiClient()
@@ -1,63 +1,98 @@
-import requests
+import asyncio
 import json
+import logging
+import queue
+import time
 import config
-import os # Import os to check if API key is set
+import embedding_cache
+import sql_cache
+import tracing
+from gemini_client import GeminiError, client as gemini_client
+
+logger = logging.getLogger(__name__)
 
 # Base URL for Gemini API (generateContent endpoint)
 # Note: The model name is part of the URL path
-GEMINI_GENERATE_URL = "https://generativelanguage.googleapis.com/v1beta/models/{model}:generateContent"
+GEMINI_GENERATE_URL = config.GEMINI_API_BASE_URL + "/models/{model}:generateContent"
+# Streaming variant: server-sent events, one partial response per event
+GEMINI_STREAM_URL = config.GEMINI_API_BASE_URL + "/models/{model}:streamGenerateContent"
 # Base URL for Gemini API (embedContent endpoint)
-GEMINI_EMBED_URL = "https://generativelanguage.googleapis.com/v1beta/models/{model}:embedContent"
+GEMINI_EMBED_URL = config.GEMINI_API_BASE_URL + "/models/{model}:embedContent"
+# Base URL for Gemini API (batchEmbedContents endpoint, up to 100 texts per call)
+GEMINI_BATCH_EMBED_URL = config.GEMINI_API_BASE_URL + "/models/{model}:batchEmbedContents"
 
 # Choose model names (as strings now)
 GEN_MODEL_NAME = 'gemini-2.0-flash' # Or 'gemini-1.5-flash-latest', 'gemini-1.5-pro-latest', etc.
 EMBEDDING_MODEL_NAME = 'embedding-001' # The standard embedding model name
 
+# The async functions below are the implementation; the sync functions of the
+# same name without the _async suffix are thin wrappers that run them on the
+# shared Gemini client's event loop.
+
 # --- Helper function to make the API call ---
-def _call_gemini_api(url: str, data: dict) -> dict | None:
+async def _call_gemini_api_async(url: str, data: dict) -> dict | None:
     """Helper to make POST request to Gemini API and handle basic errors."""
     if not config.GOOGLE_API_KEY:
-        print("Error: GOOGLE_API_KEY not found. Cannot call Gemini API.")
+        logger.error("GOOGLE_API_KEY not found. Cannot call Gemini API.")
         return None
 
     # Add API key to the URL as per the curl example
     full_url = f"{url}?key={config.GOOGLE_API_KEY}"
 
-    headers = {
-        'Content-Type': 'application/json'
-    }
-
     try:
-        # Use json=data directly with requests, it handles serialization
-        response = requests.post(full_url, headers=headers, json=data)
-
-        # Check for successful response status code
-        response.raise_for_status() # Raises HTTPError for bad responses (4xx or 5xx)
-
-        return response.json()
-
-    except requests.exceptions.RequestException as e:
-        print(f"API request failed: {e}")
-        if hasattr(e, 'response') and e.response is not None:
-             print(f"Status Code: {e.response.status_code}")
-             try:
-                 print(f"Response Body: {e.response.json()}")
-             except json.JSONDecodeError:
-                 print(f"Response Body: {e.response.text}")
-        return None
-    except json.JSONDecodeError:
-        print("API response was not valid JSON.")
-        return None
+        # Timeouts, retries on 429/5xx and concurrency limits are handled by the shared client
+        return await gemini_client.post_json(full_url, data)
     except Exception as e:
-        print(f"An unexpected error occurred during API call: {e}")
+        logger.exception("An unexpected error occurred during API call: %s", e)
         return None
 
+
+def _call_gemini_api(url: str, data: dict) -> dict | None:
+    return gemini_client.run(_call_gemini_api_async(url, data))
+
 # --- SQL Generation Function ---
-def generate_sql(user_query: str, semantic_layer_text: str) -> str | None:
+async def generate_sql_async(user_query: str, semantic_layer_text: str, use_cache: bool = True,
+                             schema_index=None, embed_question=None) -> str | None:
     """
     Generates an SQL query using the Gemini API.
-    Passes the semantic_layer_text (formatted JSON) directly in the prompt.
+    Passes the semantic_layer_text (formatted JSON) directly in the prompt, or, when a
+    schema_index.SchemaIndex is given, only the part of the schema relevant to the question.
+    Identical or near-identical questions against the same schema are answered
+    from the SQL cache without calling the API.
+    The question's embedding is only computed when the similarity tier or the schema
+    index needs it; `embed_question`, if given, is an async callable supplying it
+    instead (e.g. one already in flight that retrieval will reuse).
     """
+    with tracing.span("llm.generate_sql") as span:
+        return await _generate_sql(user_query, semantic_layer_text, use_cache, schema_index,
+                                   embed_question or (lambda: embed_text_async(user_query)), span)
+
+
+async def _generate_sql(user_query: str, semantic_layer_text: str, use_cache: bool, schema_index, embed_question,
+                        span) -> str | None:
+    cache = sql_cache.get_cache() if use_cache else None
+    question_embedding = None
+    if cache:
+        cached_sql = cache.get_exact(user_query, semantic_layer_text)
+        tier = "exact"
+        if not cached_sql:
+            if config.SQL_CACHE_SIMILARITY_ENABLED:
+                question_embedding = await embed_question()
+            cached_sql = cache.get_similar(user_query, semantic_layer_text, question_embedding)
+            tier = "similar"
+        if cached_sql:
+            span.set(cache_hit=tier)
+            logger.info("Generated SQL (cache hit, %s): %s", tier, cached_sql)
+            return cached_sql
+    span.set(cache_hit=False)
+
+    schema_text = semantic_layer_text
+    if schema_index:
+        if question_embedding is None and schema_index.has_embeddings:
+            question_embedding = await embed_question()
+        schema_text = schema_index.prompt_text(user_query, question_embedding)
+        logger.info("Schema context: %d chars (full schema: %d chars)", len(schema_text), len(semantic_layer_text))
+
     prompt = f"""
 You are a highly skilled AI assistant that translates natural language questions into SQL queries.
 Use the provided database schema description below to write a valid SQLite query.
@@ -68,13 +103,14 @@ Ensure the query is correct SQLite syntax.
 Return only the SQL query, nothing else.
 
 Database Schema Description:
-{semantic_layer_text}
+{schema_text}
 
 User Question:
 {user_query}
 
 SQL Query:
 """
+    span.set(schema_chars=len(schema_text), prompt_chars=len(prompt))
 
     api_url = GEMINI_GENERATE_URL.format(model=GEN_MODEL_NAME)
     request_body = {
@@ -94,12 +130,21 @@ SQL Query:
         # }
     }
 
-    response_json = _call_gemini_api(api_url, request_body)
+    response_json = await _call_gemini_api_async(api_url, request_body)
+    generated_sql = _sql_from_response(response_json, "SQL generation")
+    if generated_sql:
+        logger.info("Generated SQL: %s", generated_sql)
+        if cache:
+            cache.put(user_query, semantic_layer_text, generated_sql, question_embedding)
+    return generated_sql
+
 
+def _sql_from_response(response_json: dict | None, purpose: str) -> str | None:
+    """The SQL text of a generateContent response, without markdown fences (None if there is none)."""
     if response_json and 'candidates' in response_json:
         try:
             generated_sql = response_json['candidates'][0]['content']['parts'][0]['text']
-            print("before stripping generated_sql ----------------- \n", generated_sql)
+            logger.debug("Raw %s response: %s", purpose, generated_sql)
             # Clean up potential markdown or extra text
             generated_sql = generated_sql.strip()
             # Remove markdown code block if present
@@ -109,30 +154,69 @@ SQL Query:
                  generated_sql = generated_sql[9:].strip()     
             if generated_sql.endswith("```"):
                  generated_sql = generated_sql[:-3].strip()
-
-            print(f"Generated SQL: {generated_sql}")
             return generated_sql
         except (KeyError, IndexError, TypeError) as e:
-            print(f"Error parsing SQL generation response structure: {e}")
-            print(f"Full Response: {json.dumps(response_json, indent=2)}")
+            logger.error("Error parsing %s response structure: %s. Full response: %s", purpose, e,
+                         json.dumps(response_json))
             return None
     elif response_json and 'promptFeedback' in response_json:
          safety_ratings = response_json.get('promptFeedback', {}).get('safetyRatings')
-         print(f"SQL generation blocked by safety filters: {safety_ratings}")
+         logger.warning("%s blocked by safety filters: %s", purpose, safety_ratings)
          return None
     else:
-        print("SQL generation failed: No valid response received.")
-        print(f"Full Response: {json.dumps(response_json, indent=2)}")
+        logger.error("%s failed: No valid response received. Full response: %s", purpose, json.dumps(response_json))
         return None
 
 
-# --- Answer Generation Function ---
-def generate_answer(user_query: str, retrieved_data: str) -> str | None:
+def generate_sql(user_query: str, semantic_layer_text: str, use_cache: bool = True, schema_index=None) -> str | None:
+    return gemini_client.run(generate_sql_async(user_query, semantic_layer_text, use_cache, schema_index))
+
+
+# --- SQL Repair Function ---
+async def repair_sql_async(user_query: str, failing_sql: str, error_message: str, schema_text: str) -> str | None:
     """
-    Generates a natural language answer using the Gemini API based on
-    the original user query and retrieved data.
+    Asks the model for a minimal fix of SQL that SQLite rejected: the question, the
+    failing query, the error and the relevant part of the schema go in, a corrected
+    query (or None) comes out. Not cached here; see sql_repair.FixCache.
     """
-    prompt = f"""
+    with tracing.span("llm.repair_sql", schema_chars=len(schema_text)) as span:
+        prompt = f"""
+You are a highly skilled AI assistant that fixes SQLite queries.
+The SQL query below was written for the user question but SQLite rejected it with the error shown.
+Make the smallest change that fixes the error, using only the tables and columns in the schema description.
+Keep everything else in the query as it is.
+Return only the corrected SQL query, nothing else.
+
+Database Schema Description:
+{schema_text}
+
+User Question:
+{user_query}
+
+Failing SQL Query:
+{failing_sql}
+
+SQLite Error:
+{error_message}
+
+Corrected SQL Query:
+"""
+        span.set(prompt_chars=len(prompt))
+        request_body = {"contents": [{"parts": [{"text": prompt}]}]}
+        response_json = await _call_gemini_api_async(GEMINI_GENERATE_URL.format(model=GEN_MODEL_NAME), request_body)
+        repaired_sql = _sql_from_response(response_json, "SQL repair")
+        if repaired_sql:
+            logger.info("Repaired SQL: %s", repaired_sql)
+        return repaired_sql
+
+
+def repair_sql(user_query: str, failing_sql: str, error_message: str, schema_text: str) -> str | None:
+    return gemini_client.run(repair_sql_async(user_query, failing_sql, error_message, schema_text))
+
+
+# --- Answer Generation Function ---
+def _answer_prompt(user_query: str, retrieved_data: str) -> str:
+    return f"""
 You are an AI assistant helping a user understand data.
 The user asked the following question: "{user_query}"
 You have retrieved the following relevant data:
@@ -146,6 +230,19 @@ Do not include the SQL query, table names, column names, or other technical data
 Present the information in a user-friendly way.
 """
 
+
+async def generate_answer_async(user_query: str, retrieved_data: str) -> str | None:
+    """
+    Generates a natural language answer using the Gemini API based on
+    the original user query and retrieved data.
+    """
+    with tracing.span("llm.generate_answer", context_chars=len(retrieved_data or "")):
+        return await _generate_answer(user_query, retrieved_data)
+
+
+async def _generate_answer(user_query: str, retrieved_data: str) -> str | None:
+    prompt = _answer_prompt(user_query, retrieved_data)
+
     api_url = GEMINI_GENERATE_URL.format(model=GEN_MODEL_NAME)
     request_body = {
         "contents": [
@@ -163,35 +260,172 @@ Present the information in a user-friendly way.
         # }
     }
 
-    response_json = _call_gemini_api(api_url, request_body)
+    response_json = await _call_gemini_api_async(api_url, request_body)
 
     if response_json and 'candidates' in response_json:
         try:
             answer = response_json['candidates'][0]['content']['parts'][0]['text']
-            print(f"Generated Answer: {answer}")
+            logger.info("Generated Answer: %s", answer)
             return answer.strip()
         except (KeyError, IndexError, TypeError) as e:
-            print(f"Error parsing answer generation response structure: {e}")
-            print(f"Full Response: {json.dumps(response_json, indent=2)}")
+            logger.error("Error parsing answer generation response structure: %s. Full response: %s", e,
+                         json.dumps(response_json))
             return "Could not generate an answer due to a processing error."
     elif response_json and 'promptFeedback' in response_json:
          safety_ratings = response_json.get('promptFeedback', {}).get('safetyRatings')
-         print(f"Answer generation blocked by safety filters: {safety_ratings}")
+         logger.warning("Answer generation blocked by safety filters: %s", safety_ratings)
          return "Could not generate an answer (possibly blocked by safety filters)."
     else:
-        print("Answer generation failed: No valid response received.")
-        print(f"Full Response: {json.dumps(response_json, indent=2)}")
+        logger.error("Answer generation failed: No valid response received. Full response: %s", json.dumps(response_json))
         return "Could not generate a final answer."
 
 
+def generate_answer(user_query: str, retrieved_data: str) -> str | None:
+    return gemini_client.run(generate_answer_async(user_query, retrieved_data))
+
+
+# Finish reasons meaning the rest of the answer was withheld
+_BLOCKED_FINISH_REASONS = {"SAFETY", "RECITATION", "BLOCKLIST", "PROHIBITED_CONTENT", "SPII"}
+_STREAM_END = object()
+
+
+class AnswerStream:
+    """
+    Answer generation via streamGenerateContent, delivered as text chunks as the
+    model produces them. Iterate with `async for` (from any event loop) or a plain
+    `for` (blocking). A prompt blocked by the safety filters, a block or error
+    partway through, or a failed request never raises: a short notice is yielded
+    as the last chunk instead, as generate_answer returns one. When iteration ends,
+    `text` holds the whole answer, `error` what went wrong (None on success),
+    `blocked` whether the safety filters stopped it, and `first_token_seconds` /
+    `total_seconds` the time to the first chunk and to the end of the stream.
+    """
+
+    def __init__(self, user_query: str, retrieved_data: str):
+        self.request_body = {"contents": [{"parts": [{"text": _answer_prompt(user_query, retrieved_data)}]}]}
+        self.text = ""
+        self.chunks = 0
+        self.error = None
+        self.blocked = False
+        self.finish_reason = None
+        self.first_token_seconds = None
+        self.total_seconds = None
+
+    def _notice(self, message: str) -> str:
+        """Text that ends a failed stream: the fallback answer, or a note after a partial one."""
+        return message if not self.text else f"\n\n[{message}]"
+
+    async def __aiter__(self):
+        started = time.perf_counter()
+        try:
+            async for chunk in self._chunks():
+                if self.first_token_seconds is None:
+                    self.first_token_seconds = time.perf_counter() - started
+                self.text += chunk
+                self.chunks += 1
+                yield chunk
+        finally:
+            self.total_seconds = time.perf_counter() - started
+            if self.error:
+                logger.warning("Answer stream ended early after %d chunks: %s", self.chunks, self.error)
+            else:
+                logger.info("Generated Answer (streamed, %d chunks): %s", self.chunks, self.text)
+
+    async def _chunks(self):
+        if not config.GOOGLE_API_KEY:
+            logger.error("GOOGLE_API_KEY not found. Cannot call Gemini API.")
+            self.error = "GOOGLE_API_KEY not set"
+            yield "Could not generate a final answer."
+            return
+        url = GEMINI_STREAM_URL.format(model=GEN_MODEL_NAME) + f"?alt=sse&key={config.GOOGLE_API_KEY}"
+        try:
+            async for event in gemini_client.stream_json(url, self.request_body):
+                if "error" in event:
+                    # Errors after the response started arrive as an event rather than a status code
+                    self.error = event["error"].get("message", "API error") if isinstance(event["error"], dict) \
+                        else str(event["error"])
+                    logger.error("Answer stream returned an error: %s", self.error)
+                    yield self._notice("Could not generate a final answer." if not self.text
+                                       else "The answer was cut off by an error.")
+                    return
+                block_reason = event.get("promptFeedback", {}).get("blockReason")
+                if block_reason:
+                    self.blocked = True
+                    self.error = f"Prompt blocked: {block_reason}"
+                    logger.warning("Answer generation blocked by safety filters: %s",
+                                   event["promptFeedback"].get("safetyRatings"))
+                    yield self._notice("Could not generate an answer (possibly blocked by safety filters).")
+                    return
+                candidate = (event.get("candidates") or [{}])[0]
+                text = "".join(part.get("text", "") for part in candidate.get("content", {}).get("parts", []))
+                if text:
+                    # The first chunk may start with whitespace the non-streaming path would strip
+                    yield text.lstrip() if not self.text else text
+                self.finish_reason = candidate.get("finishReason") or self.finish_reason
+                if self.finish_reason in _BLOCKED_FINISH_REASONS:
+                    self.blocked = True
+                    self.error = f"Answer blocked: {self.finish_reason}"
+                    logger.warning("Answer generation stopped by safety filters (%s): %s", self.finish_reason,
+                                   candidate.get("safetyRatings"))
+                    yield self._notice("Could not generate an answer (possibly blocked by safety filters)."
+                                       if not self.text else "The rest of the answer was blocked by safety filters.")
+                    return
+        except GeminiError as e:
+            self.error = str(e)
+            yield self._notice("Could not generate a final answer." if not self.text
+                               else "The answer was cut off by an error.")
+            return
+        if not self.text:
+            self.error = "Empty response"
+            yield "Could not generate a final answer."
+
+    def __iter__(self):
+        # The async iteration runs as one task on the Gemini client's loop; chunks cross over through a queue
+        chunks = queue.Queue()
+
+        async def pump():
+            try:
+                async for chunk in self:
+                    chunks.put(chunk)
+            finally:
+                chunks.put(_STREAM_END)
+
+        future = gemini_client.submit(pump())
+        try:
+            while (chunk := chunks.get()) is not _STREAM_END:
+                yield chunk
+            future.result() # Re-raises unexpected errors from the stream
+        finally:
+            future.cancel()
+
+
+def generate_answer_stream(user_query: str, retrieved_data: str) -> AnswerStream:
+    """
+    Streaming counterpart of generate_answer: returns an AnswerStream that yields
+    the answer text in chunks as it is generated (iterate with `for` or `async for`).
+    """
+    return AnswerStream(user_query, retrieved_data)
+
+
 # --- Embedding Function ---
 # This uses the embedContent endpoint, structure is slightly different
-def embed_text(text: str):
+async def embed_text_async(text: str):
     """Generates embedding for the given text using the Gemini API."""
     if not text or not text.strip():
         # print("Warning: Attempted to embed empty or whitespace text.")
         return None # Cannot embed empty text
 
+    with tracing.span("llm.embed", chars=len(text)) as span:
+        # The cache is SQLite: its reads and writes run on a worker thread, off the (often shared) event loop
+        cached_embedding = (await asyncio.to_thread(embedding_cache.lookup, EMBEDDING_MODEL_NAME, [text]))[0]
+        span.set(cache_hit=cached_embedding is not None)
+        if cached_embedding is not None:
+            return cached_embedding
+        return await _embed_text(text)
+
+
+async def _embed_text(text: str):
+    """embedContent call for a text that missed the embedding cache."""
     api_url = GEMINI_EMBED_URL.format(model=EMBEDDING_MODEL_NAME)
     request_body = {
         # The embedding API expects 'content' directly, potentially with parts
@@ -204,18 +438,108 @@ def embed_text(text: str):
         # "model": EMBEDDING_MODEL_NAME # Only needed for batchEmbedContents or if model not in URL
     }
 
-    response_json = _call_gemini_api(api_url, request_body)
+    response_json = await _call_gemini_api_async(api_url, request_body)
 
     if response_json and 'embedding' in response_json:
         try:
             embedding_values = response_json['embedding']['values']
             # print(f"Generated embedding of size: {len(embedding_values)}") # Optional debug
+            await asyncio.to_thread(embedding_cache.store, EMBEDDING_MODEL_NAME, [text], [embedding_values])
             return embedding_values # This should be a list of floats
         except (KeyError, TypeError) as e:
-            print(f"Error parsing embedding response structure: {e}")
-            print(f"Full Response: {json.dumps(response_json, indent=2)}")
+            logger.error("Error parsing embedding response structure: %s. Full response: %s", e, json.dumps(response_json))
             return None
     else:
-        print("Embedding generation failed: No valid response received.")
-        print(f"Full Response: {json.dumps(response_json, indent=2)}")
-        return None
\ No newline at end of file
+        logger.error("Embedding generation failed: No valid response received. Full response: %s",
+                     json.dumps(response_json))
+        return None
+
+
+def embed_text(text: str):
+    return gemini_client.run(embed_text_async(text))
+
+
+# --- Batch Embedding Function ---
+# Uses the batchEmbedContents endpoint: one HTTP round trip per chunk of texts
+async def _embed_chunk(texts: list[str]) -> list[list[float] | None]:
+    """Embeds one chunk of non-empty texts with a single batchEmbedContents call."""
+    api_url = GEMINI_BATCH_EMBED_URL.format(model=EMBEDDING_MODEL_NAME)
+    request_body = {
+        # Unlike embedContent, each request in the batch must name the model
+        "requests": [
+            {
+                "model": f"models/{EMBEDDING_MODEL_NAME}",
+                "content": {"parts": [{"text": text}]}
+            }
+            for text in texts
+        ]
+    }
+
+    response_json = await _call_gemini_api_async(api_url, request_body)
+
+    if response_json and 'embeddings' in response_json:
+        embeddings = response_json['embeddings']
+        if not isinstance(embeddings, list) or len(embeddings) != len(texts):
+            logger.error("Batch embedding returned %s embeddings for %d texts.",
+                         len(embeddings) if isinstance(embeddings, list) else "invalid", len(texts))
+            return [None] * len(texts)
+        chunk_embeddings = []
+        for embedding in embeddings:
+            try:
+                chunk_embeddings.append(embedding['values'])
+            except (KeyError, TypeError) as e:
+                logger.error("Error parsing batch embedding entry: %s", e)
+                chunk_embeddings.append(None)
+        return chunk_embeddings
+    else:
+        logger.error("Batch embedding failed for a chunk of %d texts: No valid response received.", len(texts))
+        return [None] * len(texts)
+
+
+async def embed_texts_async(texts: list[str], batch_size: int | None = None, max_workers: int | None = None) -> list[list[float] | None]:
+    """
+    Generates embeddings for many texts using the batchEmbedContents endpoint.
+    Texts are split into chunks of `batch_size` and up to `max_workers` chunks are
+    embedded concurrently. The returned list lines up with `texts`; an entry is None
+    when that text was empty or its chunk failed, so callers can filter per item.
+    """
+    with tracing.span("llm.embed_batch", texts=len(texts)) as span:
+        return await _embed_texts(texts, batch_size or config.EMBED_BATCH_SIZE,
+                                  max_workers or config.EMBED_MAX_CONCURRENCY, span)
+
+
+async def _embed_texts(texts: list[str], batch_size: int, max_workers: int, span) -> list[list[float] | None]:
+    embeddings = [None] * len(texts)
+    # Empty texts cannot be embedded; keep their slot as None and skip them
+    positions = [i for i, text in enumerate(texts) if text and text.strip()]
+
+    # Serve what we can from the embedding cache (on a worker thread, as in embed_text_async) and only send the misses
+    cached_embeddings = await asyncio.to_thread(embedding_cache.lookup, EMBEDDING_MODEL_NAME,
+                                                [texts[i] for i in positions])
+    for i, embedding in zip(positions, cached_embeddings):
+        embeddings[i] = embedding
+    span.set(cache_hits=len(positions) - sum(embedding is None for embedding in cached_embeddings))
+    positions = [i for i in positions if embeddings[i] is None]
+
+    chunks = [positions[start:start + batch_size] for start in range(0, len(positions), batch_size)]
+    span.set(chunks=len(chunks))
+    if not chunks:
+        return embeddings
+
+    # Caps this call's share of the client's global concurrency limit
+    chunk_slots = asyncio.Semaphore(max_workers)
+
+    async def embed_positions(chunk_positions):
+        async with chunk_slots:
+            chunk_embeddings = await _embed_chunk([texts[i] for i in chunk_positions])
+        for i, embedding in zip(chunk_positions, chunk_embeddings):
+            embeddings[i] = embedding
+        await asyncio.to_thread(embedding_cache.store, EMBEDDING_MODEL_NAME, [texts[i] for i in chunk_positions],
+                                chunk_embeddings)
+
+    await asyncio.gather(*(embed_positions(chunk_positions) for chunk_positions in chunks))
+    return embeddings
+
+
+def embed_texts(texts: list[str], batch_size: int | None = None, max_workers: int | None = None) -> list[list[float] | None]:
+    return gemini_client.run(embed_texts_async(texts, batch_size, max_workers))
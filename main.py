@@ -1,31 +1,61 @@
 import config
 import semantic_layer
-import database_service
-import llm_service
+import pipeline
+import startup
+import tracing
 import vector_db_service
 import uuid # To generate unique IDs for queries
 
+def _render_event(event: dict):
+    """Prints pipeline progress for the terminal: SQL repairs, row notes, the retrieved data, then the answer chunk by chunk."""
+    stage = event["stage"]
+    if stage == "repair":
+        print(f"SQL failed: {event['original_error']['message']}")
+        if event["repaired"]:
+            source = "model" if event["fixed_by"] == "llm" else "cached fix"
+            print(f"Repaired SQL ({source}, {len(event['attempts'])} attempt(s)): {event['sql']}")
+        else:
+            print(f"Could not repair the SQL ({len(event['attempts'])} attempt(s)).")
+    elif stage == "rows":
+        if event["row_count"] == 0:
+             print("SQL query executed successfully, but returned no results.")
+        if event["truncated"]:
+            print(f"Note: results were truncated to the first {event['row_count']} rows "
+                  f"(limits: {config.QUERY_MAX_ROWS} rows / {config.QUERY_MAX_BYTES} bytes).")
+    elif stage == "context":
+        print("\n--- Data Retrieved for Answering ---")
+        print(event["context"])
+        print("------------------------------------\n")
+    elif stage == "answer_chunk":
+        if event.get("first"):
+            print("\nAnswer:")
+        print(event["text"], end="", flush=True)
+
 def main():
+    tracing.configure_logging()
     print("Text-to-SQL RAG Chatbot Backend (Terminal Interface)")
     print("-" * 40)
 
-    # 1. Load Semantic Layer
-    semantic_config = semantic_layer.load_semantic_layer()
-    if not semantic_config:
+    # 1. Initialize the services in parallel: the Semantic Layer (prompt text and schema index
+    # are built once per version), the vector DB, the database pool and the Gemini client
+    try:
+        status = startup.warmup()["components"]
+    except ValueError as e:
+        print(f"Invalid configuration: {e}. Exiting.")
+        return
+    if status["semantic_layer"]["state"] != "ready":
         print("Failed to load semantic layer. Exiting.")
         return
+    # Edits to the semantic layer file are picked up without restarting
+    semantic_layer.start_watcher()
 
-    # Format semantic layer for the LLM prompt
-    semantic_layer_text_for_llm = semantic_layer.format_semantic_layer_for_prompt(semantic_config)
-    # print("\n--- Semantic Layer Context Sent to LLM ---")
-    # print(semantic_layer_text_for_llm) # Optional: Print the context being sent
-    # print("------------------------------------------\n")
-
-
-    # Ensure vector DB is initialized (it's done on import in vector_db_service)
-    if not vector_db_service.collection:
+    if status["vector_store"]["state"] != "ready":
          print("Failed to initialize Vector Database. Exiting.")
          return
+    if status["database"]["state"] != "ready":
+        print(f"Warning: database unavailable ({status['database']['error']}); questions will fail until it is.")
+
+    vector_db_service.start_background_gc()
 
     print("Semantic layer and Vector DB initialized. Ready to answer questions.")
     print("Type 'quit' or 'exit' to end the session.")
@@ -44,66 +74,28 @@ def main():
         query_sequence_id = str(uuid.uuid4())
         print(f"Processing query (ID: {query_sequence_id})...")
 
-        # --- Step 1: Generate SQL ---
-        sql_query = llm_service.generate_sql(user_query, semantic_layer_text_for_llm)
+        # Generate SQL -> execute -> store rows in the vector DB -> retrieve -> answer
+        # against the semantic layer version current when the question was asked.
+        # Progress is printed from the pipeline's events, the answer as it is generated.
+        layer = semantic_layer.get_layer()
+        result = pipeline.answer_question(user_query, layer.prompt_text, query_sequence_id, on_event=_render_event,
+                                          schema_index=layer.schema_index)
 
-        if not sql_query:
-            print("Could not generate SQL query.")
+        if result["error"]:
+            print(result["error"])
             continue
 
-        # --- Step 2: Execute SQL ---
-        # Validate SQL (basic check)
-        # if not sql_query.strip().lower().startswith(("select", "with")):
-        #      print("Generated text does not appear to be a SELECT or WITH SQL query. Aborting execution.")
-        #      continue
-
-        results, column_names, db_error = database_service.execute_sql_query(sql_query)
-
-        if db_error:
-            print(f"Error executing SQL query: {db_error}")
-            # Optionally, you could try to refine the query with the LLM here
-            continue
-
-        if results is None: # Indicates an execution error occurred, even if db_error is None (shouldn't happen with current code but defensive)
-             print("SQL query execution failed.")
-             continue
-
-        if not results:
-             print("SQL query executed successfully, but returned no results.")
-             # Even with no results, we might add this fact to vector DB or just proceed to answer generation
-             # Let's proceed, the answer generation step will handle empty data.
-
-        # --- Step 3: Store Fetched Data in Vector Database ---
-        # Note: Storing raw SQL results directly in Vector DB for RAG Answer Gen
-        # is a specific approach you requested. More typical is to store
-        # documentation/prior Q&A etc.
-        vector_db_service.add_results_to_vector_db(results, column_names, query_sequence_id)
-
-        # --- Step 4: Retrieve Relevant Data from Vector Database (based on user query) ---
-        # This step retrieves chunks from the *just added* results (or potentially past results)
-        # that are most relevant to the *original user query*.
-        retrieved_data_docs = vector_db_service.retrieve_data_from_vector_db(user_query, n_results=5) # Retrieve top 5 chunks
-
-        if not retrieved_data_docs:
-             print("Could not retrieve relevant data from the vector store for answering.")
-             # You might choose to skip answer generation or generate a "no data found" answer
-             retrieved_data_text = "No relevant data found."
+        if not config.ANSWER_STREAMING_ENABLED:
+            if result["answer"]:
+                print("\nAnswer:")
+                print(result["answer"])
+            else:
+                print("\nCould not generate a final answer.")
         else:
-            # Combine retrieved document texts into a single string for the LLM
-            retrieved_data_text = "\n".join(retrieved_data_docs)
-            print("\n--- Data Retrieved for Answering ---")
-            print(retrieved_data_text)
-            print("------------------------------------\n")
-
-
-        # --- Step 5: Generate Natural Language Answer ---
-        final_answer = llm_service.generate_answer(user_query, retrieved_data_text)
+            print() # End the streamed answer's line
 
-        if final_answer:
-            print("\nAnswer:")
-            print(final_answer)
-        else:
-            print("\nCould not generate a final answer.")
+        timing_text = ", ".join(f"{stage} {seconds * 1000:.0f}ms" for stage, seconds in result["timings"].items())
+        print(f"\nAnswer path: {result['path']} ({timing_text})")
 
     print("\nExiting chatbot. Goodbye!")
 
@@ -0,0 +1,430 @@
+import asyncio
+import itertools
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+import config
+import database_service
+import llm_service
+import result_summary
+import row_format
+import sql_cache
+import sql_repair
+import tracing
+import vector_db_service
+import workload
+from stage_graph import StageGraph
+
+# SQLite and ChromaDB calls block, so they run on this bounded pool; LLM calls are
+# async and bounded by the Gemini client's concurrency limit instead.
+_db_executor = ThreadPoolExecutor(max_workers=config.DB_WORKERS, thread_name_prefix="db-worker")
+
+
+def _execute_and_route(sql_query: str, query_id: str, on_vector_path=None) -> dict:
+    """
+    Runs the SQL and decides how its rows reach the answer prompt (blocking, runs on the DB pool).
+    Rows are buffered while they fit the direct-context budget. If the whole result
+    fits, the rows themselves become the context ("direct" path). Otherwise the
+    buffered and remaining rows are streamed into the vector DB while a column
+    summary is accumulated ("vector" path). `on_vector_path` is called as soon as
+    the vector path is chosen, before the rows are stored.
+    """
+    with tracing.span("execute") as span:
+        outcome = _execute_rows(sql_query, query_id, on_vector_path)
+        if outcome["error"]:
+            span.set(error=outcome["error"].code)
+        else:
+            span.set(path=outcome["path"], rows=outcome["row_count"], bytes=outcome["byte_count"],
+                     truncated=outcome["truncated"], result_cache_hit=outcome["result_cached"])
+        return outcome
+
+
+def _execute_rows(sql_query: str, query_id: str, on_vector_path) -> dict:
+    stage_start = time.perf_counter()
+    # One row past the cap lets the stream tell a truncated result from an exact fit
+    limit = config.QUERY_MAX_ROWS + 1 if config.SQL_AUTO_LIMIT else None
+    result_stream, db_error = database_service.execute_sql_query_stream(sql_query, limit=limit)
+    if db_error:
+        return {"error": db_error, "timings": {"execute": time.perf_counter() - stage_start}}
+
+    with result_stream:
+        columns = result_stream.column_names
+        formatter = row_format.from_config(columns)
+        batches = iter(result_stream)
+        buffered = []
+        buffered_lines = []
+        buffered_tokens = result_summary.estimate_tokens(formatter.header)
+        fits = True
+        for batch in batches:
+            buffered.append(batch)
+            lines = [formatter.row(values, i) for i, values in enumerate(batch, start=len(buffered_lines))]
+            buffered_lines.extend(lines)
+            buffered_tokens += result_summary.estimate_tokens("\n".join(lines))
+            if (sum(len(b) for b in buffered) > config.DIRECT_CONTEXT_MAX_ROWS
+                    or buffered_tokens > config.DIRECT_CONTEXT_MAX_TOKENS):
+                fits = False
+                break
+        timings = {"execute": time.perf_counter() - stage_start}
+
+        if fits:
+            context = "\n".join([formatter.header, *buffered_lines] if formatter.header else buffered_lines)
+            outcome = {"path": "direct", "context": context if buffered_lines else None,
+                       "rows": [values for batch in buffered for values in batch]}
+        else:
+            if on_vector_path:
+                on_vector_path()
+            stage_start = time.perf_counter()
+            summary = result_summary.ResultSummary(columns, top_k=config.RESULT_SUMMARY_TOP_K)
+
+            def summarized(all_batches):
+                for batch in all_batches:
+                    summary.add_batch(batch)
+                    yield batch
+
+            vector_db_service.add_result_batches(summarized(itertools.chain(buffered, batches)), columns, query_id,
+                                                 formatter)
+            timings["store"] = time.perf_counter() - stage_start
+            outcome = {"path": "vector", "summary": summary.to_text(), "formatter": formatter}
+
+    outcome.update({
+        "error": result_stream.error,
+        "sql_check": result_stream.check.to_dict() if result_stream.check else None,
+        "columns": columns,
+        "row_count": result_stream.row_count,
+        "byte_count": result_stream.byte_count,
+        "truncated": result_stream.truncated,
+        "result_cached": result_stream.cached,
+        "timings": timings,
+    })
+    return outcome
+
+
+async def _repair(user_query: str, semantic_layer_text: str, execution: dict, execute, schema_text) -> dict:
+    """
+    Repair loop for SQL that failed with a repairable error, before or while returning rows.
+    Each round first tries a cached fix for the current error, then asks the model for
+    a minimal fix: at most SQL_REPAIR_MAX_ATTEMPTS model calls, none started after
+    SQL_REPAIR_DEADLINE_SECONDS. Candidates run through `execute` like the original,
+    so the SQL guard checks them too. Returns the last execution, with "sql" set to the
+    query it ran and "repair" describing the loop. `schema_text` is an async callable
+    returning the schema fragment for the prompt, only awaited if the model is called.
+    """
+    started = time.perf_counter()
+    deadline = started + config.SQL_REPAIR_DEADLINE_SECONDS
+    fixes = sql_repair.get_cache()
+    original_sql, original_error = execution["sql"], execution["error"]
+    tried = {workload.normalize_sql(original_sql, keep_literals=True)}
+    attempts = []
+    llm_calls = 0
+    schema = None
+    with tracing.span("sql.repair", error=original_error.code) as span:
+        while sql_repair.is_repairable(execution["error"]):
+            failing_sql, error = execution["sql"], execution["error"]
+            cached = fixes.lookup(semantic_layer_text, error, failing_sql) if fixes else None
+            if cached and workload.normalize_sql(cached[0], keep_literals=True) not in tried:
+                candidate, fixed_by = cached[0], f"cache_{cached[1]}"
+            else:
+                remaining = deadline - time.perf_counter()
+                if llm_calls >= config.SQL_REPAIR_MAX_ATTEMPTS or remaining <= 0:
+                    break
+                llm_calls += 1
+                if schema is None:
+                    schema = await schema_text()
+                try:
+                    candidate = await asyncio.wait_for(
+                        llm_service.repair_sql_async(user_query, failing_sql, error.message, schema), remaining
+                    )
+                except asyncio.TimeoutError:
+                    break
+                fixed_by = "llm"
+                if not candidate or workload.normalize_sql(candidate, keep_literals=True) in tried:
+                    continue # No new query to try; the call still counts against the budget
+            tried.add(workload.normalize_sql(candidate, keep_literals=True))
+
+            attempt = await execute(candidate)
+            attempts.append({"sql": candidate, "fixed_by": fixed_by,
+                             "error": attempt["error"].to_dict() if attempt["error"] else None})
+            execution = attempt
+            if attempt["error"] is None:
+                # It worked: remember the fix for this error, and for the original one if it took several rounds
+                if fixes:
+                    fixes.put(semantic_layer_text, error, failing_sql, candidate)
+                    if failing_sql != original_sql:
+                        fixes.put(semantic_layer_text, original_error, original_sql, candidate)
+                break
+            if cached and fixed_by != "llm":
+                # Rejected, or failed while its rows were fetched: either way the cached fix did not work
+                fixes.forget(semantic_layer_text, error, failing_sql, cached[1])
+
+        repaired = execution["error"] is None
+        cache_fixes = sum(1 for attempt in attempts if attempt["fixed_by"] != "llm")
+        execution["repair"] = {
+            "repaired": repaired,
+            "fixed_by": attempts[-1]["fixed_by"] if repaired else None,
+            "original_sql": original_sql,
+            "original_error": original_error.to_dict(),
+            "attempts": attempts,
+            "llm_calls": llm_calls,
+            "seconds": time.perf_counter() - started,
+        }
+        span.set(repaired=repaired, attempts=len(attempts), llm_calls=llm_calls, cache_fixes=cache_fixes,
+                 fixed_by=execution["repair"]["fixed_by"])
+    sql_repair.record(repaired, llm_calls, cache_fixes)
+    # The SQL cache must not keep serving the failing query for this question
+    cache = sql_cache.get_cache()
+    if cache:
+        cache.replace(user_query, semantic_layer_text, execution["sql"] if repaired else None)
+    return execution
+
+
+def _stage_graph(user_query: str, semantic_layer_text: str, query_id: str, schema_index, question_embedding,
+                 executions) -> StageGraph:
+    """
+    The stages of one question and what they need:
+        embed_question: the question alone (started speculatively with
+                        SPECULATIVE_EMBEDDING_ENABLED, else at the latest when
+                        execution picks the vector path)
+        generate_sql:   joins embed_question only on an exact SQL cache miss, for the
+                        similarity tier and schema pruning
+        execute:        generate_sql; a query that fails with a repairable error is
+                        repaired here (joining embed_question for the schema fragment)
+        retrieve:       execute (vector path only) and embed_question
+    The question is embedded once however many stages use it, and off the critical path
+    when it runs alongside SQL generation and execution; a `question_embedding` computed
+    by the caller is used as is. With `executions` (a dict shared by the questions of a
+    batch), execute runs each distinct normalized SQL once and the other questions
+    reuse its outcome, retrieving from the rows it stored. Answer generation streams
+    from the caller so its chunks can be emitted as they arrive.
+    """
+    loop = asyncio.get_running_loop()
+    graph = StageGraph()
+
+    async def retrieve(execution: dict, question_embedding):
+        with tracing.span("retrieve", precomputed_embedding=question_embedding is not None):
+            return await loop.run_in_executor(
+                _db_executor, tracing.bind(vector_db_service.retrieve_data_from_vector_db),
+                user_query, 5, execution["query_id"], question_embedding
+            )
+
+    async def embedded():
+        return question_embedding
+
+    graph.add("embed_question", embedded if question_embedding is not None
+              else lambda: llm_service.embed_text_async(user_query))
+    graph.add("generate_sql", lambda: llm_service.generate_sql_async(
+        user_query, semantic_layer_text, schema_index=schema_index,
+        embed_question=lambda: graph.result("embed_question")
+    ))
+    # Executor threads do not inherit the caller's context; bind() carries the current span over
+    # Once the rows are headed for the vector DB, retrieval will need the question embedding:
+    # start it (if not already running) while the rows are being stored
+    def start_embedding():
+        try:
+            loop.call_soon_threadsafe(graph.start, "embed_question")
+        except RuntimeError:
+            pass # The caller's loop has closed: nobody is waiting for the answer any more
+
+    async def run(sql_query: str) -> dict:
+        execution = await loop.run_in_executor(
+            _db_executor, tracing.bind(_execute_and_route), sql_query, query_id, start_embedding
+        )
+        execution.setdefault("path", None)
+        execution["sql"] = sql_query
+        execution["query_id"] = query_id # Where a vector-path result set was stored
+        return execution
+
+    async def repair_schema() -> str:
+        # The same fragment the SQL was generated from: the question's tables, or the full schema
+        if not schema_index:
+            return semantic_layer_text
+        question_embedding = await graph.result("embed_question") if schema_index.has_embeddings else None
+        return schema_index.prompt_text(user_query, question_embedding)
+
+    async def execute(sql_query: str) -> dict:
+        execution = await run(sql_query)
+        # Also after an error while fetching, which leaves "path" set
+        if config.SQL_REPAIR_ENABLED and sql_repair.is_repairable(execution["error"]):
+            execution = await _repair(user_query, semantic_layer_text, execution, run, repair_schema)
+        return execution
+
+    async def execute_once(sql_query: str) -> dict:
+        key = workload.normalize_sql(sql_query, keep_literals=True)
+        shared = key in executions
+        if not shared:
+            # Its own task, so cancelling this question does not cancel it for the others awaiting it
+            executions[key] = asyncio.ensure_future(execute(sql_query))
+        execution = await asyncio.shield(executions[key])
+        if shared and execution.get("repair"):
+            # The repair ran for the first question; this one's SQL cache entry holds the failing query too
+            cache = sql_cache.get_cache()
+            if cache:
+                cache.replace(user_query, semantic_layer_text,
+                              execution["sql"] if execution["repair"]["repaired"] else None)
+        return {**execution, "shared": shared}
+
+    graph.add("execute", execute if executions is None else execute_once, needs=("generate_sql",))
+    graph.add("retrieve", retrieve, needs=("execute", "embed_question"))
+    return graph
+
+
+async def answer_question_async(user_query: str, semantic_layer_text: str, query_id: str | None = None,
+                                on_event=None, schema_index=None, question_embedding=None, executions=None) -> dict:
+    """
+    Runs the full text-to-SQL RAG pipeline for one question:
+    generate SQL -> execute -> route rows -> (embed, store, retrieve) -> generate answer.
+    Results within the DIRECT_CONTEXT_* budget skip the vector DB entirely; the
+    chosen route is reported as result["path"] ("direct" or "vector").
+    Safe to run concurrently for many questions. `on_event`, if given, is called
+    with a dict after each stage so callers can stream progress; with
+    ANSWER_STREAMING_ENABLED the answer also arrives as "answer_chunk" events
+    while it is generated, and timings include "first_token" (question to first
+    answer text) and "answer_first_token". Stages run on a StageGraph, so the
+    question embedding overlaps other work; "overlap_saved" in the timings is the
+    stage time taken off the critical path that way. `schema_index`, if
+    given, prunes the schema sent with the SQL prompt to the relevant tables.
+    `question_embedding` and `executions` let a batch embed its questions together
+    and run equivalent SQL once (see _stage_graph).
+    Returns a dict with the SQL, row count, the rows themselves on the direct path,
+    route, answer context, answer, error
+    (plus "error_detail", a structured QueryError dict, for rejected or failed SQL;
+    "answer_error" says why a streamed answer was blocked or cut short), "repair"
+    (set when the SQL failed and the repair loop ran: whether and how it was fixed,
+    the original SQL and error and each attempt; "sql" is then the query that ran),
+    the SQL guard's plan check, whether the rows came from the result cache or from
+    another question's execution ("shared_execution") and per-stage timings in seconds. With tracing enabled every stage is also recorded
+    as a span in a trace tagged with the query id.
+    """
+    query_id = query_id or str(uuid.uuid4())
+    with tracing.trace(query_id, question_chars=len(user_query)) as root:
+        result = await _answer_question(user_query, semantic_layer_text, query_id, on_event, schema_index,
+                                        question_embedding, executions)
+        root.set(path=result["path"], rows=result["row_count"], result_cache_hit=result["result_cached"])
+        if result["error"]:
+            root.set(error=result["error_detail"]["code"] if result["error_detail"] else "failed")
+        return result
+
+
+async def _answer_question(user_query: str, semantic_layer_text: str, query_id: str, on_event,
+                           schema_index, question_embedding, executions) -> dict:
+    result = {
+        "query_id": query_id,
+        "question": user_query,
+        "sql": None,
+        "columns": [],
+        "row_count": 0,
+        "rows": None,
+        "truncated": False,
+        "result_cached": False,
+        "shared_execution": False,
+        "path": None,
+        "context": None,
+        "answer": None,
+        "answer_error": None,
+        "repair": None,
+        "error": None,
+        "error_detail": None,
+        "sql_check": None,
+        "timings": {},
+    }
+    timings = result["timings"]
+    started = time.perf_counter()
+    graph = _stage_graph(user_query, semantic_layer_text, query_id, schema_index, question_embedding, executions)
+
+    def finish_timings():
+        timings.update(graph.stats())
+        if "embed_question" in graph.durations():
+            timings["embed_question"] = graph.durations()["embed_question"]
+        timings["total"] = time.perf_counter() - started
+
+    def emit(stage: str, **fields):
+        if on_event:
+            on_event({"stage": stage, "query_id": query_id, **fields})
+
+    def fail(message: str, detail: dict | None = None) -> dict:
+        result["error"] = message
+        result["error_detail"] = detail
+        finish_timings()
+        emit("error", error=message, detail=detail)
+        return result
+
+    # Leaving the block cancels stages still running: speculative work that is not needed, or
+    # everything in flight when a stage fails
+    async with graph:
+        if config.SPECULATIVE_EMBEDDING_ENABLED:
+            # The question embedding depends only on the question: compute it while SQL is generated and run
+            graph.start("embed_question")
+
+        # --- Step 1: Generate SQL ---
+        stage_start = time.perf_counter()
+        sql_query = await graph.result("generate_sql")
+        timings["generate_sql"] = time.perf_counter() - stage_start
+        if not sql_query:
+            return fail("Could not generate SQL query.")
+        result["sql"] = sql_query
+        emit("sql", sql=sql_query)
+
+        # --- Step 2: Execute SQL and route the rows ---
+        execution = await graph.result("execute")
+        timings.update(execution["timings"])
+        if execution.get("repair"):
+            result["repair"] = execution["repair"]
+            result["sql"] = execution["sql"]
+            timings["repair"] = execution["repair"]["seconds"]
+            emit("repair", sql=execution["sql"], **execution["repair"])
+        if execution["error"]:
+            # A sql_guard.QueryError: rejected before running, timed out or failed in SQLite
+            return fail(f"Error executing SQL query: {execution['error']}", execution["error"].to_dict())
+        result["sql_check"] = execution["sql_check"]
+        result["columns"] = execution["columns"]
+        result["row_count"] = execution["row_count"]
+        result["rows"] = execution.get("rows")
+        result["truncated"] = execution["truncated"]
+        result["result_cached"] = execution["result_cached"]
+        result["shared_execution"] = execution.get("shared", False)
+        result["path"] = execution["path"]
+        emit("rows", columns=result["columns"], row_count=result["row_count"], truncated=result["truncated"],
+             path=result["path"])
+
+        if execution["path"] == "direct":
+            # Small result: hand the rows straight to the answer step, no embedding or vector search
+            result["context"] = execution["context"] or "No relevant data found."
+        else:
+            # --- Step 3: Retrieve relevant rows from the vector DB ---
+            stage_start = time.perf_counter()
+            retrieved_data_docs = await graph.result("retrieve")
+            timings["retrieve"] = time.perf_counter() - stage_start
+            # Retrieved documents each repeat the column header; the context states it once
+            retrieved_text = (execution["formatter"].merge(retrieved_data_docs) if retrieved_data_docs
+                              else "No relevant rows retrieved.")
+            result["context"] = f"{execution['summary']}\n\nMost relevant rows:\n{retrieved_text}"
+        emit("context", context=result["context"])
+
+        # --- Step 5: Generate natural language answer ---
+        stage_start = time.perf_counter()
+        if config.ANSWER_STREAMING_ENABLED:
+            # Chunks are emitted as they arrive, so callers can render the answer before it is complete
+            with tracing.span("llm.generate_answer", context_chars=len(result["context"]), streamed=True) as span:
+                stream = llm_service.generate_answer_stream(user_query, result["context"])
+                async for chunk in stream:
+                    if stream.chunks == 1:
+                        timings["answer_first_token"] = time.perf_counter() - stage_start
+                        timings["first_token"] = time.perf_counter() - started
+                    emit("answer_chunk", text=chunk, first=stream.chunks == 1)
+                span.set(chunks=stream.chunks, blocked=stream.blocked,
+                         first_token_ms=round(timings.get("answer_first_token", 0.0) * 1000, 3))
+                if stream.error:
+                    span.set(error=stream.error)
+            result["answer"] = stream.text
+            result["answer_error"] = stream.error
+        else:
+            result["answer"] = await llm_service.generate_answer_async(user_query, result["context"])
+        timings["generate_answer"] = time.perf_counter() - stage_start
+        finish_timings()
+        emit("answer", answer=result["answer"], timings=timings)
+        return result
+
+
+def answer_question(user_query: str, semantic_layer_text: str, query_id: str | None = None, on_event=None,
+                    schema_index=None) -> dict:
+    """Blocking version of answer_question_async for non-async callers such as the terminal loop."""
+    return asyncio.run(answer_question_async(user_query, semantic_layer_text, query_id, on_event, schema_index))
@@ -0,0 +1,195 @@
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from urllib.request import pathname2url
+import config
+import workload
+
+# Functions whose value changes without the data changing; queries using them are never cached
+_VOLATILE = re.compile(
+    r"\b(?:random|randomblob|changes|total_changes|last_insert_rowid)\s*\(|'now'|\bcurrent_(?:date|time|timestamp)\b",
+    re.I,
+)
+# Approximate per-row bookkeeping (tuple + list slot) on top of the value sizes counted by the stream
+_ROW_OVERHEAD_BYTES = 64
+
+
+def cache_key(sql: str, limit: int | None, max_rows: int, max_bytes: int) -> tuple:
+    """Key of a query result: the SQL with layout, comments and keyword case folded, plus the caps applied to it."""
+    return (workload.normalize_sql(sql, keep_literals=True), limit, max_rows, max_bytes)
+
+
+def is_cacheable(sql: str) -> bool:
+    return not _VOLATILE.search(sql)
+
+
+class CachedResult:
+    """All rows of a completed query, as produced by a QueryResultStream."""
+
+    __slots__ = ("sql", "check", "column_names", "rows", "truncated", "byte_count", "size", "expires_at")
+
+    def __init__(self, sql: str, check, column_names: list[str], rows: list, truncated: bool, byte_count: int):
+        self.sql = sql
+        self.check = check
+        self.column_names = column_names
+        self.rows = rows
+        self.truncated = truncated
+        self.byte_count = byte_count
+        self.size = byte_count + len(rows) * _ROW_OVERHEAD_BYTES
+        self.expires_at = 0.0
+
+
+class ResultCache:
+    """
+    In-memory LRU cache of query results, bounded by total size in bytes.
+    Keyed by normalized SQL, so differently formatted copies of the same query
+    share an entry. Staleness is ruled out with SQLite's `PRAGMA data_version` on
+    a dedicated connection: it changes whenever another connection (in this or
+    any other process) commits to the database, and every lookup checks it, so the
+    whole cache is dropped as soon as the data changes. Results of queries that
+    started before a change are not stored. Entries also expire after `ttl_seconds`.
+    """
+
+    def __init__(self, database_path: str, max_bytes: int, max_entry_bytes: int, ttl_seconds: float):
+        self.database_path = database_path
+        self.max_bytes = max_bytes
+        self.max_entry_bytes = max_entry_bytes
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.skipped = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self._entries = OrderedDict() # key -> CachedResult
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._watch = None # Connection used only to read data_version
+        self._file_id = None
+        self._data_version = None
+        self._generation = 0 # Bumped on every detected change
+
+    def _connect_watch(self):
+        uri = f"file:{pathname2url(os.path.abspath(self.database_path))}?mode=ro"
+        return sqlite3.connect(uri, uri=True, check_same_thread=False)
+
+    def _check_version(self) -> bool:
+        """Drops everything if the database changed since the last check; call with the lock held. False if unreadable."""
+        reopened = False
+        try:
+            stat = os.stat(self.database_path)
+            file_id = (stat.st_dev, stat.st_ino)
+            if self._watch is None or file_id != self._file_id:
+                # First use, or the file was replaced: a new connection's data_version is not comparable
+                if self._watch is not None:
+                    self._watch.close()
+                self._watch = self._connect_watch()
+                self._file_id = file_id
+                reopened = True
+            version = self._watch.execute("PRAGMA data_version").fetchone()[0]
+        except (OSError, TypeError, sqlite3.Error): # TypeError: no path configured
+            if self._watch is not None:
+                self._watch.close()
+            self._watch = None
+            version = None
+        if reopened or version is None or version != self._data_version:
+            if self._entries:
+                self._entries.clear()
+                self._bytes = 0
+                self.invalidations += 1
+            self._generation += 1
+            self._data_version = version
+        return version is not None
+
+    def lookup(self, key) -> tuple[CachedResult | None, int | None]:
+        """
+        Returns (cached result or None, generation). Pass the generation to `put` once
+        the query has run; it is None when results cannot be cached right now.
+        """
+        with self._lock:
+            if not self._check_version():
+                return None, None
+            entry = self._entries.get(key)
+            if entry is not None and entry.expires_at < time.monotonic():
+                self._remove(key)
+                entry = None
+            if entry is None:
+                self.misses += 1
+            else:
+                self._entries.move_to_end(key)
+                self.hits += 1
+            return entry, self._generation
+
+    def put(self, key, generation: int | None, result: CachedResult) -> bool:
+        """Stores a completed result unless it is too large or the data changed since `lookup`."""
+        if result.size > self.max_entry_bytes:
+            with self._lock:
+                self.skipped += 1
+            return False
+        with self._lock:
+            if generation is None or not self._check_version() or generation != self._generation:
+                self.skipped += 1
+                return False
+            if key in self._entries:
+                self._remove(key)
+            result.expires_at = time.monotonic() + self.ttl_seconds
+            self._entries[key] = result
+            self._bytes += result.size
+            self.stores += 1
+            while self._bytes > self.max_bytes and self._entries:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+            return True
+
+    def _remove(self, key):
+        self._bytes -= self._entries.pop(key).size
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "stores": self.stores,
+                "skipped": self.skipped,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_cache() -> ResultCache | None:
+    """Returns the shared result cache for config.DATABASE_PATH, or None when RESULT_CACHE_ENABLED is off."""
+    global _cache
+    if not config.RESULT_CACHE_ENABLED:
+        return None
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = ResultCache(
+                    config.DATABASE_PATH,
+                    config.RESULT_CACHE_MAX_BYTES,
+                    config.RESULT_CACHE_MAX_ENTRY_BYTES,
+                    config.RESULT_CACHE_TTL_SECONDS,
+                )
+    return _cache
+
+
+def stats() -> dict:
+    cache = get_cache()
+    return cache.stats() if cache else {"enabled": False}
@@ -0,0 +1,73 @@
+from collections import Counter
+
+# Stop counting new distinct values per column past this many, to bound memory
+_MAX_TRACKED_VALUES = 10000
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count for prompt budgeting (~4 characters per token for English/SQL text)."""
+    return (len(text) + 3) // 4
+
+
+class _ColumnStats:
+    __slots__ = ("name", "non_null", "numeric_count", "minimum", "maximum", "total", "values", "overflowed")
+
+    def __init__(self, name: str):
+        self.name = name
+        self.non_null = 0
+        self.numeric_count = 0
+        self.minimum = None
+        self.maximum = None
+        self.total = 0.0
+        self.values = Counter()
+        self.overflowed = False
+
+    def add(self, value):
+        if value is None:
+            return
+        self.non_null += 1
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            self.numeric_count += 1
+            self.total += value
+            self.minimum = value if self.minimum is None else min(self.minimum, value)
+            self.maximum = value if self.maximum is None else max(self.maximum, value)
+        if value in self.values or len(self.values) < _MAX_TRACKED_VALUES:
+            self.values[value] += 1
+        else:
+            self.overflowed = True
+
+
+class ResultSummary:
+    """
+    Incrementally computed summary of a result set: row count and, per column,
+    non-null count, min/max/mean for numeric values, distinct count and the
+    most frequent values. Fed batch by batch so it works on streamed results.
+    """
+
+    def __init__(self, column_names, top_k: int = 5):
+        self.column_names = list(column_names)
+        self.top_k = top_k
+        self.row_count = 0
+        self._columns = [_ColumnStats(name) for name in self.column_names]
+
+    def add_batch(self, rows):
+        for row in rows:
+            self.row_count += 1
+            for stats, value in zip(self._columns, row):
+                stats.add(value)
+
+    def to_text(self) -> str:
+        lines = [f"Result summary: {self.row_count} rows, {len(self.column_names)} columns."]
+        for stats in self._columns:
+            parts = [f"{stats.non_null} non-null"]
+            distinct = f"{len(stats.values)}+" if stats.overflowed else str(len(stats.values))
+            parts.append(f"{distinct} distinct")
+            if stats.numeric_count:
+                mean = stats.total / stats.numeric_count
+                parts.append(f"min {stats.minimum}, max {stats.maximum}, mean {mean:.4g}, sum {stats.total:.6g}")
+            if stats.values and len(stats.values) < stats.non_null:
+                # Only worth listing when values repeat
+                top_values = ", ".join(f"{value} ({count})" for value, count in stats.values.most_common(self.top_k))
+                parts.append(f"most common: {top_values}")
+            lines.append(f"- {stats.name}: " + "; ".join(parts))
+        return "\n".join(lines)
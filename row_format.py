@@ -0,0 +1,133 @@
+import json
+import math
+import config
+
+# Row serialization for vector DB documents and answer contexts. The compact formats write
+# the column names once per block of rows instead of once per value.
+FORMATS = ("tsv", "markdown", "jsonl", "verbose")
+
+
+def format_value(value, float_digits: int | None = None) -> str:
+    """
+    Text for one value: None becomes an empty string, floats are rounded to at most
+    `float_digits` decimal places with trailing zeros dropped (None keeps repr precision).
+    """
+    if value is None:
+        return ""
+    if isinstance(value, float):
+        if float_digits is None or not math.isfinite(value):
+            return repr(value)
+        text = f"{value:.{float_digits}f}"
+        if "." in text:
+            text = text.rstrip("0").rstrip(".")
+        return "0" if text == "-0" else text
+    if isinstance(value, bytes):
+        return f"<{len(value)} bytes>"
+    return str(value)
+
+
+def _json_value(value, float_digits: int | None):
+    if isinstance(value, float) and float_digits is not None and math.isfinite(value):
+        rounded = round(value, float_digits)
+        return int(rounded) if rounded.is_integer() and abs(rounded) < 2 ** 53 else rounded
+    if isinstance(value, bytes):
+        return f"<{len(value)} bytes>"
+    return value
+
+
+class RowFormatter:
+    """
+    Serializes rows of one result set as a header followed by one line per row:
+        tsv:      column names, then tab-separated values (tabs and newlines in values escaped)
+        markdown: a markdown table
+        jsonl:    a JSON array of column names, then one JSON array of values per row
+        verbose:  no header, "Row n: col: val, ..." per row (the original format)
+    """
+
+    def __init__(self, column_names, format: str = "tsv", float_digits: int | None = None):
+        if format not in FORMATS:
+            raise ValueError(f"Unknown row format {format!r}, expected one of {', '.join(FORMATS)}")
+        self.column_names = list(column_names)
+        self.format = format
+        self.float_digits = float_digits
+        self.header = self._header()
+
+    def _header(self) -> str:
+        if self.format == "tsv":
+            return "\t".join(_escape_tsv(name) for name in self.column_names)
+        if self.format == "markdown":
+            names = " | ".join(_escape_markdown(name) for name in self.column_names)
+            return f"| {names} |\n|" + "---|" * len(self.column_names)
+        if self.format == "jsonl":
+            return json.dumps(self.column_names, ensure_ascii=False, separators=(",", ":"))
+        return ""
+
+    def row(self, values, index: int = 0) -> str:
+        """One row as a line; `index` (0-based) is only used by the verbose format."""
+        if self.format == "tsv":
+            return "\t".join(_escape_tsv(format_value(value, self.float_digits)) for value in values)
+        if self.format == "markdown":
+            cells = " | ".join(_escape_markdown(format_value(value, self.float_digits)) for value in values)
+            return f"| {cells} |"
+        if self.format == "jsonl":
+            return json.dumps([_json_value(value, self.float_digits) for value in values],
+                              ensure_ascii=False, separators=(",", ":"), default=str)
+        fields = ", ".join(f"{col}: {format_value(value, self.float_digits)}" for col, value in zip(self.column_names, values))
+        return f"Row {index + 1}: {fields}"
+
+    def rows(self, rows, start_index: int = 0) -> str:
+        """The rows' lines without the header."""
+        return "\n".join(self.row(values, i) for i, values in enumerate(rows, start=start_index))
+
+    def block(self, rows, start_index: int = 0) -> str:
+        """A self-contained block: the header, then the rows."""
+        body = self.rows(rows, start_index)
+        return f"{self.header}\n{body}" if self.header else body
+
+    def merge(self, blocks: list[str]) -> str:
+        """Joins blocks of this result set (e.g. retrieved documents) under a single header."""
+        if not self.header:
+            return "\n".join(blocks)
+        prefix = self.header + "\n"
+        bodies = [block[len(prefix):] if block.startswith(prefix) else block for block in blocks]
+        return "\n".join([self.header, *bodies])
+
+
+def from_config(column_names) -> RowFormatter:
+    """Formatter with the configured ROW_FORMAT and ROW_FLOAT_DIGITS (negative keeps full precision)."""
+    float_digits = config.ROW_FLOAT_DIGITS if config.ROW_FLOAT_DIGITS >= 0 else None
+    return RowFormatter(column_names, config.ROW_FORMAT, float_digits)
+
+
+def _escape_tsv(text: str) -> str:
+    return str(text).replace("\\", "\\\\").replace("\t", "\\t").replace("\n", "\\n").replace("\r", "\\r")
+
+
+def _escape_markdown(text: str) -> str:
+    return str(text).replace("|", "\\|").replace("\n", " ").replace("\r", " ")
+
+
+def chunk_blocks(batches, formatter: RowFormatter, rows_per_chunk: int = 1, max_chars: int | None = None):
+    """
+    Serializes batches of rows into self-contained blocks of up to `rows_per_chunk`
+    rows each, yielding (start_index, row_count, block). With `max_chars`, a block is
+    also closed before it would grow past `max_chars` characters (a single row always
+    fits), so documents stay within the embedding model's input limit.
+    """
+    lines = []
+    block_chars = len(formatter.header)
+    start = 0
+    position = 0
+    for batch in batches:
+        for values in batch:
+            line = formatter.row(values, position)
+            if lines and (len(lines) >= rows_per_chunk or (max_chars and block_chars + len(line) + 1 > max_chars)):
+                yield start, len(lines), "\n".join([formatter.header, *lines] if formatter.header else lines)
+                lines = []
+                block_chars = len(formatter.header)
+                start = position
+            lines.append(line)
+            block_chars += len(line) + 1
+            position += 1
+    if lines:
+        yield start, len(lines), "\n".join([formatter.header, *lines] if formatter.header else lines)
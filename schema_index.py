@@ -0,0 +1,264 @@
+import logging
+import math
+import re
+from collections import defaultdict, deque
+from typing import TYPE_CHECKING
+import config
+import llm_service
+
+if TYPE_CHECKING:
+    import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Words that carry no schema signal in a question
+_STOPWORDS = {
+    "a", "about", "all", "an", "and", "any", "are", "as", "at", "be", "by", "can", "do", "does", "each",
+    "for", "from", "give", "have", "how", "i", "in", "is", "it", "list", "many", "me", "much", "of", "on",
+    "or", "per", "show", "that", "the", "their", "there", "this", "to", "was", "were", "what", "which",
+    "who", "with", "would",
+}
+
+
+def tokenize(text: str) -> list[str]:
+    """Lowercased word tokens with snake_case split and plurals folded ("order_ids" -> order, id)."""
+    tokens = []
+    for word in re.findall(r"[a-z0-9]+", text.lower()):
+        if word in _STOPWORDS:
+            continue
+        if len(word) > 4 and word.endswith("ies"):
+            word = word[:-3] + "y"
+        elif len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+            word = word[:-1]
+        tokens.append(word)
+    return tokens
+
+
+def _table_document(table) -> str:
+    return " ".join([table.technical_name, *table.human_names, str(table.description)])
+
+
+def _column_document(table, column) -> str:
+    parts = [table.technical_name, column.technical_name, *column.human_names, str(column.description)]
+    for code, meaning in column.value_map.items():
+        parts += [str(code), str(meaning)]
+    return " ".join(parts)
+
+
+class SchemaIndex:
+    """
+    Index over one compiled semantic layer version, used to build schema-pruned SQL prompts.
+    Every table and every column becomes one searchable entry built from its
+    technical name, human names, description and value_map. Entries are matched
+    against a question with a TF-IDF keyword inverted index and, when available,
+    embedding similarity. select() keeps the top-k tables and columns plus the
+    join keys needed to connect them.
+    """
+
+    def __init__(self, layer, previous: "SchemaIndex | None" = None, use_embeddings: bool = True,
+                 embedding_weight: float | None = None):
+        # layer is a semantic_layer.CompiledSemanticLayer
+        self.tables = layer.tables
+        self.relationships = layer.relationships
+        self.header = layer.header
+        self.full_text = layer.prompt_text
+        self.embedding_weight = config.SCHEMA_EMBEDDING_WEIGHT if embedding_weight is None else embedding_weight
+
+        # One entry per table (column None) followed by its columns
+        self._entries = []
+        documents = []
+        for table_name, table in self.tables.items():
+            if not table.named:
+                continue # Without a technical_name the model could not refer to it anyway
+            self._entries.append((table_name, None))
+            documents.append(_table_document(table))
+            for column in table.columns:
+                if not column.named:
+                    continue
+                self._entries.append((table_name, column.technical_name))
+                documents.append(_column_document(table, column))
+        self._documents = documents
+
+        # Inverted index: token -> [(entry position, tf-idf weight)]
+        term_counts = [defaultdict(int) for _ in documents]
+        document_frequency = defaultdict(int)
+        for counts, document in zip(term_counts, documents):
+            for token in tokenize(document):
+                counts[token] += 1
+            for token in counts:
+                document_frequency[token] += 1
+        self._postings = defaultdict(list)
+        for position, counts in enumerate(term_counts):
+            length = sum(counts.values()) or 1
+            for token, count in counts.items():
+                idf = math.log(1 + len(documents) / document_frequency[token])
+                self._postings[token].append((position, count / length * idf))
+
+        self._joins = self._find_join_keys()
+
+        self._embeddings = None
+        if use_embeddings and documents:
+            # After a reload only new or edited entries need embedding
+            known = {}
+            if previous is not None and previous._embeddings is not None:
+                known = dict(zip(previous._documents, previous._embeddings))
+            missing = [document for document in documents if document not in known]
+            known.update(zip(missing, llm_service.embed_texts(missing) if missing else []))
+            vectors = [known.get(document) for document in documents]
+            dimension = next((len(v) for v in vectors if v is not None), 0)
+            if dimension:
+                import numpy as np # Imported on first use: importing the module stays cheap
+                matrix = np.array([v if v is not None else [0.0] * dimension for v in vectors], dtype=np.float32)
+                norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+                self._embeddings = matrix / np.where(norms == 0, 1, norms)
+            else:
+                logger.warning("Schema index: embeddings unavailable, using keyword matching only.")
+
+    @property
+    def has_embeddings(self) -> bool:
+        return self._embeddings is not None
+
+    def _find_join_keys(self) -> dict:
+        """
+        Join graph: table -> {other table: [(column, other column)]}.
+        Uses "relationships" entries ({"from": "orders.customer_id", "to": "customers.customer_id"})
+        when the semantic layer defines them, plus *_id columns shared by name between tables.
+        """
+        joins = defaultdict(lambda: defaultdict(list))
+
+        def link(left_table, left_column, right_table, right_column):
+            if left_table != right_table and (left_column, right_column) not in joins[left_table][right_table]:
+                joins[left_table][right_table].append((left_column, right_column))
+                joins[right_table][left_table].append((right_column, left_column))
+
+        for relationship in self.relationships:
+            try:
+                left_table, left_column = relationship["from"].split(".", 1)
+                right_table, right_column = relationship["to"].split(".", 1)
+            except (KeyError, ValueError, AttributeError):
+                logger.warning("Schema index: ignoring malformed relationship %s", relationship)
+                continue
+            if left_table in self.tables and right_table in self.tables:
+                link(left_table, left_column, right_table, right_column)
+
+        tables_by_key = defaultdict(list)
+        for table_name, table in self.tables.items():
+            if not table.named:
+                continue
+            for column in table.columns:
+                if column.named and column.technical_name.endswith("_id"):
+                    tables_by_key[column.technical_name].append(table_name)
+        for key, table_names in tables_by_key.items():
+            for i, left_table in enumerate(table_names):
+                for right_table in table_names[i + 1:]:
+                    link(left_table, key, right_table, key)
+        return joins
+
+    def _join_path(self, start: str, goal: str, max_hops: int = 2) -> list[str] | None:
+        """Shortest chain of tables from start to goal in the join graph, at most max_hops joins."""
+        previous = {start: None}
+        queue = deque([(start, 0)])
+        while queue:
+            table_name, hops = queue.popleft()
+            if table_name == goal:
+                path = []
+                while table_name is not None:
+                    path.append(table_name)
+                    table_name = previous[table_name]
+                return path[::-1]
+            if hops == max_hops:
+                continue
+            for neighbour in self._joins.get(table_name, {}):
+                if neighbour not in previous:
+                    previous[neighbour] = table_name
+                    queue.append((neighbour, hops + 1))
+        return None
+
+    def score(self, question: str, question_embedding=None) -> "np.ndarray":
+        """Relevance of every entry to the question, in [0, 1]."""
+        import numpy as np
+        keyword_scores = np.zeros(len(self._entries), dtype=np.float32)
+        for token in set(tokenize(question)):
+            for position, weight in self._postings.get(token, ()):
+                keyword_scores[position] += weight
+        if keyword_scores.max() > 0:
+            keyword_scores /= keyword_scores.max()
+
+        if self._embeddings is None or question_embedding is None:
+            return keyword_scores
+        query = np.asarray(question_embedding, dtype=np.float32)
+        if query.shape[0] != self._embeddings.shape[1] or not np.any(query):
+            return keyword_scores
+        similarity = self._embeddings @ (query / np.linalg.norm(query))
+        # Cosine similarities of one model sit in a narrow band; spread them over [0, 1]
+        spread = similarity.max() - similarity.min()
+        similarity = (similarity - similarity.min()) / spread if spread > 0 else np.zeros_like(similarity)
+        return self.embedding_weight * similarity + (1 - self.embedding_weight) * keyword_scores
+
+    def select(self, question: str, question_embedding=None, top_k_tables: int | None = None,
+               top_k_columns: int | None = None) -> dict | None:
+        """
+        Picks the schema subset for one question (top-k limits default to config.SCHEMA_TOP_K_*).
+        Returns {"tables": {table: [column names]}, "joins": [(table, column, table, column)]},
+        or None when nothing in the question matches the schema.
+        """
+        top_k_tables = config.SCHEMA_TOP_K_TABLES if top_k_tables is None else top_k_tables
+        top_k_columns = config.SCHEMA_TOP_K_COLUMNS if top_k_columns is None else top_k_columns
+        scores = self.score(question, question_embedding)
+        if not len(scores) or scores.max() <= 0:
+            return None
+
+        table_scores = defaultdict(float)
+        column_scores = defaultdict(dict)
+        for (table_name, column_name), entry_score in zip(self._entries, scores.tolist()):
+            table_scores[table_name] = max(table_scores[table_name], entry_score)
+            if column_name is not None:
+                column_scores[table_name][column_name] = entry_score
+        ranked = sorted(self.tables, key=lambda name: -table_scores[name])
+        chosen = [name for name in ranked[:top_k_tables] if table_scores[name] > 0]
+
+        # Connect the chosen tables, pulling in bridge tables where there is no direct join
+        selected = {name: set() for name in chosen}
+        joins = []
+        for i, left_table in enumerate(chosen):
+            for right_table in chosen[i + 1:]:
+                path = self._join_path(left_table, right_table)
+                if not path:
+                    continue
+                for a, b in zip(path, path[1:]):
+                    column_a, column_b = self._joins[a][b][0]
+                    if (a, column_a, b, column_b) in joins or (b, column_b, a, column_a) in joins:
+                        continue
+                    joins.append((a, column_a, b, column_b))
+                    selected.setdefault(a, set()).add(column_a)
+                    selected.setdefault(b, set()).add(column_b)
+
+        tables = {}
+        for table_name, join_columns in selected.items():
+            declared = [column.technical_name for column in self.tables[table_name].columns if column.named]
+            if table_name in chosen:
+                # Best-scoring columns first; ties keep declaration order so unmatched tables still show their leading columns
+                ranked_columns = sorted(declared, key=lambda name: -column_scores[table_name].get(name, 0.0))
+                keep = set(ranked_columns[:top_k_columns]) | join_columns
+            else:
+                keep = join_columns
+            tables[table_name] = [name for name in declared if name in keep]
+        return {"tables": tables, "joins": joins}
+
+    def format_selection(self, selection: dict) -> str:
+        """Formats a select() result like format_semantic_layer_for_prompt, plus the join keys."""
+        parts = [self.header]
+        for table_name, column_names in selection["tables"].items():
+            parts.append(self.tables[table_name].format(column_names))
+        if selection["joins"]:
+            parts.append("Join Keys:\n")
+            for left_table, left_column, right_table, right_column in selection["joins"]:
+                parts.append(f"  - {left_table}.{left_column} = {right_table}.{right_column}\n")
+        return "".join(parts)
+
+    def prompt_text(self, question: str, question_embedding=None) -> str:
+        """Schema text for the SQL prompt: the pruned schema, or the full one when nothing matched."""
+        selection = self.select(question, question_embedding)
+        if selection is None:
+            return self.full_text
+        return self.format_selection(selection)
@@ -1,49 +1,307 @@
+import hashlib
 import json
+import logging
+import os
+import threading
+import time
 import config
+import schema_index
 
-def load_semantic_layer(file_path: str = config.SEMANTIC_LAYER_PATH):
-    """Loads the semantic layer configuration from a JSON file."""
+logger = logging.getLogger(__name__)
+
+
+class SemanticLayerError(ValueError):
+    """Raised when the semantic layer JSON does not have the expected structure."""
+
+
+def load_semantic_layer(file_path: str | None = None):
+    """Loads the semantic layer configuration from a JSON file (config.SEMANTIC_LAYER_PATH by default)."""
+    # Resolved per call, not when the module is defined, so a changed config is picked up
+    file_path = file_path or config.SEMANTIC_LAYER_PATH
     try:
         with open(file_path, 'r') as f:
             semantic_config = json.load(f)
-        print(f"Semantic layer loaded from {file_path}")
+        logger.info("Semantic layer loaded from %s", file_path)
         return semantic_config
     except FileNotFoundError:
-        print(f"Error: Semantic layer file not found at {file_path}")
+        logger.error("Semantic layer file not found at %s", file_path)
         return None
     except json.JSONDecodeError:
-        print(f"Error: Could not parse semantic layer JSON from {file_path}")
+        logger.error("Could not parse semantic layer JSON from %s", file_path)
         return None
     except Exception as e:
-        print(f"An error occurred loading semantic layer: {e}")
+        logger.error("An error occurred loading semantic layer: %s", e)
         return None
 
+
+# --- Compiled semantic layer ---
+# Tables and columns are validated once and their prompt fragments rendered once,
+# so building a prompt is a string join over cached fragments.
+
+class ColumnSpec:
+    """One column of a compiled table, with its prompt fragment."""
+    __slots__ = ("technical_name", "named", "human_names", "description", "data_type", "value_map", "fragment")
+
+    def __init__(self, raw: dict):
+        self.named = bool(raw.get("technical_name")) # Unnamed ones are rendered as N/A but never indexed
+        self.technical_name = raw.get("technical_name") or "N/A"
+        self.human_names = tuple(raw.get("human_names", []))
+        self.description = raw.get("description", "N/A")
+        self.data_type = raw.get("data_type", "N/A")
+        self.value_map = raw.get("value_map") or {}
+        lines = [
+            f"    - {self.technical_name} ({', '.join(self.human_names)})\n",
+            f"      Type: {self.data_type}\n",
+            f"      Description: {self.description}\n",
+        ]
+        if self.value_map:
+            lines.append(f"      Value Mapping: {json.dumps(self.value_map)}\n") # Include value map
+        self.fragment = "".join(lines)
+
+
+class TableSpec:
+    """One compiled table. `digest` identifies its JSON definition so unchanged tables survive a reload."""
+    __slots__ = ("technical_name", "named", "human_names", "description", "columns", "digest", "header_fragment",
+                 "fragment")
+
+    def __init__(self, raw: dict, digest: str):
+        self.named = bool(raw.get("technical_name")) # Unnamed ones are rendered as N/A but never indexed
+        self.technical_name = raw.get("technical_name") or "N/A"
+        self.human_names = tuple(raw.get("human_names", []))
+        self.description = raw.get("description", "N/A")
+        self.columns = tuple(ColumnSpec(column) for column in raw.get("columns", []))
+        self.digest = digest
+        self.header_fragment = (f"Table: {self.technical_name} ({', '.join(self.human_names)})\n"
+                                f"  Description: {self.description}\n"
+                                "  Columns:\n")
+        self.fragment = self.format()
+
+    def format(self, column_names=None) -> str:
+        """Prompt text for the table, optionally limited to `column_names`."""
+        if column_names is None:
+            columns = self.columns
+        else:
+            wanted = set(column_names)
+            columns = [column for column in self.columns if column.technical_name in wanted]
+        # Trailing newline is the spacer between tables
+        return "".join([self.header_fragment, *(column.fragment for column in columns), "\n"])
+
+
+class CompiledSemanticLayer:
+    """
+    Validated, read-only snapshot of one version of the semantic layer.
+    `prompt_text` is the full schema text for the SQL prompt and `schema_index` the
+    SchemaIndex built for this version (None when schema pruning is disabled).
+    """
+    __slots__ = ("digest", "database", "tables", "relationships", "header", "prompt_text", "schema_index")
+
+    def __init__(self, digest: str, database: dict, tables: dict, relationships: list):
+        self.digest = digest
+        self.database = database
+        self.tables = tables
+        self.relationships = relationships
+        self.header = ("Database Schema Description:\n\n"
+                       f"Database Name: {database.get('technical_name', 'N/A')} ({database.get('human_name', 'N/A')})\n"
+                       f"Description: {database.get('description', 'N/A')}\n\n")
+        # You could add relationships here if defined in your JSON
+        # For this simple example, we rely on the LLM understanding FKs from descriptions/column names
+        self.prompt_text = "".join([self.header, *(table.fragment for table in tables.values())])
+        self.schema_index = None
+
+
+def _validate(semantic_config):
+    """
+    Checks the structure compile_semantic_layer relies on; raises SemanticLayerError.
+    A table or column without a technical_name is only warned about: it is rendered
+    as N/A, as the prompt always has.
+    """
+    if not isinstance(semantic_config, dict):
+        raise SemanticLayerError("semantic layer must be a JSON object")
+    tables = semantic_config.get("tables", [])
+    if not isinstance(tables, list):
+        raise SemanticLayerError('"tables" must be a list')
+    table_names = set()
+    for position, table in enumerate(tables):
+        if not isinstance(table, dict):
+            raise SemanticLayerError(f"table #{position + 1} must be an object")
+        name = table.get("technical_name")
+        if name is None:
+            logger.warning("Semantic layer table #%d has no technical_name; it is shown as N/A", position + 1)
+            name = f"#{position + 1}"
+        elif not isinstance(name, str) or not name:
+            raise SemanticLayerError(f"table #{position + 1}: technical_name must be a non-empty string")
+        elif name in table_names:
+            raise SemanticLayerError(f"table {name} is defined twice")
+        table_names.add(name)
+        if not isinstance(table.get("human_names", []), list):
+            raise SemanticLayerError(f"table {name}: human_names must be a list")
+        columns = table.get("columns", [])
+        if not isinstance(columns, list):
+            raise SemanticLayerError(f"table {name}: columns must be a list")
+        column_names = set()
+        for position, column in enumerate(columns):
+            if not isinstance(column, dict):
+                raise SemanticLayerError(f"table {name}: column #{position + 1} must be an object")
+            column_name = column.get("technical_name")
+            if column_name is None:
+                logger.warning("Semantic layer table %s: column #%d has no technical_name; it is shown as N/A",
+                               name, position + 1)
+                column_name = f"#{position + 1}"
+            elif not isinstance(column_name, str) or not column_name:
+                raise SemanticLayerError(
+                    f"table {name}: column #{position + 1}: technical_name must be a non-empty string")
+            elif column_name in column_names:
+                raise SemanticLayerError(f"table {name}: column {column_name} is defined twice")
+            column_names.add(column_name)
+            if not isinstance(column.get("human_names", []), list):
+                raise SemanticLayerError(f"column {name}.{column_name}: human_names must be a list")
+            if not isinstance(column.get("value_map") or {}, dict):
+                raise SemanticLayerError(f"column {name}.{column_name}: value_map must be an object")
+    if not isinstance(semantic_config.get("relationships", []), list):
+        raise SemanticLayerError('"relationships" must be a list')
+
+
+def compile_semantic_layer(semantic_config: dict, previous: CompiledSemanticLayer | None = None,
+                           digest: str | None = None) -> CompiledSemanticLayer:
+    """
+    Validates and compiles a semantic layer config.
+    Tables whose JSON definition is unchanged from `previous` are reused as-is,
+    so a reload only renders the tables that were edited.
+    """
+    _validate(semantic_config)
+    if digest is None:
+        digest = hashlib.sha256(json.dumps(semantic_config, sort_keys=True).encode("utf-8")).hexdigest()
+    previous_tables = previous.tables if previous else {}
+    tables = {}
+    for position, raw_table in enumerate(semantic_config.get("tables", [])):
+        table_digest = hashlib.sha256(json.dumps(raw_table, sort_keys=True).encode("utf-8")).hexdigest()
+        key = raw_table.get("technical_name") or f"#{position + 1}" # Unnamed tables still need distinct keys
+        reused = previous_tables.get(key)
+        tables[key] = (reused if reused is not None and reused.digest == table_digest
+                       else TableSpec(raw_table, table_digest))
+    return CompiledSemanticLayer(digest, semantic_config.get("database", {}), tables,
+                                 semantic_config.get("relationships", []))
+
+
 # Helper to format semantic layer for LLM prompt
 def format_semantic_layer_for_prompt(semantic_config):
     """Formats the semantic layer config into a string suitable for an LLM prompt."""
     if not semantic_config:
         return "No semantic layer available."
+    return compile_semantic_layer(semantic_config).prompt_text
 
-    formatted_string = "Database Schema Description:\n\n"
-    db_info = semantic_config.get("database", {})
-    formatted_string += f"Database Name: {db_info.get('technical_name', 'N/A')} ({db_info.get('human_name', 'N/A')})\n"
-    formatted_string += f"Description: {db_info.get('description', 'N/A')}\n\n"
 
-    tables = semantic_config.get("tables", [])
-    for table in tables:
-        formatted_string += f"Table: {table.get('technical_name', 'N/A')} ({', '.join(table.get('human_names', []))})\n"
-        formatted_string += f"  Description: {table.get('description', 'N/A')}\n"
-        formatted_string += "  Columns:\n"
-        columns = table.get("columns", [])
-        for column in columns:
-            formatted_string += f"    - {column.get('technical_name', 'N/A')} ({', '.join(column.get('human_names', []))})\n"
-            formatted_string += f"      Type: {column.get('data_type', 'N/A')}\n"
-            formatted_string += f"      Description: {column.get('description', 'N/A')}\n"
-            if column.get("value_map"):
-                 formatted_string += f"      Value Mapping: {json.dumps(column['value_map'])}\n" # Include value map
-        formatted_string += "\n" # Spacer between tables
-
-    # You could add relationships here if defined in your JSON
-    # For this simple example, we rely on the LLM understanding FKs from descriptions/column names
-
-    return formatted_string
\ No newline at end of file
+# --- Hot reload ---
+
+class SemanticLayerStore:
+    """
+    Keeps the compiled semantic layer for one JSON file current.
+    refresh() checks the file's mtime and size, confirms a change by content hash,
+    recompiles only the changed tables and rebuilds the schema index (reusing the
+    embeddings of unchanged entries). The new snapshot is published with a single
+    reference assignment, so requests already holding the previous one finish with it.
+    An invalid edit is reported and the previous snapshot stays in use.
+    """
+
+    def __init__(self, path: str, build_index: bool | None = None):
+        self.path = path
+        self.build_index = config.SCHEMA_PRUNING_ENABLED if build_index is None else build_index
+        self.current = None
+        self.reloads = 0
+        self._signature = None
+        self._lock = threading.Lock()
+        self.refresh()
+        if self._signature is None:
+            logger.error("Semantic layer file not found at %s", path)
+
+    def _read_signature(self):
+        try:
+            stat = os.stat(self.path)
+        except (OSError, TypeError): # TypeError: no path configured
+            return None
+        return (stat.st_mtime_ns, stat.st_size)
+
+    def refresh(self) -> bool:
+        """Reloads the file if it changed on disk. Returns True when a new snapshot was published."""
+        signature = self._read_signature()
+        if signature is None or signature == self._signature:
+            return False
+        with self._lock:
+            if signature == self._signature:
+                return False
+            self._signature = signature
+            try:
+                with open(self.path, "rb") as f:
+                    data = f.read()
+            except OSError as e:
+                logger.error("Could not read semantic layer %s: %s", self.path, e)
+                return False
+            digest = hashlib.sha256(data).hexdigest()
+            previous = self.current
+            if previous and previous.digest == digest:
+                return False # Touched but not edited
+
+            keeping = " Keeping the previous version." if previous else ""
+            try:
+                layer = compile_semantic_layer(json.loads(data), previous, digest)
+            except json.JSONDecodeError as e:
+                logger.error("Could not parse semantic layer JSON from %s: %s.%s", self.path, e, keeping)
+                return False
+            except SemanticLayerError as e:
+                logger.error("Invalid semantic layer in %s: %s.%s", self.path, e, keeping)
+                return False
+            if self.build_index:
+                try:
+                    layer.schema_index = schema_index.SchemaIndex(layer, previous.schema_index if previous else None)
+                except Exception as e:
+                    logger.error("Could not index semantic layer %s: %s.%s", self.path, e, keeping)
+                    return False
+
+            rebuilt = sum(1 for name, table in layer.tables.items()
+                          if not previous or previous.tables.get(name) is not table)
+            self.current = layer
+            if previous:
+                self.reloads += 1
+                logger.info("Semantic layer reloaded from %s (%d of %d tables changed)", self.path, rebuilt, len(layer.tables))
+            else:
+                logger.info("Semantic layer loaded from %s", self.path)
+            return True
+
+
+_store = None
+_store_lock = threading.Lock()
+_watch_thread = None
+
+
+def get_store(path: str | None = None) -> SemanticLayerStore:
+    """Process-wide store for config.SEMANTIC_LAYER_PATH, created on first use."""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = SemanticLayerStore(path or config.SEMANTIC_LAYER_PATH)
+        return _store
+
+
+def get_layer() -> CompiledSemanticLayer | None:
+    """Current compiled semantic layer, or None if it has never loaded successfully."""
+    return get_store().current
+
+
+def start_watcher(interval_seconds: float | None = None):
+    """Polls the semantic layer file every `interval_seconds` on a daemon thread (once per process)."""
+    global _watch_thread
+    interval_seconds = config.SEMANTIC_LAYER_RELOAD_INTERVAL_SECONDS if interval_seconds is None else interval_seconds
+    if interval_seconds <= 0 or _watch_thread is not None:
+        return
+    store = get_store()
+
+    def run():
+        while True:
+            time.sleep(interval_seconds)
+            try:
+                store.refresh()
+            except Exception as e:
+                logger.error("Semantic layer reload failed: %s", e)
+
+    _watch_thread = threading.Thread(target=run, name="semantic-layer-watch", daemon=True)
+    _watch_thread.start()
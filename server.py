@@ -0,0 +1,122 @@
+import asyncio
+import json
+import logging
+import uuid
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException
+from fastapi.responses import JSONResponse, StreamingResponse
+from pydantic import BaseModel
+import config
+import database_service
+import embedding_cache
+import result_cache
+import semantic_layer
+import sql_cache
+import sql_repair
+import pipeline
+import startup
+import tracing
+import vector_db_service
+
+logger = logging.getLogger(__name__)
+
+
+class AskRequest(BaseModel):
+    question: str
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    tracing.configure_logging()
+    # Every service is initialized in parallel, off the event loop (indexing the semantic
+    # layer embeds every table and column); /ready reports the outcome. Invalid settings
+    # raise here, so the server does not start
+    status = (await asyncio.to_thread(startup.warmup))["components"]
+    if status["semantic_layer"]["state"] != "ready":
+        raise RuntimeError("Failed to load semantic layer.")
+    if status["vector_store"]["state"] != "ready":
+        raise RuntimeError("Failed to initialize Vector Database.")
+    semantic_layer.start_watcher()
+    vector_db_service.start_background_gc()
+    logger.info("Semantic layer and Vector DB initialized. Server ready.")
+    yield
+
+
+app = FastAPI(title="Text-to-SQL RAG Chatbot", lifespan=lifespan)
+
+
+def _validate(request: AskRequest) -> str:
+    question = request.question.strip()
+    if not question:
+        raise HTTPException(status_code=400, detail="Please enter a question.")
+    return question
+
+
+@app.post("/ask")
+async def ask(request: AskRequest):
+    """Answers one question and returns the SQL, row count, answer and stage timings."""
+    question = _validate(request)
+    layer = semantic_layer.get_layer() # Pinned for the whole request, even if a reload lands mid-flight
+    return await pipeline.answer_question_async(question, layer.prompt_text, str(uuid.uuid4()),
+                                                schema_index=layer.schema_index)
+
+
+@app.post("/ask/stream")
+async def ask_stream(request: AskRequest):
+    """
+    Same pipeline as /ask, streamed as newline-delimited JSON events, one per stage;
+    the answer arrives as "answer_chunk" events while it is being generated.
+    """
+    question = _validate(request)
+    layer = semantic_layer.get_layer()
+    events = asyncio.Queue()
+    task = asyncio.create_task(pipeline.answer_question_async(
+        question, layer.prompt_text, str(uuid.uuid4()), on_event=events.put_nowait,
+        schema_index=layer.schema_index
+    ))
+
+    def finished(task):
+        if not task.cancelled() and task.exception():
+            events.put_nowait({"stage": "error", "error": f"Internal error: {task.exception()}"})
+        events.put_nowait(None)
+
+    task.add_done_callback(finished)
+
+    async def event_lines():
+        try:
+            while (event := await events.get()) is not None:
+                yield json.dumps(event, default=str) + "\n"
+        finally:
+            task.cancel() # Client went away mid-stream
+
+    return StreamingResponse(event_lines(), media_type="application/x-ndjson")
+
+
+@app.get("/health")
+async def health():
+    return {"status": "ok"}
+
+
+@app.get("/ready")
+async def ready():
+    """Warmup state of each service; 503 until all of them initialized successfully."""
+    status = startup.readiness()
+    return JSONResponse(status, status_code=200 if status["ready"] else 503)
+
+
+@app.get("/stats")
+async def stats():
+    """Hit rates and sizes of the caches, SQL repair outcomes, the database connection pool and per-stage latency percentiles."""
+    return {
+        "stages": tracing.stats(),
+        "result_cache": result_cache.stats(),
+        "sql_cache": sql_cache.stats(),
+        "sql_repair": sql_repair.stats(),
+        "embedding_cache": embedding_cache.stats(),
+        "db_pool": database_service.pool_stats(),
+    }
+
+
+if __name__ == "__main__":
+    import uvicorn
+    uvicorn.run(app, host=config.SERVER_HOST, port=config.SERVER_PORT)
@@ -0,0 +1,209 @@
+import hashlib
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import TYPE_CHECKING
+import config
+
+if TYPE_CHECKING:
+    import numpy as np
+
+
+def normalize_question(question: str) -> str:
+    """Case- and whitespace-insensitive form of a question, ignoring trailing punctuation."""
+    return " ".join(question.lower().split()).rstrip("?.! ")
+
+
+def schema_fingerprint(semantic_layer_text: str) -> str:
+    """Hash of the formatted semantic layer the SQL was generated against."""
+    return hashlib.sha256(semantic_layer_text.encode("utf-8")).hexdigest()
+
+
+def _numbers(question: str) -> tuple:
+    # Questions that differ only in a number ("customer ID 1" vs "customer ID 2")
+    # embed almost identically but need different SQL, so numbers must match exactly
+    return tuple(re.findall(r"\d+(?:\.\d+)?", question))
+
+
+class SQLCache:
+    """
+    Two-tier cache of generated SQL.
+    The exact tier is keyed on the normalized question plus the schema fingerprint.
+    The near-duplicate tier matches previously answered questions whose embedding
+    cosine similarity is at least `similarity_threshold` under the same schema.
+    Both tiers expire entries after `ttl_seconds` and keep at most `max_entries`
+    (least recently used first out). Everything is dropped when the semantic
+    layer file changes on disk.
+    """
+
+    def __init__(self, max_entries: int, ttl_seconds: float, similarity_threshold: float, watch_path: str | None = None):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.similarity_threshold = similarity_threshold
+        self.watch_path = watch_path
+        self.exact_hits = 0
+        self.similar_hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self._exact = OrderedDict() # key -> (sql, expires_at)
+        self._similar = OrderedDict() # key -> (schema_hash, unit vector, numbers, sql, expires_at)
+        self._lock = threading.Lock()
+        self._source_signature = self._read_source_signature()
+
+    def _read_source_signature(self):
+        if not self.watch_path:
+            return None
+        try:
+            stat = os.stat(self.watch_path)
+            return (stat.st_mtime_ns, stat.st_size)
+        except OSError:
+            return None
+
+    def _check_source(self):
+        """Clears the cache if the semantic layer file changed since the last check."""
+        signature = self._read_source_signature()
+        if signature != self._source_signature:
+            self._source_signature = signature
+            self._exact.clear()
+            self._similar.clear()
+            self.invalidations += 1
+
+    @staticmethod
+    def _get_live(tier: OrderedDict, key):
+        entry = tier.get(key)
+        if entry is None:
+            return None
+        if entry[-1] < time.monotonic():
+            del tier[key]
+            return None
+        tier.move_to_end(key)
+        return entry
+
+    def _evict(self, tier: OrderedDict):
+        while len(tier) > self.max_entries:
+            tier.popitem(last=False)
+
+    def get_exact(self, question: str, semantic_layer_text: str) -> str | None:
+        """SQL previously generated for the same normalized question and schema, if any."""
+        key = (normalize_question(question), schema_fingerprint(semantic_layer_text))
+        with self._lock:
+            self._check_source()
+            entry = self._get_live(self._exact, key)
+            if entry:
+                self.exact_hits += 1
+                return entry[0]
+        return None
+
+    def get_similar(self, question: str, semantic_layer_text: str, question_embedding: list[float] | None) -> str | None:
+        """
+        SQL of the most similar earlier question under the same schema, if its cosine
+        similarity reaches the threshold. Call after an exact miss; counts the miss
+        when nothing qualifies (including when no embedding is available).
+        """
+        query_vector = _unit(question_embedding) if question_embedding is not None else None
+        schema_hash = schema_fingerprint(semantic_layer_text)
+        numbers = _numbers(question)
+        with self._lock:
+            self._check_source()
+            if query_vector is not None:
+                now = time.monotonic()
+                for key in [key for key, entry in self._similar.items() if entry[-1] < now]:
+                    del self._similar[key]
+                candidates = [
+                    (key, entry) for key, entry in self._similar.items()
+                    if entry[0] == schema_hash and entry[2] == numbers
+                ]
+                if candidates:
+                    import numpy as np
+                    similarities = np.stack([entry[1] for _, entry in candidates]) @ query_vector
+                    best = int(np.argmax(similarities))
+                    if similarities[best] >= self.similarity_threshold:
+                        key, entry = candidates[best]
+                        self._similar.move_to_end(key)
+                        self.similar_hits += 1
+                        return entry[3]
+            self.misses += 1
+        return None
+
+    def put(self, question: str, semantic_layer_text: str, sql: str, question_embedding: list[float] | None = None):
+        normalized = normalize_question(question)
+        schema_hash = schema_fingerprint(semantic_layer_text)
+        expires_at = time.monotonic() + self.ttl_seconds
+        with self._lock:
+            self._check_source()
+            key = (normalized, schema_hash)
+            self._exact[key] = (sql, expires_at)
+            self._exact.move_to_end(key)
+            self._evict(self._exact)
+            vector = _unit(question_embedding) if question_embedding is not None else None
+            if vector is not None:
+                self._similar[key] = (schema_hash, vector, _numbers(question), sql, expires_at)
+                self._similar.move_to_end(key)
+                self._evict(self._similar)
+
+    def replace(self, question: str, semantic_layer_text: str, sql: str | None):
+        """Swaps the SQL cached for a question in both tiers (e.g. for its repaired version); None drops it."""
+        key = (normalize_question(question), schema_fingerprint(semantic_layer_text))
+        with self._lock:
+            self._check_source()
+            if sql is None:
+                self._exact.pop(key, None)
+                self._similar.pop(key, None)
+                return
+            if key in self._exact:
+                self._exact[key] = (sql, self._exact[key][1])
+            if key in self._similar:
+                self._similar[key] = (*self._similar[key][:3], sql, self._similar[key][4])
+
+    def clear(self):
+        with self._lock:
+            self._exact.clear()
+            self._similar.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.exact_hits + self.similar_hits + self.misses
+            return {
+                "exact_entries": len(self._exact),
+                "similar_entries": len(self._similar),
+                "exact_hits": self.exact_hits,
+                "similar_hits": self.similar_hits,
+                "misses": self.misses,
+                "hit_rate": (self.exact_hits + self.similar_hits) / lookups if lookups else 0.0,
+                "invalidations": self.invalidations,
+            }
+
+
+def _unit(vector) -> "np.ndarray | None":
+    import numpy as np # Imported on first use, with the first question embedding
+    array = np.asarray(vector, dtype=np.float32)
+    norm = np.linalg.norm(array)
+    return array / norm if norm else None
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_cache() -> SQLCache | None:
+    """Returns the shared SQL cache, or None when SQL_CACHE_ENABLED is off."""
+    global _cache
+    if not config.SQL_CACHE_ENABLED:
+        return None
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = SQLCache(
+                    config.SQL_CACHE_MAX_ENTRIES,
+                    config.SQL_CACHE_TTL_SECONDS,
+                    config.SQL_CACHE_SIMILARITY_THRESHOLD,
+                    watch_path=config.SEMANTIC_LAYER_PATH,
+                )
+    return _cache
+
+
+def stats() -> dict:
+    cache = get_cache()
+    return cache.stats() if cache else {"enabled": False}
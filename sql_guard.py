@@ -0,0 +1,315 @@
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+import config
+
+# Authorizer actions a read-only query may need; everything else (writes, DDL,
+# ATTACH, PRAGMA, transactions) makes preparation fail
+_READ_ONLY_ACTIONS = {sqlite3.SQLITE_SELECT, sqlite3.SQLITE_READ, sqlite3.SQLITE_FUNCTION, sqlite3.SQLITE_RECURSIVE}
+# Authorizer action codes overlap with result codes, so name them from an explicit list
+_ACTION_NAMES = {getattr(sqlite3, f"SQLITE_{name}"): name for name in (
+    "CREATE_INDEX", "CREATE_TABLE", "CREATE_TEMP_INDEX", "CREATE_TEMP_TABLE", "CREATE_TEMP_TRIGGER",
+    "CREATE_TEMP_VIEW", "CREATE_TRIGGER", "CREATE_VIEW", "DELETE", "DROP_INDEX", "DROP_TABLE", "DROP_TEMP_INDEX",
+    "DROP_TEMP_TABLE", "DROP_TEMP_TRIGGER", "DROP_TEMP_VIEW", "DROP_TRIGGER", "DROP_VIEW", "INSERT", "PRAGMA",
+    "TRANSACTION", "UPDATE", "ATTACH", "DETACH", "ALTER_TABLE", "REINDEX", "ANALYZE", "CREATE_VTABLE",
+    "DROP_VTABLE", "SAVEPOINT",
+)}
+
+# Strings, quoted identifiers and comments, removed before looking at the SQL's keywords
+_LITERALS = re.compile(r"'(?:[^']|'')*'|\"(?:[^\"]|\"\")*\"|`[^`]*`|\[[^\]]*\]|--[^\n]*|/\*.*?(?:\*/|$)", re.S)
+# Only strings and comments: quoted identifiers are kept, they may name a table
+_STRINGS_AND_COMMENTS = re.compile(r"'(?:[^']|'')*'|--[^\n]*|/\*.*?(?:\*/|$)", re.S)
+_IDENTIFIER = r"(?:[A-Za-z_]\w*|\"(?:[^\"]|\"\")*\"|`[^`]*`|\[[^\]]*\])"
+# "FROM t x", "JOIN t AS x" and ", t x" (comma joins), with plain, "quoted", `quoted` or [bracketed]
+# names; false matches in select lists are harmless because plan steps are only counted when
+# they resolve to a table the query actually reads
+_TABLE_ALIAS = re.compile(rf"(?:\b(?:FROM|JOIN)\b|,)\s*({_IDENTIFIER})(?:\s+(?:AS\s+)?({_IDENTIFIER}))?", re.I)
+_NOT_ALIASES = {"where", "join", "inner", "left", "right", "full", "cross", "natural", "on", "using", "group",
+                "order", "limit", "union", "intersect", "except", "having", "window", "as", "outer", "from",
+                "select"}
+_UNKNOWN_IDENTIFIER = re.compile(r"no such (?:table|column)\b", re.I)
+# Table names and aliases in plan steps are unquoted and may contain spaces
+_PLAN_STEP = re.compile(r"^(SCAN|SEARCH) (?:TABLE )?(.+?)(?: AS (.+?))?((?: USING | VIRTUAL TABLE | \().*)?$")
+
+# Table size estimates and accepted checks are cheap but not free; both are reused for this long
+_TABLE_SIZE_TTL_SECONDS = 60.0
+_table_sizes = {}
+_cache_lock = threading.Lock()
+# Generated SQL repeats (SQL cache hits, retries), so accepted checks are memoized per (sql, limit)
+_CHECK_CACHE_SIZE = 256
+_checks = OrderedDict()
+
+
+class QueryError(Exception):
+    """
+    Structured error for SQL that was rejected before running or failed while running.
+    `code` is one of: empty, multiple_statements, syntax, unknown_identifier (no such
+    table or column), not_read_only, too_expensive, timeout, pool_timeout, database. `details` holds code-specific data.
+    """
+
+    def __init__(self, code: str, message: str, sql: str | None = None, details: dict | None = None):
+        super().__init__(message)
+        self.code = code
+        self.message = message
+        self.sql = sql
+        self.details = details or {}
+
+    def __str__(self):
+        return self.message
+
+    def to_dict(self) -> dict:
+        return {"code": self.code, "message": self.message, "sql": self.sql, "details": self.details}
+
+
+class QueryCheck:
+    """Outcome of check_query for a query that was accepted."""
+
+    def __init__(self, sql: str, plan: list[str], tables: list[str], full_scans: dict, has_limit: bool,
+                 limit_injected: bool, estimated_rows_scanned: int):
+        self.sql = sql # The SQL to execute (with an injected LIMIT, if any)
+        self.plan = plan
+        self.tables = tables
+        self.full_scans = full_scans # table -> estimated rows, for tables scanned without an index
+        self.has_limit = has_limit
+        self.limit_injected = limit_injected
+        self.estimated_rows_scanned = estimated_rows_scanned
+        self.warnings = []
+        large = [table for table, rows in full_scans.items() if rows >= config.SQL_GUARD_LARGE_TABLE_ROWS]
+        if large:
+            self.warnings.append(f"full scan of large table(s): {', '.join(large)}")
+        if not has_limit and not limit_injected:
+            self.warnings.append("no LIMIT clause")
+
+    def to_dict(self) -> dict:
+        return {
+            "sql": self.sql,
+            "plan": self.plan,
+            "full_scans": self.full_scans,
+            "has_limit": self.has_limit,
+            "limit_injected": self.limit_injected,
+            "estimated_rows_scanned": self.estimated_rows_scanned,
+            "warnings": self.warnings,
+        }
+
+
+def _strip_literals(sql: str) -> str:
+    return _LITERALS.sub(" ", sql)
+
+
+def _top_level_keywords(sql: str) -> list[str]:
+    """Upper-cased words of the statement itself, outside parentheses (subqueries, CTE bodies)."""
+    depth = 0
+    keywords = []
+    for token in re.findall(r"\(|\)|[A-Za-z_]+", _strip_literals(sql)):
+        if token == "(":
+            depth += 1
+        elif token == ")":
+            depth -= 1
+        elif depth == 0:
+            keywords.append(token.upper())
+    return keywords
+
+
+def has_top_level_limit(sql: str) -> bool:
+    """True if the statement itself (not just a subquery) ends with a LIMIT clause."""
+    return "LIMIT" in _top_level_keywords(sql)
+
+
+def _unquote(identifier: str) -> str:
+    if identifier[:1] == '"':
+        return identifier[1:-1].replace('""', '"')
+    if identifier[:1] in ("`", "["):
+        return identifier[1:-1]
+    return identifier
+
+
+def table_aliases(sql: str) -> dict:
+    """Maps every table name and alias in FROM/JOIN clauses to its table name (best effort)."""
+    aliases = {}
+    for table, alias in _TABLE_ALIAS.findall(_STRINGS_AND_COMMENTS.sub(" ", sql)):
+        table = _unquote(table)
+        aliases[table] = table
+        if alias and alias.lower() not in _NOT_ALIASES:
+            aliases[_unquote(alias)] = table
+    return aliases
+
+
+def inject_limit(sql: str, limit: int) -> str:
+    """
+    Adds a LIMIT to a statement without one. A SELECT gets it appended, on a new line
+    so a trailing -- comment cannot swallow it (an unterminated /* comment is closed
+    first). A LIMIT cannot follow VALUES, so a statement ending in one is wrapped in
+    SELECT * FROM (...) instead.
+    """
+    if has_top_level_limit(sql):
+        return sql
+    last = None
+    for last in _LITERALS.finditer(sql):
+        pass
+    if last and last.end() == len(sql) and last.group().startswith("/*") and not (
+            len(last.group()) >= 4 and last.group().endswith("*/")):
+        sql += "*/"
+    if "VALUES" in _top_level_keywords(sql):
+        return f"SELECT * FROM (\n{sql}\n) LIMIT {int(limit)}"
+    return f"{sql}\nLIMIT {int(limit)}"
+
+
+def _normalize(sql: str) -> str:
+    sql = sql.strip()
+    while sql.endswith(";"):
+        sql = sql[:-1].rstrip()
+    return sql
+
+
+def _estimate_rows(conn: sqlite3.Connection, table: str) -> int:
+    """Approximate row count: sqlite_stat1 if ANALYZE has run, else max(rowid) (an index lookup, not a scan)."""
+    key = (id(conn), table)
+    now = time.monotonic()
+    with _cache_lock:
+        cached = _table_sizes.get(key)
+    if cached and now - cached[1] < _TABLE_SIZE_TTL_SECONDS:
+        return cached[0]
+    rows = 0
+    try:
+        stats = conn.execute("SELECT stat FROM sqlite_stat1 WHERE tbl = ?", (table,)).fetchall()
+        rows = max((int(stat.split()[0]) for (stat,) in stats if stat), default=0)
+    except sqlite3.Error:
+        pass # No sqlite_stat1 table until ANALYZE has been run
+    if not rows:
+        try:
+            rows = conn.execute(f'SELECT max(rowid) FROM "{table.replace(chr(34), chr(34) * 2)}"').fetchone()[0] or 0
+        except sqlite3.Error:
+            rows = 0 # WITHOUT ROWID table or view
+    with _cache_lock:
+        _table_sizes[key] = (rows, now)
+    return rows
+
+
+def check_query(conn: sqlite3.Connection, sql: str, limit: int | None = None) -> QueryCheck:
+    """
+    Validates LLM-generated SQL before it runs. Raises QueryError if it is rejected.
+    The statement is compiled (via EXPLAIN QUERY PLAN) under an authorizer that only
+    allows reads, which rejects writes, DDL, ATTACH and PRAGMA without executing
+    anything. The plan is then checked for full table scans; the estimated rows
+    scanned (product of the full-scanned table sizes within each join) must stay
+    below SQL_GUARD_MAX_SCAN_ROWS. If `limit` is given and the query has no
+    top-level LIMIT, one is injected.
+    """
+    sql = _normalize(sql)
+    if not sql:
+        raise QueryError("empty", "The SQL query is empty.", sql)
+    key = (sql, limit)
+    now = time.monotonic()
+    with _cache_lock:
+        cached = _checks.get(key)
+        if cached and now - cached[1] < _TABLE_SIZE_TTL_SECONDS:
+            _checks.move_to_end(key)
+            return cached[0]
+
+    denied = []
+    tables_read = []
+
+    def authorize(action, arg1, arg2, db_name, trigger):
+        if action not in _READ_ONLY_ACTIONS:
+            denied.append(_ACTION_NAMES.get(action, str(action)))
+            return sqlite3.SQLITE_DENY
+        if action == sqlite3.SQLITE_READ and arg1 and arg1 not in tables_read:
+            tables_read.append(arg1)
+        return sqlite3.SQLITE_OK
+
+    conn.set_authorizer(authorize)
+    try:
+        plan_rows = conn.execute(f"EXPLAIN QUERY PLAN {sql}").fetchall()
+    except sqlite3.ProgrammingError as e:
+        raise QueryError("multiple_statements", f"Only a single SQL statement can be run: {e}", sql)
+    except sqlite3.DatabaseError as e:
+        if denied:
+            raise QueryError("not_read_only", f"Only read-only queries are allowed (denied: {', '.join(denied)}).",
+                             sql, {"denied_actions": denied})
+        if _UNKNOWN_IDENTIFIER.search(str(e)):
+            raise QueryError("unknown_identifier", f"Invalid SQL: {e}", sql)
+        raise QueryError("syntax", f"Invalid SQL: {e}", sql)
+    finally:
+        conn.set_authorizer(None)
+
+    aliases = table_aliases(sql)
+
+    # Full scans grouped by the plan node they run under: siblings are nested loops of one join
+    scans_by_parent = {}
+    full_scans = {}
+    for _, parent, _, detail in plan_rows:
+        step = _PLAN_STEP.match(detail)
+        if not step or step.group(1) != "SCAN" or "INDEX" in (step.group(4) or ""):
+            continue
+        table = aliases.get(step.group(3) or step.group(2), step.group(2))
+        if table not in tables_read:
+            continue # Subquery, CTE or constant row
+        full_scans[table] = _estimate_rows(conn, table)
+        scans_by_parent.setdefault(parent, []).append(full_scans[table])
+    estimated_rows_scanned = 0
+    for sizes in scans_by_parent.values():
+        product = 1
+        for size in sizes:
+            product *= max(size, 1)
+        estimated_rows_scanned += product
+
+    if config.SQL_GUARD_MAX_SCAN_ROWS and estimated_rows_scanned > config.SQL_GUARD_MAX_SCAN_ROWS:
+        raise QueryError(
+            "too_expensive",
+            f"Query would scan about {estimated_rows_scanned:,} rows (limit {config.SQL_GUARD_MAX_SCAN_ROWS:,}).",
+            sql, {"full_scans": full_scans, "estimated_rows_scanned": estimated_rows_scanned},
+        )
+
+    has_limit = has_top_level_limit(sql)
+    limit_injected = limit is not None and not has_limit
+    check = QueryCheck(inject_limit(sql, limit) if limit_injected else sql, [row[3] for row in plan_rows],
+                       tables_read, full_scans, has_limit, limit_injected, estimated_rows_scanned)
+    with _cache_lock:
+        _checks[key] = (check, now)
+        if len(_checks) > _CHECK_CACHE_SIZE:
+            _checks.popitem(last=False)
+    return check
+
+
+class TimeBudget:
+    """
+    Wall-clock budget for the SQLite work done on one connection.
+    Each `with budget:` block installs a progress handler that interrupts the
+    running statement once the remaining budget is used up; time spent outside
+    the blocks (e.g. while the caller processes a batch of rows) is not counted.
+    """
+
+    # SQLite virtual machine instructions between deadline checks
+    CHECK_EVERY = 1000
+
+    def __init__(self, conn: sqlite3.Connection, seconds: float):
+        self.conn = conn
+        self.seconds = seconds
+        self.used = 0.0
+        self.expired = False
+        self._entered = None
+
+    def __enter__(self):
+        self._entered = time.monotonic()
+        if self.seconds > 0:
+            deadline = self._entered + self.seconds - self.used
+
+            def over_budget():
+                if time.monotonic() > deadline:
+                    self.expired = True
+                    return 1 # Non-zero aborts the statement with "interrupted"
+                return 0
+
+            self.conn.set_progress_handler(over_budget, self.CHECK_EVERY)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.used += time.monotonic() - self._entered
+        if self.seconds > 0:
+            self.conn.set_progress_handler(None, 0)
+
+    def error(self, sql: str) -> QueryError:
+        return QueryError("timeout", f"Query exceeded its {self.seconds:g}s time budget and was interrupted.", sql,
+                          {"budget_seconds": self.seconds, "used_seconds": round(self.used, 3)})
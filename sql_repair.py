@@ -0,0 +1,225 @@
+import difflib
+import re
+import threading
+from collections import OrderedDict
+import config
+import sql_cache
+import workload
+from sql_guard import QueryError
+
+# Errors a corrected query can fix. Rejected writes, timeouts and a busy pool are not retried:
+# the first is deliberate, the others are not mistakes in the SQL.
+REPAIRABLE_CODES = {"syntax", "unknown_identifier", "database", "multiple_statements", "too_expensive"}
+
+# Prefixes added by sql_guard / database_service in front of SQLite's own message
+_MESSAGE_PREFIX = re.compile(r"^(?:Invalid SQL|Database Error|Execution Error):\s*")
+_UNKNOWN_IDENTIFIER = re.compile(r"no such (column|table): ([\w.]+)", re.I)
+_QUALIFIER = re.compile(r"\b\w+\.(\w+)")
+_QUOTED = re.compile(r"'[^']*'")
+_NUMBER = re.compile(r"\d+(?:[.,]\d+)*")
+# Lexemes of a query: literals, quoted identifiers and comments are kept whole, so renames never touch them
+_LEXEME = re.compile(r"'(?:[^']|'')*'|\"(?:[^\"]|\"\")*\"|`[^`]*`|\[[^\]]*\]|--[^\n]*|/\*.*?(?:\*/|$)|\w+|\s+|.", re.S)
+_TABLE_POSITION = {"FROM", "JOIN"}
+
+
+def is_repairable(error) -> bool:
+    return isinstance(error, QueryError) and error.code in REPAIRABLE_CODES
+
+
+def error_fingerprint(error: QueryError) -> str:
+    """
+    What went wrong, independent of the query it went wrong in: the error code and
+    SQLite's message with table qualifiers, quoted text and numbers removed, e.g.
+    "unknown_identifier:no such column: total" for both "o.total" and "orders.total".
+    """
+    message = _MESSAGE_PREFIX.sub("", error.message).lower()
+    message = _QUALIFIER.sub(r"\1", message)
+    message = _NUMBER.sub("?", _QUOTED.sub("'?'", message))
+    return f"{error.code}:{message}"
+
+
+def _lexemes(sql: str) -> list[str]:
+    return _LEXEME.findall(sql)
+
+
+def _tokens(sql: str) -> list[str]:
+    """Case-folded significant lexemes, for comparing queries regardless of layout."""
+    return [lexeme.lower() for lexeme in _lexemes(sql) if not lexeme.isspace()]
+
+
+def apply_rename(sql: str, rename: tuple[str, str, str]) -> str | None:
+    """
+    Applies a learned (kind, old, new) rename to `sql`: a table after FROM/JOIN or
+    as a qualifier, or a column anywhere else (not a function name or an alias
+    defined with AS). Returns None if `old` does not occur.
+    """
+    kind, old, new = rename
+    lexemes = _lexemes(sql)
+    significant = [i for i, lexeme in enumerate(lexemes) if not lexeme.isspace()]
+    changed = False
+    for position, i in enumerate(significant):
+        if lexemes[i].lower() != old:
+            continue
+        previous = lexemes[significant[position - 1]].upper() if position else ""
+        following = lexemes[significant[position + 1]] if position + 1 < len(significant) else ""
+        if previous == "AS":
+            continue # An alias the query defines itself
+        if previous == ".":
+            is_table = False # A qualified name is always a column
+        else:
+            is_table = previous in _TABLE_POSITION or following == "."
+        if (kind == "table") == is_table and following != "(":
+            lexemes[i] = new
+            changed = True
+    return "".join(lexemes) if changed else None
+
+
+def learn_rename(error: QueryError, failing_sql: str, fixed_sql: str) -> tuple[str, str, str] | None:
+    """
+    The rename behind a fix, if the fix did nothing but replace the unknown table or
+    column named in the error with one other name, e.g. ("column", "total", "amount").
+    Such a fix applies to any query failing with the same error.
+    """
+    match = _UNKNOWN_IDENTIFIER.search(error.message)
+    if not match:
+        return None
+    kind, old = match.group(1).lower(), match.group(2).split(".")[-1].lower()
+    before, after = _tokens(failing_sql), _tokens(fixed_sql)
+    replacements = set()
+    for operation, i1, i2, j1, j2 in difflib.SequenceMatcher(None, before, after, autojunk=False).get_opcodes():
+        if operation == "equal":
+            continue
+        if operation != "replace" or i2 - i1 != 1 or j2 - j1 != 1 or before[i1] != old:
+            return None
+        replacements.add(after[j1])
+    if len(replacements) != 1:
+        return None
+    rename = (kind, old, replacements.pop())
+    if not re.fullmatch(r"[a-z_]\w*", rename[2]):
+        return None
+    # Keep it only if replaying it reproduces the fix exactly
+    replayed = apply_rename(failing_sql, rename)
+    return rename if replayed is not None and _tokens(replayed) == after else None
+
+
+class FixCache:
+    """
+    Fixes that repaired failing SQL, so recurring mistakes are fixed without an LLM call.
+    The exact tier maps (schema, error fingerprint, normalized failing SQL) to the
+    SQL that worked. The rename tier maps (schema, error fingerprint) to a rename
+    learned from a fix that only replaced the unknown table or column (e.g. total ->
+    amount); it fixes any query that fails with the same error. Keys include the
+    schema fingerprint, so fixes learned against an older semantic layer are not
+    reused. Each tier keeps at most `max_entries` (least recently used first out).
+    """
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self.exact_hits = 0
+        self.rename_hits = 0
+        self.misses = 0
+        self.stale = 0
+        self._exact = OrderedDict()
+        self._renames = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _keys(self, semantic_layer_text: str, error: QueryError, sql: str) -> tuple[tuple, tuple]:
+        rename_key = (sql_cache.schema_fingerprint(semantic_layer_text), error_fingerprint(error))
+        return (*rename_key, workload.normalize_sql(sql, keep_literals=True)), rename_key
+
+    def _store(self, tier: OrderedDict, key, value):
+        tier[key] = value
+        tier.move_to_end(key)
+        while len(tier) > self.max_entries:
+            tier.popitem(last=False)
+
+    def lookup(self, semantic_layer_text: str, error: QueryError, sql: str) -> tuple[str, str] | None:
+        """(fixed SQL, tier) for a query that failed with `error`, or None."""
+        exact_key, rename_key = self._keys(semantic_layer_text, error, sql)
+        with self._lock:
+            if exact_key in self._exact:
+                self._exact.move_to_end(exact_key)
+                self.exact_hits += 1
+                return self._exact[exact_key], "exact"
+            rename = self._renames.get(rename_key)
+            fixed_sql = apply_rename(sql, rename) if rename else None
+            if fixed_sql is not None:
+                self._renames.move_to_end(rename_key)
+                self.rename_hits += 1
+                return fixed_sql, "rename"
+            self.misses += 1
+        return None
+
+    def put(self, semantic_layer_text: str, error: QueryError, failing_sql: str, fixed_sql: str):
+        exact_key, rename_key = self._keys(semantic_layer_text, error, failing_sql)
+        rename = learn_rename(error, failing_sql, fixed_sql)
+        with self._lock:
+            self._store(self._exact, exact_key, fixed_sql)
+            if rename:
+                self._store(self._renames, rename_key, rename)
+
+    def forget(self, semantic_layer_text: str, error: QueryError, failing_sql: str, tier: str):
+        """Drops a cached fix that did not work (e.g. the data or schema changed under it)."""
+        exact_key, rename_key = self._keys(semantic_layer_text, error, failing_sql)
+        with self._lock:
+            if tier == "exact":
+                self._exact.pop(exact_key, None)
+            else:
+                self._renames.pop(rename_key, None)
+            self.stale += 1
+
+    def clear(self):
+        with self._lock:
+            self._exact.clear()
+            self._renames.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.exact_hits + self.rename_hits + self.misses
+            return {
+                "exact_entries": len(self._exact),
+                "rename_entries": len(self._renames),
+                "exact_hits": self.exact_hits,
+                "rename_hits": self.rename_hits,
+                "misses": self.misses,
+                "hit_rate": (self.exact_hits + self.rename_hits) / lookups if lookups else 0.0,
+                "stale": self.stale,
+            }
+
+
+# --- Repair outcomes ---
+_outcomes = {"attempted": 0, "repaired": 0, "failed": 0, "llm_calls": 0, "cache_fixes": 0}
+_outcomes_lock = threading.Lock()
+
+
+def record(repaired: bool, llm_calls: int, cache_fixes: int):
+    """Counts one repair loop for stats()."""
+    with _outcomes_lock:
+        _outcomes["attempted"] += 1
+        _outcomes["repaired" if repaired else "failed"] += 1
+        _outcomes["llm_calls"] += llm_calls
+        _outcomes["cache_fixes"] += cache_fixes
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_cache() -> FixCache | None:
+    """Returns the shared fix cache, or None when SQL_REPAIR_CACHE_ENABLED is off."""
+    global _cache
+    if not config.SQL_REPAIR_CACHE_ENABLED:
+        return None
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = FixCache(config.SQL_REPAIR_CACHE_MAX_ENTRIES)
+    return _cache
+
+
+def stats() -> dict:
+    with _outcomes_lock:
+        outcomes = dict(_outcomes)
+    outcomes["success_rate"] = outcomes["repaired"] / outcomes["attempted"] if outcomes["attempted"] else 0.0
+    cache = get_cache()
+    return {**outcomes, "fix_cache": cache.stats() if cache else {"enabled": False}}
@@ -0,0 +1,144 @@
+import asyncio
+import contextvars
+import time
+
+# Stage whose task is running, so time it spends waiting on other stages is not counted as its own work
+_current_stage = contextvars.ContextVar("stage_graph_current_stage", default=None)
+
+
+class _Stage:
+    __slots__ = ("name", "function", "needs", "task", "started", "finished", "waits", "consumed")
+
+    def __init__(self, name: str, function, needs: tuple):
+        self.name = name
+        self.function = function
+        self.needs = needs
+        self.task = None
+        self.started = None
+        self.finished = None
+        self.waits = [] # (start, end) intervals spent awaiting other stages
+        self.consumed = False
+
+    def busy_intervals(self) -> list[tuple[float, float]]:
+        """When the stage itself was working: its run time minus the waits."""
+        if self.started is None or self.finished is None:
+            return []
+        intervals = []
+        position = self.started
+        for start, end in sorted(self.waits):
+            if start > position:
+                intervals.append((position, start))
+            position = max(position, end)
+        if self.finished > position:
+            intervals.append((position, self.finished))
+        return intervals
+
+
+def _total(intervals: list[tuple[float, float]]) -> float:
+    return sum((end - start for start, end in intervals), 0.0)
+
+
+def _union(intervals: list[tuple[float, float]]) -> float:
+    covered = 0.0
+    current_start = current_end = None
+    for start, end in sorted(intervals):
+        if current_end is None or start > current_end:
+            if current_end is not None:
+                covered += current_end - current_start
+            current_start, current_end = start, end
+        else:
+            current_end = max(current_end, end)
+    if current_end is not None:
+        covered += current_end - current_start
+    return covered
+
+
+class StageGraph:
+    """
+    Dependency graph of the async stages of one request. A stage is a function
+    returning an awaitable, called with the results of the stages it `needs`; it
+    runs as its own task, started either speculatively with `start` or when its
+    result is first requested, and its needs are started alongside it, so
+    independent stages run concurrently. A stage that needs another only on some
+    branches joins it there by awaiting `result(name)` itself. Use as `async with`:
+    leaving the block cancels every stage still running (speculative work nobody
+    used, or everything still in flight after a failure). A failing stage's
+    exception propagates to everything awaiting it.
+    """
+
+    def __init__(self):
+        self._stages = {}
+        self._closed = False
+
+    def add(self, name: str, function, needs: tuple = ()) -> "StageGraph":
+        self._stages[name] = _Stage(name, function, tuple(needs))
+        return self
+
+    def start(self, *names: str):
+        """Starts stages now, without waiting for them (speculative or early work); ignored once the graph is closed."""
+        if self._closed:
+            return
+        for name in names:
+            self._task(name)
+
+    def _task(self, name: str) -> asyncio.Task:
+        stage = self._stages[name]
+        if stage.task is None:
+            stage.task = asyncio.create_task(self._run(stage), name=f"stage:{name}")
+        return stage.task
+
+    async def _run(self, stage: _Stage):
+        _current_stage.set(stage)
+        for need in stage.needs:
+            self._task(need)
+        inputs = [await self.result(need) for need in stage.needs]
+        stage.started = time.perf_counter()
+        try:
+            return await stage.function(*inputs)
+        finally:
+            stage.finished = time.perf_counter()
+
+    async def result(self, name: str):
+        """Result of a stage, starting it if needed. Cancelling one caller does not cancel the shared stage."""
+        task = self._task(name)
+        self._stages[name].consumed = True
+        if task.done():
+            return task.result()
+        caller = _current_stage.get()
+        waiting = time.perf_counter()
+        try:
+            return await asyncio.shield(task)
+        finally:
+            if caller is not None and caller.started is not None:
+                caller.waits.append((waiting, time.perf_counter()))
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        self._closed = True
+        tasks = [stage.task for stage in self._stages.values() if stage.task is not None]
+        for task in tasks:
+            if not task.done():
+                task.cancel()
+        # Collects every outcome, so failed speculative stages do not warn as never retrieved
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def durations(self) -> dict:
+        """Seconds each stage that ran spent working (waits on other stages excluded)."""
+        return {name: _total(stage.busy_intervals()) for name, stage in self._stages.items()
+                if stage.started is not None and stage.finished is not None}
+
+    def stats(self) -> dict:
+        """
+        overlap_saved: stage work whose result was used that ran concurrently with other
+        such work, i.e. how much longer the same stages would take one after another.
+        speculative_wasted: work of stages that ran but whose result nobody used.
+        """
+        used = [interval for stage in self._stages.values() if stage.consumed for interval in stage.busy_intervals()]
+        wasted = [interval for stage in self._stages.values() if not stage.consumed
+                  for interval in stage.busy_intervals()]
+        return {
+            "overlap_saved": max(0.0, _total(used) - _union(used)),
+            "speculative_wasted": _total(wasted),
+        }
@@ -0,0 +1,110 @@
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+import config
+import database_service
+import embedding_cache
+import row_format
+import semantic_layer
+import vector_db_service
+from gemini_client import client as gemini_client
+
+logger = logging.getLogger(__name__)
+
+# Importing the service modules opens nothing: the semantic layer, vector store,
+# database pool, HTTP client and embedding cache are all created on first use.
+# warmup() creates them ahead of the first request instead, in parallel, and
+# readiness() reports how that went.
+
+
+def check_config():
+    """Raises ValueError for settings that would otherwise only fail on the first request."""
+    row_format.from_config([]) # ROW_FORMAT
+
+
+def _semantic_layer():
+    # Compiles the layer and embeds the schema index (one batch of embedding calls)
+    if semantic_layer.get_layer() is None:
+        raise RuntimeError(f"Semantic layer could not be loaded from {config.SEMANTIC_LAYER_PATH}")
+
+
+def _vector_store():
+    if vector_db_service.get_store() is None:
+        raise RuntimeError(f"Vector store ({config.VECTOR_BACKEND}) could not be initialized")
+
+
+def _database():
+    with database_service.get_pool().connection():
+        pass # Opens the first pooled connection, so a bad DATABASE_PATH shows up now
+
+
+def _gemini_client():
+    gemini_client.start()
+
+
+def _embedding_cache():
+    embedding_cache.get_cache() # None when disabled or unavailable: embeddings are then always requested
+
+
+COMPONENTS = {
+    "gemini_client": _gemini_client,
+    "embedding_cache": _embedding_cache,
+    "semantic_layer": _semantic_layer,
+    "vector_store": _vector_store,
+    "database": _database,
+}
+
+_status = {} # component -> {"state": "starting" | "ready" | "failed", "seconds": float, "error": str | None}
+_status_lock = threading.Lock()
+
+
+def _initialize(name: str):
+    with _status_lock:
+        _status[name] = {"state": "starting", "seconds": None, "error": None}
+    start = time.perf_counter()
+    try:
+        COMPONENTS[name]()
+        state, error = "ready", None
+    except Exception as e:
+        state, error = "failed", f"{type(e).__name__}: {e}"
+        logger.error("Warmup of %s failed: %s", name, error)
+    with _status_lock:
+        _status[name] = {"state": state, "seconds": time.perf_counter() - start, "error": error}
+
+
+def warmup(components=None, parallel: bool = True, timeout: float | None = None) -> dict:
+    """
+    Initializes `components` (names from COMPONENTS, default all) now rather than on
+    first use, each on its own thread unless `parallel` is off, and returns
+    readiness(). Components still initializing after `timeout` seconds keep going
+    in the background and are reported as "starting". A component that fails is
+    reported, not raised: the caller decides whether it can run without it.
+    Invalid configuration (check_config) raises ValueError before anything starts.
+    """
+    names = list(COMPONENTS) if components is None else list(components)
+    unknown = [name for name in names if name not in COMPONENTS]
+    if unknown:
+        raise ValueError(f"Unknown components: {', '.join(unknown)}")
+    check_config()
+    start = time.perf_counter()
+    if parallel:
+        executor = ThreadPoolExecutor(max_workers=max(1, len(names)), thread_name_prefix="warmup")
+        wait([executor.submit(_initialize, name) for name in names], timeout=timeout)
+        executor.shutdown(wait=False)
+    else:
+        for name in names:
+            _initialize(name)
+    logger.info("Warmup of %s finished in %.3fs", ", ".join(names), time.perf_counter() - start)
+    return readiness()
+
+
+def readiness() -> dict:
+    """
+    {"ready": bool, "components": {name: status}} for the components warmup() has
+    seen. Ready once at least one component was warmed and all of them are ready.
+    """
+    with _status_lock:
+        components = {name: dict(status) for name, status in _status.items()}
+    ready = bool(components) and all(status["state"] == "ready" for status in components.values())
+    return {"ready": ready, "components": components}
@@ -0,0 +1,33 @@
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [ROOT, os.path.join(ROOT, "benchmarks")]
+
+import config
+from fake_gemini_server import start_server
+from gemini_client import GeminiClient
+
+
+@pytest.fixture
+def fake_server():
+    """The benchmarks' fake Gemini server on a free local port."""
+    server = start_server()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def client(monkeypatch):
+    """
+    A GeminiClient of its own with quick retries. Its HTTP client is created on the first
+    request, so settings a test patches before then (timeouts, concurrency) apply to it.
+    """
+    monkeypatch.setattr(config, "GEMINI_MAX_RETRIES", 3)
+    monkeypatch.setattr(config, "GEMINI_BACKOFF_BASE_SECONDS", 0.01)
+    monkeypatch.setattr(config, "GEMINI_BACKOFF_MAX_SECONDS", 0.05)
+    monkeypatch.setattr(config, "GEMINI_RATE_LIMIT_RPS", 0)
+    return GeminiClient()
@@ -0,0 +1,18 @@
+"""Reading the questions for batch mode."""
+import json
+import logging
+
+import batch
+
+
+def test_read_questions_skips_jsonl_lines_that_are_not_objects_or_strings(tmp_path, caplog):
+    path = tmp_path / "questions.jsonl"
+    lines = [{"id": "a", "question": "How many orders?"}, 42, ["a", "list"], "Total sales?", {"id": "b"}]
+    path.write_text("\n".join(json.dumps(line) for line in lines) + "\n")
+    with caplog.at_level(logging.WARNING, logger="batch"):
+        questions = batch.read_questions(str(path))
+    assert questions == [{"id": "a", "question": "How many orders?"}, {"id": "4", "question": "Total sales?"}]
+    skipped = [record.getMessage() for record in caplog.records]
+    assert any("entry 2 " in message and "not an object or a string" in message for message in skipped)
+    assert any("entry 3 " in message and "not an object or a string" in message for message in skipped)
+    assert any("entry 5 " in message and "no 'question'" in message for message in skipped)
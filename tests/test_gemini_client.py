@@ -0,0 +1,144 @@
+"""GeminiClient against the fake Gemini server: retries, Retry-After, timeouts, the concurrency cap and streams."""
+import asyncio
+import time
+
+import pytest
+
+import config
+from gemini_client import GeminiError
+
+BODY = {"contents": [{"parts": [{"text": "How many orders are there?"}]}]}
+
+
+def generate_url(server) -> str:
+    return f"{server.base_url}/models/test:generateContent"
+
+
+def stream_url(server) -> str:
+    return f"{server.base_url}/models/test:streamGenerateContent?alt=sse"
+
+
+def post(client, server):
+    return client.run(client.post_json(generate_url(server), BODY))
+
+
+def stream(client, server) -> tuple[list[dict], Exception | None]:
+    """Events received before the stream ended, and the error it ended with (if any)."""
+    events = []
+
+    async def consume():
+        async for event in client.stream_json(stream_url(server), BODY):
+            events.append(event)
+
+    try:
+        asyncio.run(consume()) # A loop of its own, like a caller outside the client's thread
+    except GeminiError as e:
+        return events, e
+    return events, None
+
+
+def stream_text(events: list[dict]) -> str:
+    return "".join(part["text"] for event in events for part in event["candidates"][0]["content"]["parts"])
+
+
+@pytest.mark.parametrize("status", [429, 500, 502, 503, 504])
+def test_retryable_status_is_retried(client, fake_server, status):
+    fake_server.scripted_errors = [status, status]
+    result = post(client, fake_server)
+    assert result["candidates"][0]["content"]["parts"][0]["text"] == fake_server.answer_response
+    assert client.stats() == {"requests": 3, "retries": 2, "failures": 0}
+    assert fake_server.request_counts["generateContent"] == 3
+
+
+def test_gives_up_after_max_retries(client, fake_server):
+    fake_server.scripted_errors = [503] * (config.GEMINI_MAX_RETRIES + 1)
+    assert post(client, fake_server) is None
+    assert client.stats() == {"requests": 4, "retries": 3, "failures": 1}
+
+
+@pytest.mark.parametrize("status", [400, 403, 404])
+def test_client_errors_are_not_retried(client, fake_server, status):
+    fake_server.scripted_errors = [status]
+    assert post(client, fake_server) is None
+    assert client.stats() == {"requests": 1, "retries": 0, "failures": 1}
+
+
+def test_waits_for_retry_after(client, fake_server, monkeypatch):
+    monkeypatch.setattr(config, "GEMINI_BACKOFF_MAX_SECONDS", 5)
+    fake_server.retry_after = 0.3
+    fake_server.scripted_errors = [429]
+    started = time.perf_counter()
+    assert post(client, fake_server) is not None
+    assert time.perf_counter() - started >= 0.3
+    assert client.stats()["retries"] == 1
+
+
+def test_retry_after_is_capped_by_max_backoff(client, fake_server):
+    fake_server.retry_after = 30
+    fake_server.scripted_errors = [429]
+    started = time.perf_counter()
+    assert post(client, fake_server) is not None
+    assert time.perf_counter() - started < 5 # GEMINI_BACKOFF_MAX_SECONDS is 0.05 here
+
+
+def test_timeout_is_retried_then_fails(client, fake_server, monkeypatch):
+    monkeypatch.setattr(config, "GEMINI_TIMEOUT_SECONDS", 0.1)
+    monkeypatch.setattr(config, "GEMINI_MAX_RETRIES", 1)
+    fake_server.latency_s = 0.5
+    started = time.perf_counter()
+    assert post(client, fake_server) is None
+    assert time.perf_counter() - started < 1.0 # Two attempts cut off at 0.1s, not two full responses
+    assert client.stats() == {"requests": 2, "retries": 1, "failures": 1}
+
+
+def test_concurrency_is_capped(client, fake_server, monkeypatch):
+    monkeypatch.setattr(config, "GEMINI_MAX_CONCURRENCY", 3)
+    fake_server.latency_s = 0.05
+
+    async def burst():
+        return await asyncio.gather(*(client.post_json(generate_url(fake_server), BODY) for _ in range(12)))
+
+    results = client.run(burst())
+    assert all(result is not None for result in results)
+    assert fake_server.max_in_flight == 3
+
+
+def test_stream_yields_the_text_in_events(client, fake_server):
+    events, error = stream(client, fake_server)
+    assert error is None
+    assert len(events) > 1
+    assert stream_text(events) == fake_server.answer_response
+
+
+def test_stream_is_retried_before_the_first_event(client, fake_server):
+    fake_server.scripted_errors = [503]
+    events, error = stream(client, fake_server)
+    assert error is None
+    assert stream_text(events) == fake_server.answer_response
+    assert client.stats() == {"requests": 2, "retries": 1, "failures": 0}
+
+
+def test_stream_breaking_off_midway_is_not_retried(client, fake_server):
+    fake_server.stream_chunk_words = 1
+    fake_server.stream_break_after = 2
+    events, error = stream(client, fake_server)
+    assert isinstance(error, GeminiError)
+    assert "interrupted" in str(error)
+    assert len(events) == 2 # Retrying would have handed out the same text again
+    assert client.stats() == {"requests": 1, "retries": 0, "failures": 1}
+
+
+def test_stream_breaking_off_before_any_event_is_retried(client, fake_server):
+    fake_server.stream_break_after = 0
+    events, error = stream(client, fake_server)
+    assert isinstance(error, GeminiError)
+    assert events == []
+    assert client.stats() == {"requests": 4, "retries": 3, "failures": 1}
+
+
+def test_stream_rejected_request_raises(client, fake_server):
+    fake_server.scripted_errors = [400]
+    events, error = stream(client, fake_server)
+    assert isinstance(error, GeminiError)
+    assert "400" in str(error)
+    assert client.stats() == {"requests": 1, "retries": 0, "failures": 1}
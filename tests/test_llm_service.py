@@ -0,0 +1,59 @@
+"""llm_service embeddings against the fake Gemini server."""
+import threading
+
+import pytest
+
+import config
+import embedding_cache
+import llm_service
+from fake_gemini_server import fake_embedding
+
+
+@pytest.fixture
+def service(client, fake_server, monkeypatch):
+    """llm_service talking to the fake server through the test's own client."""
+    monkeypatch.setattr(config, "GOOGLE_API_KEY", "test-key")
+    monkeypatch.setattr(llm_service, "gemini_client", client)
+    base = fake_server.base_url
+    monkeypatch.setattr(llm_service, "GEMINI_EMBED_URL", base + "/models/{model}:embedContent")
+    monkeypatch.setattr(llm_service, "GEMINI_BATCH_EMBED_URL", base + "/models/{model}:batchEmbedContents")
+    return llm_service
+
+
+@pytest.fixture
+def cache_threads(monkeypatch):
+    """Names of the threads the embedding cache is read and written on (the cache itself stays empty)."""
+    threads = []
+
+    def lookup(model, texts):
+        threads.append(threading.current_thread().name)
+        return [None] * len(texts)
+
+    def store(model, texts, embeddings):
+        threads.append(threading.current_thread().name)
+
+    monkeypatch.setattr(embedding_cache, "lookup", lookup)
+    monkeypatch.setattr(embedding_cache, "store", store)
+    return threads
+
+
+def test_embed_text_keeps_cache_io_off_the_client_loop(service, cache_threads):
+    assert service.embed_text("total sales") == pytest.approx(fake_embedding("total sales"))
+    assert len(cache_threads) == 2 # A lookup, then storing the miss
+    assert "gemini-client" not in cache_threads
+
+
+def test_embed_texts_keeps_cache_io_off_the_client_loop(service, cache_threads):
+    texts = ["orders", "", "customers", "amount"]
+    embeddings = service.embed_texts(texts, batch_size=2)
+    assert embeddings[1] is None
+    assert [embeddings[i] for i in (0, 2, 3)] == [pytest.approx(fake_embedding(texts[i])) for i in (0, 2, 3)]
+    assert len(cache_threads) == 3 # A lookup, then one store per chunk
+    assert "gemini-client" not in cache_threads
+
+
+def test_embed_texts_retries_a_failed_chunk(service, fake_server, cache_threads):
+    fake_server.scripted_errors = [503]
+    embeddings = service.embed_texts(["orders", "customers"])
+    assert all(embedding is not None for embedding in embeddings)
+    assert fake_server.request_counts["batchEmbedContents"] == 2
@@ -0,0 +1,48 @@
+"""Compiling and indexing the semantic layer."""
+import json
+
+import llm_service
+import schema_index
+import semantic_layer
+
+LAYER = {
+    "database": {"technical_name": "shop", "human_name": "Shop"},
+    "tables": [
+        {"technical_name": "orders", "human_names": ["Orders"], "description": "Customer orders.",
+         "columns": [
+             {"technical_name": "order_id", "human_names": ["Order ID"], "data_type": "INTEGER"},
+             {"technical_name": "customer_id", "human_names": ["Customer ID"], "data_type": "INTEGER"},
+             {"technical_name": None, "human_names": ["Mystery"], "data_type": "TEXT"},
+         ]},
+        {"technical_name": "customers", "human_names": ["Customers"], "description": "People who order.",
+         "columns": [
+             {"technical_name": "customer_id", "human_names": ["Customer ID"], "data_type": "INTEGER"},
+             {"technical_name": "name", "human_names": ["Name"], "data_type": "TEXT"},
+         ]},
+        {"technical_name": None, "human_names": ["Unnamed"], "description": "No name given.",
+         "columns": [{"technical_name": "customer_id", "human_names": ["Customer ID"], "data_type": "INTEGER"}]},
+    ],
+}
+
+
+def test_null_technical_name_is_rendered_as_na_and_not_indexed():
+    layer = semantic_layer.compile_semantic_layer(LAYER)
+    assert "None" not in layer.prompt_text
+    assert "    - N/A (Mystery)\n" in layer.prompt_text
+    assert "Table: N/A (Unnamed)\n" in layer.prompt_text
+
+    index = schema_index.SchemaIndex(layer, use_embeddings=False)
+    selection = index.select("customer names for each order")
+    assert set(selection["tables"]) == {"orders", "customers"}
+    assert "N/A" not in selection["tables"]["orders"]
+    assert [{(a, b), (c, d)} for a, b, c, d in selection["joins"]] == [{("orders", "customer_id"),
+                                                                        ("customers", "customer_id")}]
+
+
+def test_store_indexes_a_layer_with_a_null_technical_name(tmp_path, monkeypatch):
+    monkeypatch.setattr(llm_service, "embed_texts", lambda texts: [None] * len(texts)) # Keyword matching only
+    path = tmp_path / "semantic_layer.json"
+    path.write_text(json.dumps(LAYER))
+    store = semantic_layer.SemanticLayerStore(str(path), build_index=True) # Loads the file
+    assert store.current is not None
+    assert store.current.schema_index is not None
@@ -0,0 +1,92 @@
+"""The SQL repair loop: only candidates that run to the end count as fixes."""
+import asyncio
+
+import pytest
+
+import config
+import llm_service
+import pipeline
+import sql_cache
+import sql_repair
+from sql_guard import QueryError
+
+SCHEMA = "Table: orders (Orders)\n  Columns:\n    - amount (Amount)\n"
+FAILING_SQL = "SELECT SUM(total) FROM orders"
+FIXED_SQL = "SELECT SUM(amount) FROM orders"
+UNKNOWN_COLUMN = QueryError("unknown_identifier", "Invalid SQL: no such column: total", FAILING_SQL)
+
+
+@pytest.fixture
+def fixes(monkeypatch):
+    cache = sql_repair.FixCache(100)
+    monkeypatch.setattr(config, "SQL_REPAIR_MAX_ATTEMPTS", 1)
+    monkeypatch.setattr(sql_repair, "get_cache", lambda: cache)
+    monkeypatch.setattr(sql_cache, "get_cache", lambda: None)
+    return cache
+
+
+@pytest.fixture
+def outcomes(monkeypatch):
+    """Repair loops counted by sql_repair.record, as (repaired, llm_calls, cache_fixes)."""
+    recorded = []
+    monkeypatch.setattr(sql_repair, "record", lambda *outcome: recorded.append(outcome))
+    return recorded
+
+
+def failed_during_fetch(sql: str) -> dict:
+    """What _execute_rows returns when the rows stop partway: a path and an error."""
+    return {"sql": sql, "path": "direct", "error": QueryError("timeout", "Query exceeded its time budget.", sql)}
+
+
+def repair(execute) -> dict:
+    async def schema_text():
+        return SCHEMA
+
+    original = {"sql": FAILING_SQL, "path": None, "error": UNKNOWN_COLUMN}
+    return asyncio.run(pipeline._repair("What is the total?", SCHEMA, original, execute, schema_text))
+
+
+def test_candidate_failing_during_fetch_is_not_a_fix(fixes, outcomes, monkeypatch):
+    async def repair_sql_async(question, sql, error, schema):
+        return FIXED_SQL
+
+    async def execute(sql):
+        return failed_during_fetch(sql)
+
+    monkeypatch.setattr(llm_service, "repair_sql_async", repair_sql_async)
+    execution = repair(execute)
+    assert execution["repair"]["repaired"] is False
+    assert execution["repair"]["fixed_by"] is None
+    assert outcomes == [(False, 1, 0)]
+    assert fixes.lookup(SCHEMA, UNKNOWN_COLUMN, FAILING_SQL) is None
+
+
+def test_candidate_that_runs_is_cached(fixes, outcomes, monkeypatch):
+    async def repair_sql_async(question, sql, error, schema):
+        return FIXED_SQL
+
+    async def execute(sql):
+        return {"sql": sql, "path": "direct", "error": None}
+
+    monkeypatch.setattr(llm_service, "repair_sql_async", repair_sql_async)
+    execution = repair(execute)
+    assert execution["repair"]["repaired"] is True
+    assert outcomes == [(True, 1, 0)]
+    assert fixes.lookup(SCHEMA, UNKNOWN_COLUMN, FAILING_SQL) == (FIXED_SQL, "exact")
+
+
+def test_cached_fix_failing_during_fetch_is_forgotten(fixes, outcomes, monkeypatch):
+    async def repair_sql_async(question, sql, error, schema):
+        raise AssertionError("The cached fix ends the loop: its error is not repairable")
+
+    async def execute(sql):
+        return failed_during_fetch(sql)
+
+    fixes.put(SCHEMA, UNKNOWN_COLUMN, FAILING_SQL, FIXED_SQL)
+    monkeypatch.setattr(llm_service, "repair_sql_async", repair_sql_async)
+    execution = repair(execute)
+    assert execution["repair"]["repaired"] is False
+    assert execution["repair"]["attempts"][0]["fixed_by"] == "cache_exact"
+    assert outcomes == [(False, 0, 1)]
+    assert fixes.stale == 1
+    assert fixes.stats()["exact_entries"] == 0 # The rename learned alongside it is a tier of its own
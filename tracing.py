@@ -0,0 +1,357 @@
+import collections
+import contextvars
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+import config
+
+logger = logging.getLogger(__name__)
+
+# Innermost open span and the query being answered, per thread / asyncio task
+_current_span = contextvars.ContextVar("tracing_current_span", default=None)
+_current_query_id = contextvars.ContextVar("tracing_query_id", default=None)
+# Exporters receiving finished spans; tracing is off (and span() free) while this is empty
+_exporters = []
+
+
+class Span:
+    """
+    One timed stage of a request. Use as a context manager: entering makes it the
+    parent of spans opened inside it (also across awaits), leaving records the
+    duration and any exception and hands it to the exporters. `set` attaches
+    attributes (row/byte/token counts, cache hits, ...).
+    """
+
+    __slots__ = ("name", "trace_id", "span_id", "parent_id", "attributes", "start_time", "duration", "error",
+                 "_start", "_token")
+
+    def __init__(self, name: str, trace_id: str, parent_id: str | None, attributes: dict):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent_id = parent_id
+        self.attributes = attributes
+        self.start_time = 0.0
+        self.duration = 0.0
+        self.error = None
+        self._start = 0.0
+        self._token = None
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+        return self
+
+    def __enter__(self):
+        self.start_time = time.time()
+        self._start = time.perf_counter()
+        self._token = _current_span.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.duration = time.perf_counter() - self._start
+        if exc is not None:
+            self.error = f"{exc_type.__name__}: {exc}"
+        _current_span.reset(self._token)
+        for exporter in _exporters:
+            try:
+                exporter.export(self)
+            except Exception as e:
+                logger.warning("Span exporter %s failed: %s", type(exporter).__name__, e)
+
+    def to_dict(self) -> dict:
+        return {
+            "name": self.name,
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "start_time": self.start_time,
+            "duration_ms": round(self.duration * 1000, 3),
+            "attributes": self.attributes,
+            "error": self.error,
+        }
+
+
+class _NoopSpan:
+    """Returned by span() while tracing is off: every operation does nothing."""
+
+    __slots__ = ()
+    trace_id = None
+    span_id = None
+
+    def set(self, **attributes):
+        return self
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        pass
+
+
+_NOOP_SPAN = _NoopSpan()
+
+
+def span(name: str, **attributes) -> Span | _NoopSpan:
+    """Opens a span (use with `with`) as a child of the current one; a shared no-op when tracing is off."""
+    if not _exporters:
+        return _NOOP_SPAN
+    parent = _current_span.get()
+    if parent is not None:
+        return Span(name, parent.trace_id, parent.span_id, attributes)
+    return Span(name, _current_query_id.get() or uuid.uuid4().hex, None, attributes)
+
+
+@contextmanager
+def trace(query_id: str, name: str = "ask", **attributes):
+    """
+    Root span of one question. Its trace id is the query_sequence_id, which is also
+    attached to every log record emitted while it is open (see QueryIdFilter),
+    whether or not tracing is enabled.
+    """
+    token = _current_query_id.set(query_id)
+    try:
+        with span(name, query_sequence_id=query_id, **attributes) as root:
+            yield root
+    finally:
+        _current_query_id.reset(token)
+
+
+def current_span() -> Span | None:
+    return _current_span.get()
+
+
+def current_query_id() -> str | None:
+    return _current_query_id.get()
+
+
+@contextmanager
+def use_span(parent: Span | None):
+    """Makes `parent` the current span, for work handed to a thread or event loop that does not inherit the context."""
+    token = _current_span.set(parent)
+    try:
+        yield parent
+    finally:
+        _current_span.reset(token)
+
+
+def bind(function):
+    """Wraps `function` to run in a copy of the caller's context, e.g. for ThreadPoolExecutor.submit."""
+    context = contextvars.copy_context()
+    return lambda *args, **kwargs: context.run(function, *args, **kwargs)
+
+
+class QueryIdFilter(logging.Filter):
+    """Adds `query_id` (the current query_sequence_id, or "-") to log records for use in the log format."""
+
+    def filter(self, record):
+        record.query_id = _current_query_id.get() or "-"
+        return True
+
+
+def configure_logging(level: str | None = None):
+    """Sets up leveled logging for the entry points (LOG_LEVEL / LOG_FORMAT) with the query id on every record."""
+    handler = logging.StreamHandler()
+    handler.setFormatter(logging.Formatter(config.LOG_FORMAT))
+    handler.addFilter(QueryIdFilter())
+    logging.basicConfig(level=(level or config.LOG_LEVEL).upper(), handlers=[handler], force=True)
+    # Request lines from the HTTP client are noise at INFO
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+
+
+# --- Exporters ---
+
+class JsonLinesExporter:
+    """Appends every finished span to a file as one JSON object per line."""
+
+    def __init__(self, path: str):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self._lock = threading.Lock()
+        self._file = open(path, "a", encoding="utf-8", buffering=1) # Line buffered
+
+    def export(self, finished: Span):
+        line = json.dumps(finished.to_dict(), default=str)
+        with self._lock:
+            self._file.write(line + "\n")
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+
+class HistogramExporter:
+    """
+    Keeps the most recent `max_samples` durations per span name in memory and
+    reports count, mean and percentiles, e.g. for GET /stats.
+    """
+
+    def __init__(self, max_samples: int = 10000):
+        self.max_samples = max_samples
+        self._durations = {}
+        self._counts = collections.Counter()
+        self._errors = collections.Counter()
+        self._lock = threading.Lock()
+
+    def export(self, finished: Span):
+        with self._lock:
+            samples = self._durations.get(finished.name)
+            if samples is None:
+                samples = self._durations[finished.name] = collections.deque(maxlen=self.max_samples)
+            samples.append(finished.duration)
+            self._counts[finished.name] += 1
+            if finished.error:
+                self._errors[finished.name] += 1
+
+    @staticmethod
+    def _percentile(ordered: list[float], fraction: float) -> float:
+        return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+    def percentiles(self) -> dict:
+        """Span name -> {count, errors, mean_ms, p50_ms, p95_ms, p99_ms, max_ms} over the retained samples."""
+        with self._lock:
+            snapshot = {name: sorted(samples) for name, samples in self._durations.items()}
+            counts = dict(self._counts)
+            errors = dict(self._errors)
+        report = {}
+        for name, ordered in sorted(snapshot.items()):
+            report[name] = {
+                "count": counts[name],
+                "errors": errors.get(name, 0),
+                "mean_ms": round(sum(ordered) / len(ordered) * 1000, 3),
+                "p50_ms": round(self._percentile(ordered, 0.50) * 1000, 3),
+                "p95_ms": round(self._percentile(ordered, 0.95) * 1000, 3),
+                "p99_ms": round(self._percentile(ordered, 0.99) * 1000, 3),
+                "max_ms": round(ordered[-1] * 1000, 3),
+            }
+        return report
+
+    def clear(self):
+        with self._lock:
+            self._durations.clear()
+            self._counts.clear()
+            self._errors.clear()
+
+
+def _otlp_value(value) -> dict:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)} # OTLP/JSON encodes 64-bit integers as strings
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+def _otlp_id(value: str, length: int) -> str:
+    """OTLP ids are fixed-length hex; a uuid query id maps onto the 32-hex trace id directly."""
+    hex_id = value.replace("-", "").lower()
+    if len(hex_id) == length and all(c in "0123456789abcdef" for c in hex_id):
+        return hex_id
+    return uuid.uuid5(uuid.NAMESPACE_OID, value).hex[:length]
+
+
+class OtlpJsonExporter:
+    """
+    Writes traces in the OpenTelemetry OTLP/JSON format (one ExportTraceServiceRequest
+    per line), which OpenTelemetry collectors and most tracing backends can import.
+    Spans are held until the root span of their trace finishes so each line is a
+    complete trace; at most `max_pending_traces` unfinished traces are buffered.
+    """
+
+    def __init__(self, path: str, service_name: str = "text-to-sql-rag", max_pending_traces: int = 1000):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self.service_name = service_name
+        self.max_pending_traces = max_pending_traces
+        self._pending = collections.OrderedDict() # trace_id -> [spans]
+        self._lock = threading.Lock()
+        self._file = open(path, "a", encoding="utf-8", buffering=1)
+
+    def _otlp_span(self, finished: Span) -> dict:
+        start_ns = int(finished.start_time * 1e9)
+        otlp = {
+            "traceId": _otlp_id(finished.trace_id, 32),
+            "spanId": finished.span_id,
+            "name": finished.name,
+            "kind": 1, # SPAN_KIND_INTERNAL
+            "startTimeUnixNano": str(start_ns),
+            "endTimeUnixNano": str(start_ns + int(finished.duration * 1e9)),
+            "attributes": [{"key": key, "value": _otlp_value(value)} for key, value in finished.attributes.items()],
+            "status": {"code": 2, "message": finished.error} if finished.error else {"code": 1}, # ERROR / OK
+        }
+        if finished.parent_id:
+            otlp["parentSpanId"] = finished.parent_id
+        return otlp
+
+    def _write(self, spans: list[Span]):
+        request = {"resourceSpans": [{
+            "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": self.service_name}}]},
+            "scopeSpans": [{"scope": {"name": "tracing"}, "spans": [self._otlp_span(s) for s in spans]}],
+        }]}
+        self._file.write(json.dumps(request) + "\n")
+
+    def export(self, finished: Span):
+        with self._lock:
+            spans = self._pending.setdefault(finished.trace_id, [])
+            spans.append(finished)
+            if finished.parent_id is None:
+                self._write(self._pending.pop(finished.trace_id))
+            while len(self._pending) > self.max_pending_traces:
+                self._write(self._pending.popitem(last=False)[1])
+
+    def close(self):
+        with self._lock:
+            for spans in self._pending.values():
+                self._write(spans)
+            self._pending.clear()
+            self._file.close()
+
+
+def add_exporter(exporter):
+    """Starts sending finished spans to `exporter` (any object with an `export(span)` method); enables tracing."""
+    _exporters.append(exporter)
+
+
+def remove_exporter(exporter):
+    _exporters.remove(exporter)
+
+
+def exporters() -> list:
+    return list(_exporters)
+
+
+def histogram() -> HistogramExporter | None:
+    return next((e for e in _exporters if isinstance(e, HistogramExporter)), None)
+
+
+def stats() -> dict:
+    """Per-stage latency percentiles from the histogram exporter, if one is installed."""
+    exporter = histogram()
+    return exporter.percentiles() if exporter else {"enabled": False}
+
+
+def configure():
+    """Installs the exporters named in TRACING_EXPORTERS when TRACING_ENABLED is on."""
+    _exporters.clear()
+    if not config.TRACING_ENABLED:
+        return
+    for name in (n.strip().lower() for n in config.TRACING_EXPORTERS.split(",")):
+        if name == "histogram":
+            add_exporter(HistogramExporter(config.TRACING_HISTOGRAM_SAMPLES))
+        elif name == "jsonl":
+            add_exporter(JsonLinesExporter(config.TRACING_JSONL_PATH))
+        elif name == "otlp":
+            add_exporter(OtlpJsonExporter(config.TRACING_OTLP_PATH))
+        elif name:
+            logger.warning("Unknown tracing exporter %r (expected histogram, jsonl or otlp)", name)
+
+
+configure()
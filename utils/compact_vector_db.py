@@ -0,0 +1,34 @@
+import argparse
+import os
+import sys
+
+# Run from anywhere: make the project root importable
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import vector_db_service
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Garbage-collect and compact the stored SQL results in the vector DB.")
+    parser.add_argument("--gc-only", action="store_true", help="Only apply the TTL and size limits, skip the orphan scan")
+    parser.add_argument("--ttl-seconds", type=float, default=None, help="Override VECTOR_RESULT_TTL_SECONDS")
+    parser.add_argument("--max-rows", type=int, default=None, help="Override VECTOR_MAX_ROWS")
+    args = parser.parse_args()
+
+    store = vector_db_service.get_store()
+    if not store:
+        print("Vector DB not initialized.")
+        return
+
+    if args.ttl_seconds is not None:
+        vector_db_service.config.VECTOR_RESULT_TTL_SECONDS = args.ttl_seconds
+    if args.max_rows is not None:
+        vector_db_service.config.VECTOR_MAX_ROWS = args.max_rows
+
+    before = store.count()
+    stats = vector_db_service.collect_garbage() if args.gc_only else vector_db_service.compact()
+    print(f"Rows before: {before}, after: {store.count()}. {stats}")
+
+
+if __name__ == "__main__":
+    main()
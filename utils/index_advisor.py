@@ -0,0 +1,259 @@
+import argparse
+import os
+import re
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+from urllib.request import pathname2url
+
+# Run from anywhere: make the project root importable
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import config
+import sql_guard
+import workload
+
+# column <op> [column]; the right-hand column is only present for joins (literals are stripped first)
+_COMPARISON = re.compile(
+    r"((?:[A-Za-z_]\w*\.)?[A-Za-z_]\w*)\s*(==|=|<>|!=|<=|>=|<|>|\bIN\b|\bBETWEEN\b|\bLIKE\b|\bIS\b)"
+    r"\s*((?:[A-Za-z_]\w*\.)?[A-Za-z_]\w*)?",
+    re.I,
+)
+_ORDER_OR_GROUP = re.compile(r"\b(?:ORDER|GROUP)\s+BY\s+(.*?)(?=\bLIMIT\b|\bHAVING\b|\bORDER\b|\bWINDOW\b|\)|$)",
+                             re.I | re.S)
+_EQUALITY_OPERATORS = {"=", "==", "in", "is"}
+_RANGE_OPERATORS = {"<", ">", "<=", ">=", "between", "like"}
+_CONSTANT_WORDS = {"null", "not", "select", "true", "false", "current_date", "current_timestamp", "date"}
+
+
+def _connect_read_only(database_path: str) -> sqlite3.Connection:
+    return sqlite3.connect(f"file:{pathname2url(os.path.abspath(database_path))}?mode=ro", uri=True)
+
+
+def _rowid_column(conn: sqlite3.Connection, table: str) -> str | None:
+    """Name of the INTEGER PRIMARY KEY column (an alias of the rowid, already indexed), if any."""
+    primary_keys = [(name, declared_type) for _, name, declared_type, _, _, pk in
+                    conn.execute(f'PRAGMA table_info("{table}")') if pk]
+    if len(primary_keys) == 1 and primary_keys[0][1].upper() == "INTEGER":
+        return primary_keys[0][0]
+    return None
+
+
+def _existing_indexes(conn: sqlite3.Connection, table: str) -> list[tuple]:
+    indexes = []
+    for row in conn.execute(f'PRAGMA index_list("{table}")'):
+        indexes.append(tuple(info[2] for info in conn.execute(f'PRAGMA index_info("{row[1]}")')))
+    return indexes
+
+
+def analyze_query(conn: sqlite3.Connection, sql: str) -> dict:
+    """
+    Works out how one query uses each table: columns compared for equality (including
+    join keys), range predicates, ORDER BY / GROUP BY columns and every column read.
+    Column reads come from the SQLite authorizer while the query is compiled, so they
+    are exact; predicates are found with a light pattern match over the SQL.
+    """
+    reads = {}
+
+    def authorize(action, table, column, db_name, trigger):
+        if action == sqlite3.SQLITE_READ and table and column:
+            reads.setdefault(table, set()).add(column)
+        return sqlite3.SQLITE_OK
+
+    conn.set_authorizer(authorize)
+    try:
+        plan = [row[3] for row in conn.execute(f"EXPLAIN QUERY PLAN {sql}")]
+    finally:
+        conn.set_authorizer(None)
+
+    aliases = sql_guard.table_aliases(sql)
+
+    def resolve(reference):
+        if "." in reference:
+            alias, column = reference.split(".", 1)
+            table = aliases.get(alias)
+            return (table, column) if table in reads and column in reads[table] else None
+        owners = [table for table, columns in reads.items() if reference in columns]
+        return (owners[0], reference) if len(owners) == 1 else None
+
+    usage = {table: {"equality": [], "range": [], "order": [], "columns": columns} for table, columns in reads.items()}
+
+    def add(kind, resolved):
+        if resolved and resolved[1] not in usage[resolved[0]][kind]:
+            usage[resolved[0]][kind].append(resolved[1])
+
+    stripped = sql_guard._strip_literals(sql)
+    for left, operator, right in _COMPARISON.findall(stripped):
+        operator = operator.lower()
+        kind = "equality" if operator in _EQUALITY_OPERATORS else "range" if operator in _RANGE_OPERATORS else None
+        if not kind:
+            continue
+        add(kind, resolve(left))
+        if right and right.lower() not in _CONSTANT_WORDS:
+            add(kind, resolve(right)) # Join: both sides are lookup keys
+    for clause in _ORDER_OR_GROUP.findall(stripped):
+        for term in clause.split(","):
+            words = term.split()
+            if words:
+                add("order", resolve(words[0]))
+    return {"plan": plan, "tables": usage}
+
+
+def propose_indexes(conn: sqlite3.Connection, sql: str, max_columns: int) -> list[tuple[str, tuple]]:
+    """Candidate (table, columns) indexes for one query: lookup keys first, then a range or sort key, then covering columns."""
+    candidates = []
+    for table, use in analyze_query(conn, sql)["tables"].items():
+        # The rowid is implicitly part of every index; candidates the planner ignores are dropped by the what-if step
+        rowid = _rowid_column(conn, table)
+        key = [column for column in use["equality"] if column != rowid]
+        ranges = [column for column in use["range"] if column != rowid and column not in key]
+        if ranges:
+            key.append(ranges[0])
+        else:
+            key += [column for column in use["order"] if column != rowid and column not in key]
+        if not key:
+            continue
+        covering = sorted(use["columns"] - set(key) - {rowid})
+        columns = tuple(key + covering) if len(key) + len(covering) <= max_columns else tuple(key[:max_columns])
+        if any(existing[:len(columns)] == columns for existing in _existing_indexes(conn, table)):
+            continue
+        candidates.append((table, columns))
+    return candidates
+
+
+def index_name(table: str, columns: tuple) -> str:
+    return f"idx_advisor_{table}_{'_'.join(columns)}"
+
+
+def create_index_sql(table: str, columns: tuple) -> str:
+    column_list = ", ".join(f'"{column}"' for column in columns)
+    return f'CREATE INDEX IF NOT EXISTS "{index_name(table, columns)}" ON "{table}" ({column_list})'
+
+
+def replay(conn: sqlite3.Connection, sql: str, repeat: int) -> float:
+    """Median seconds to run the query and fetch all rows."""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        conn.execute(sql).fetchall()
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Propose (and optionally create) indexes for the recorded SQL workload.")
+    parser.add_argument("--database", default=config.DATABASE_PATH, help="SQLite database (default DATABASE_PATH)")
+    parser.add_argument("--log", default=config.WORKLOAD_LOG_PATH, help="Workload log (default WORKLOAD_LOG_PATH)")
+    parser.add_argument("--top", type=int, default=20, help="Analyze the N queries with the most total time")
+    parser.add_argument("--max-columns", type=int, default=6, help="Widest index to propose, covering columns included")
+    parser.add_argument("--repeat", type=int, default=5, help="Replay runs per query before/after (median)")
+    parser.add_argument("--no-replay", action="store_true", help="Only check query plans, do not time queries")
+    parser.add_argument("--apply", action="store_true", help="Create the useful indexes in the database")
+    args = parser.parse_args()
+
+    if not args.database or not os.path.exists(args.database):
+        print(f"Database not found: {args.database}")
+        return
+    if not os.path.exists(args.log):
+        print(f"Workload log not found: {args.log}. Run some questions first.")
+        return
+
+    # --- 1. Load the workload and propose candidate indexes ---
+    entries = workload.WorkloadLog(args.log).entries(args.top)
+    conn = _connect_read_only(args.database)
+    queries = []
+    candidates = {}
+    for entry in entries:
+        try:
+            proposed = propose_indexes(conn, entry["example_sql"], args.max_columns)
+        except sqlite3.Error as e:
+            print(f"Skipping {entry['fingerprint']} (no longer valid: {e})")
+            continue
+        queries.append(entry)
+        for candidate in proposed:
+            candidates.setdefault(candidate, []).append(entry["fingerprint"])
+    conn.close()
+
+    print(f"{len(queries)} recorded queries analyzed")
+    print(f"{'fingerprint':>16} {'calls':>7} {'total ms':>10}  normalized SQL")
+    for entry in queries:
+        print(f"{entry['fingerprint']:>16} {entry['calls']:7d} {entry['total_seconds'] * 1000:10.1f}  "
+              f"{entry['normalized_sql'][:90]}")
+
+    # A candidate that is a prefix of a wider one on the same table is served by the wider one
+    for table, columns in list(candidates):
+        for other_table, other_columns in candidates:
+            if (other_table == table and len(other_columns) > len(columns)
+                    and other_columns[:len(columns)] == columns):
+                candidates[(other_table, other_columns)] += candidates.pop((table, columns))
+                break
+    if not candidates:
+        print("\nNo index suggestions: every recorded query already uses an index or has no usable predicate.")
+        return
+
+    # --- 2. What-if on a scratch copy: time, create all candidates, keep the ones the planner uses ---
+    fd, scratch_path = tempfile.mkstemp(suffix=".db", prefix="index_advisor_")
+    os.close(fd)
+    try:
+        source = _connect_read_only(args.database)
+        scratch = sqlite3.connect(scratch_path)
+        source.backup(scratch)
+        source.close()
+
+        before = {} if args.no_replay else {e["fingerprint"]: replay(scratch, e["example_sql"], args.repeat)
+                                            for e in queries}
+        for table, columns in candidates:
+            scratch.execute(create_index_sql(table, columns))
+        used = {}
+        plans = {}
+        for entry in queries:
+            plans[entry["fingerprint"]] = [row[3] for row in scratch.execute(f"EXPLAIN QUERY PLAN {entry['example_sql']}")]
+        for candidate, fingerprints in candidates.items():
+            name = index_name(*candidate)
+            helped = [fp for fp in fingerprints if any(name in step for step in plans[fp])]
+            if helped:
+                used[candidate] = helped
+            else:
+                scratch.execute(f'DROP INDEX "{name}"')
+        after = {} if args.no_replay else {e["fingerprint"]: replay(scratch, e["example_sql"], args.repeat)
+                                           for e in queries}
+        scratch.close()
+    finally:
+        os.remove(scratch_path)
+
+    # --- 3. Report ---
+    if not used:
+        print("\nNo candidate index was picked by the query planner; nothing to suggest.")
+        return
+    print(f"\nSuggested indexes ({len(used)} of {len(candidates)} candidates used by the planner):")
+    calls = {entry["fingerprint"]: entry["calls"] for entry in queries}
+    for (table, columns), fingerprints in used.items():
+        print(f"  {create_index_sql(table, columns)};")
+        for fp in fingerprints:
+            timing = "" if args.no_replay else (f"  {before[fp] * 1000:.2f} ms -> {after[fp] * 1000:.2f} ms "
+                                                f"({before[fp] / max(after[fp], 1e-9):.1f}x)")
+            print(f"      {fp} x{calls[fp]}{timing}")
+    if not args.no_replay:
+        weighted_before = sum(before[fp] * calls[fp] for fp in before)
+        weighted_after = sum(after[fp] * calls[fp] for fp in after)
+        print(f"\nReplayed workload (weighted by calls): {weighted_before * 1000:.1f} ms -> "
+              f"{weighted_after * 1000:.1f} ms ({weighted_before / max(weighted_after, 1e-9):.1f}x)")
+
+    if args.apply:
+        conn = sqlite3.connect(args.database)
+        try:
+            for table, columns in used:
+                conn.execute(create_index_sql(table, columns))
+            conn.execute("ANALYZE")
+            conn.commit()
+        finally:
+            conn.close()
+        print(f"\nCreated {len(used)} index(es) in {args.database}.")
+    else:
+        print("\nRun with --apply to create them.")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,17 +1,28 @@
+import argparse
 import sqlite3
 import os
-from datetime import datetime, timedelta
+import random
+import time
+from datetime import date, datetime, timedelta
 import json
 
 # Get database path from config (or define directly for setup script)
 DATABASE_PATH = "../data/mydatabase.db"
-os.makedirs(os.path.dirname(DATABASE_PATH), exist_ok=True)
 
-def create_database():
+STATES = ["CA", "NY", "TX"]
+FIRST_NAMES = ["Alice", "Bob", "Charlie", "David", "Eve", "Frank", "Grace", "Heidi", "Ivan", "Judy",
+               "Mallory", "Niaj", "Olivia", "Peggy", "Rupert", "Sybil", "Trent", "Victor", "Walter", "Yvonne"]
+LAST_NAMES = ["Smith", "Johnson", "Brown", "Davis", "Williams", "Miller", "Wilson", "Moore", "Taylor", "Anderson",
+              "Thomas", "Jackson", "White", "Harris", "Martin", "Thompson", "Garcia", "Martinez", "Robinson", "Clark"]
+
+def create_database(database_path: str = DATABASE_PATH):
     """Creates the SQLite database and tables."""
+    directory = os.path.dirname(database_path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
     conn = None
     try:
-        conn = sqlite3.connect(DATABASE_PATH)
+        conn = sqlite3.connect(database_path)
         cursor = conn.cursor()
 
         # Create customers table
@@ -42,11 +53,11 @@ def create_database():
         if conn:
             conn.close()
 
-def insert_dummy_data():
+def insert_dummy_data(database_path: str = DATABASE_PATH):
     """Inserts dummy data into the tables."""
     conn = None
     try:
-        conn = sqlite3.connect(DATABASE_PATH)
+        conn = sqlite3.connect(database_path)
         cursor = conn.cursor()
 
         # Insert customers
@@ -81,6 +92,84 @@ def insert_dummy_data():
         if conn:
             conn.close()
 
+def _chunks(rows, size: int):
+    """Yields lists of up to `size` rows from a row generator, so memory stays flat at any scale."""
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+def generate_data(database_path: str, customers: int, orders: int, start_date: date, days: int,
+                  seed: int = 0, batch_size: int = 50000):
+    """
+    Fills the tables with synthetic data at the given scale: `customers` customers
+    spread over the mapped states and `orders` orders over `days` days from
+    `start_date`, with skewed per-customer order counts and amounts. The same
+    arguments always produce the same database. Rows are bulk inserted with
+    executemany in one transaction (journal and fsync off while loading).
+    """
+    rng = random.Random(seed)
+    dates = [(start_date + timedelta(days=d)).isoformat() for d in range(days)]
+
+    def customer_rows():
+        for customer_id in range(1, customers + 1):
+            name = f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}"
+            yield (customer_id, name, rng.choice(STATES))
+
+    def order_rows():
+        for _ in range(orders):
+            # Squaring skews activity towards low ids: a few customers place most orders, as in real sales data
+            customer_id = int(customers * rng.random() ** 2) + 1
+            amount = round(min(5000.0, rng.lognormvariate(4.0, 0.9)), 2)
+            yield (customer_id, rng.choice(dates), amount)
+
+    conn = sqlite3.connect(database_path, isolation_level=None)
+    try:
+        conn.execute("PRAGMA journal_mode=MEMORY")
+        conn.execute("PRAGMA synchronous=OFF")
+        conn.execute("BEGIN")
+        for chunk in _chunks(customer_rows(), batch_size):
+            conn.executemany('INSERT INTO customers (customer_id, name, state) VALUES (?, ?, ?)', chunk)
+        inserted = 0
+        started = time.perf_counter()
+        for chunk in _chunks(order_rows(), batch_size):
+            conn.executemany('INSERT INTO orders (customer_id, order_date, amount) VALUES (?, ?, ?)', chunk)
+            inserted += len(chunk)
+            if inserted % (batch_size * 20) == 0:
+                print(f"  {inserted:,} / {orders:,} orders ({inserted / (time.perf_counter() - started):,.0f} rows/s)")
+        conn.execute("COMMIT")
+        conn.execute("ANALYZE") # Row estimates for the SQL guard and the query planner
+    finally:
+        conn.close()
+    print(f"Generated {customers:,} customers and {orders:,} orders.")
+
 if __name__ == "__main__":
-    create_database()
-    insert_dummy_data()
\ No newline at end of file
+    parser = argparse.ArgumentParser(
+        description="Create the sample database. Without --orders, inserts the 5-customer / 20-order dummy data; "
+                    "with it, generates synthetic data at that scale (e.g. --orders 1000 up to --orders 50000000)."
+    )
+    parser.add_argument("--database", default=DATABASE_PATH, help="SQLite file to create")
+    parser.add_argument("--orders", type=int, help="Number of synthetic orders to generate")
+    parser.add_argument("--customers", type=int, help="Number of synthetic customers (default: orders / 10)")
+    parser.add_argument("--start-date", default="2023-01-01", help="First order date of the synthetic data")
+    parser.add_argument("--days", type=int, default=730, help="Days of order history in the synthetic data")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--batch-size", type=int, default=50000, help="Rows per executemany call")
+    parser.add_argument("--force", action="store_true", help="Delete an existing database file first")
+    args = parser.parse_args()
+
+    if args.force and os.path.exists(args.database):
+        os.remove(args.database)
+    if args.orders is None:
+        create_database(args.database)
+        insert_dummy_data(args.database)
+    else:
+        if os.path.exists(args.database):
+            parser.error(f"{args.database} already exists; pass --force to replace it")
+        create_database(args.database)
+        generate_data(args.database, args.customers or max(5, args.orders // 10), args.orders,
+                      date.fromisoformat(args.start_date), args.days, args.seed, args.batch_size)
@@ -1,90 +1,310 @@
-import chromadb
-from chromadb.utils import embedding_functions
+import itertools
+import logging
+import os
+import sqlite3
+import threading
+import time
 import config
 import llm_service # To use the embedding model defined there
+import row_format
+import tracing
+from vector_store import ChromaVectorStore, InMemoryVectorStore, VectorStore
 
+logger = logging.getLogger(__name__)
 
 
-client = chromadb.PersistentClient(path=config.CHROMA_DB_PATH)
+# The store is created on first use, so importing this module has no side effects.
+# VECTOR_BACKEND selects "chroma" (persistent, default) or "memory" (process-local).
+_store = None
+_store_failed = False
+_store_lock = threading.Lock()
 
-try:
-    collection = client.get_or_create_collection(name="sql_results")
 
-except Exception as e:
-    print(f"Error initializing ChromaDB collection: {e}")
-    collection = None # Indicate failure
+def get_store() -> VectorStore | None:
+    """Returns the configured vector store, creating it on first use (None if that failed)."""
+    global _store, _store_failed
+    if _store is None and not _store_failed:
+        with _store_lock:
+            if _store is None and not _store_failed:
+                try:
+                    if config.VECTOR_BACKEND == "memory":
+                        _store = InMemoryVectorStore(hnsw_threshold=config.VECTOR_HNSW_THRESHOLD)
+                    else:
+                        _store = ChromaVectorStore(
+                            config.CHROMA_DB_PATH, "sql_results",
+                            scoped_fetch_max_rows=config.VECTOR_SCOPED_FETCH_MAX_ROWS
+                        )
+                except Exception as e:
+                    logger.error("Error initializing vector store (%s): %s", config.VECTOR_BACKEND, e)
+                    _store_failed = True # Indicate failure
+    return _store
+
+
+# --- Result set registry ---
+# One row per stored result set (query_id, creation time, row count), kept next to
+# the Chroma data so garbage collection never has to scan the collection itself.
+# The in-memory backend keeps its registry in memory too.
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def _get_registry() -> sqlite3.Connection:
+    global _registry
+    if _registry is None:
+        if config.VECTOR_BACKEND == "memory":
+            path = ":memory:"
+        else:
+            os.makedirs(config.CHROMA_DB_PATH or ".", exist_ok=True)
+            path = os.path.join(config.CHROMA_DB_PATH or ".", "result_sets.db")
+        registry = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        registry.execute('''
+            CREATE TABLE IF NOT EXISTS result_sets (
+                query_id TEXT PRIMARY KEY,
+                created_at REAL NOT NULL,
+                row_count INTEGER NOT NULL,
+                row_span INTEGER NOT NULL
+            )
+        ''')
+        registry.execute("CREATE INDEX IF NOT EXISTS idx_result_sets_created_at ON result_sets(created_at)")
+        _registry = registry
+    return _registry
+
+
+def _register_result_set(query_id: str, created_at: float, row_count: int, row_span: int):
+    # row_count = rows actually stored; row_span = document indexes used (failed embeddings leave gaps)
+    with _registry_lock:
+        _get_registry().execute(
+            "INSERT OR REPLACE INTO result_sets (query_id, created_at, row_count, row_span) VALUES (?, ?, ?, ?)",
+            (query_id, created_at, row_count, row_span)
+        )
+
+
+def _row_id(query_id: str, row_index: int) -> str:
+    return f"query_{query_id}_row_{row_index}"
+
+
+def _result_set_row_ids(query_id: str) -> list[str] | None:
+    """Ids of one registered result set's rows, or None if it is not registered."""
+    with _registry_lock:
+        registered = _get_registry().execute(
+            "SELECT row_span FROM result_sets WHERE query_id = ?", (query_id,)
+        ).fetchone()
+    return [_row_id(query_id, i) for i in range(registered[0])] if registered else None
 
 
 def add_results_to_vector_db(results, column_names, query_id):
     """
     Adds SQL results to the vector database.
-    Each row, potentially formatted with column names, becomes a document.
+    Rows are serialized with the configured row format and grouped into documents
+    of VECTOR_ROWS_PER_CHUNK rows, each of which gets one embedding.
     """
-    if not collection or not results or not column_names:
-        print("No collection, results, or column names to add to vector DB.")
+    if not results:
+        logger.warning("No collection, results, or column names to add to vector DB.")
         return
+    add_result_batches([results], column_names, query_id)
 
-    documents = []
-    metadatas = []
-    ids = []
 
-    for i, row in enumerate(results):
-        # Format row data with column names
-        row_text = ", ".join([f"{col}: {val}" for col, val in zip(column_names, row)])
-        document = f"SQL Result (Query ID: {query_id}, Row {i+1}): {row_text}"
-        documents.append(document)
-        metadatas.append({"query_id": query_id, "row_index": i})
-        ids.append(f"query_{query_id}_row_{i}")
+def add_result_batches(batches, column_names, query_id, formatter: row_format.RowFormatter | None = None) -> int:
+    """
+    Adds SQL results to the vector database one batch of rows at a time.
+    `batches` is any iterable of row lists (e.g. a database_service.QueryResultStream),
+    so only one batch of rows, documents and embeddings is held in memory at once.
+    `formatter` defaults to row_format.from_config(column_names). Returns the number
+    of rows stored.
+    """
+    store = get_store()
+    if not store or not column_names:
+        logger.warning("No collection, results, or column names to add to vector DB.")
+        return 0
 
-    # Generate embeddings for the documents
-    embeddings = [llm_service.embed_text(doc) for doc in documents]
-    # Filter out any failed embeddings
-    valid_embeddings = [e for e in embeddings if e is not None]
-    valid_documents = [d for d, e in zip(documents, embeddings) if e is not None]
-    valid_metadatas = [m for m, e in zip(metadatas, embeddings) if e is not None]
-    valid_ids = [id for id, e in zip(ids, embeddings) if e is not None]
+    formatter = formatter or row_format.from_config(column_names)
+    with tracing.span("vector.add", backend=config.VECTOR_BACKEND, format=formatter.format,
+                      rows_per_chunk=config.VECTOR_ROWS_PER_CHUNK) as span:
+        added, row_count, documents, characters = _add_batches(store, batches, formatter, query_id)
+        span.set(rows=row_count, stored=added, documents=documents, chars=characters)
+    return added
 
 
-    if valid_embeddings:
-        try:
-            collection.add(
-                embeddings=valid_embeddings,
-                documents=valid_documents,
-                metadatas=valid_metadatas,
-                ids=valid_ids
-            )
-            print(f"Added {len(valid_embeddings)} documents to vector DB for query ID {query_id}.")
-        except Exception as e:
-            print(f"Error adding documents to ChromaDB: {e}")
-    else:
-        print("No valid embeddings generated to add to vector DB.")
+def _add_batches(store: VectorStore, batches, formatter: row_format.RowFormatter, query_id) -> tuple[int, int, int, int]:
+    added = 0
+    row_count = 0
+    document_count = 0
+    characters = 0
+    created_at = time.time()
+    # Documents embedded and written per round trip; bounds memory like the fetch batches do
+    documents_per_write = max(1, config.QUERY_FETCH_BATCH_SIZE)
+    # Chunks stay under the embedding input limit (~4 characters per token)
+    max_chars = config.VECTOR_CHUNK_MAX_TOKENS * 4 if config.VECTOR_CHUNK_MAX_TOKENS > 0 else None
+    chunks = row_format.chunk_blocks(batches, formatter, max(1, config.VECTOR_ROWS_PER_CHUNK), max_chars)
+
+    while True:
+        pending = list(itertools.islice(chunks, documents_per_write))
+        if not pending:
+            break
+        documents = []
+        metadatas = []
+        ids = []
+        row_counts = []
+        for start, rows, document in pending:
+            documents.append(document)
+            metadatas.append({"query_id": query_id, "row_index": start, "rows": rows, "created_at": created_at})
+            ids.append(_row_id(query_id, document_count))
+            row_counts.append(rows)
+            document_count += 1
+            row_count += rows
+            characters += len(document)
 
+        # Generate embeddings for the documents
+        embeddings = llm_service.embed_texts(documents)
+        # Filter out any failed embeddings
+        valid = [i for i, e in enumerate(embeddings) if e is not None]
 
-def retrieve_data_from_vector_db(query_text: str, n_results: int = 5):
+        if valid:
+            try:
+                with tracing.span("vector.write", documents=len(valid)):
+                    store.add(
+                        embeddings=[embeddings[i] for i in valid],
+                        documents=[documents[i] for i in valid],
+                        metadatas=[metadatas[i] for i in valid],
+                        ids=[ids[i] for i in valid]
+                    )
+                added += sum(row_counts[i] for i in valid)
+            except Exception as e:
+                logger.error("Error adding documents to vector DB: %s", e)
+
+    if added:
+        _register_result_set(query_id, created_at, added, document_count)
+        logger.info("Added %d rows in %d documents to vector DB for query ID %s.", added, document_count, query_id)
+    elif row_count:
+        logger.warning("No valid embeddings generated to add to vector DB.")
+    return added, row_count, document_count, characters
+
+
+def retrieve_data_from_vector_db(query_text: str, n_results: int = 5, query_id: str | None = None,
+                                 query_embedding: list[float] | None = None):
     """
     Retrieves relevant data from the vector database based on a query.
+    With `query_id`, only rows stored for that query's result set are searched,
+    so older result sets neither slow the search down nor leak into the answer.
+    `query_embedding`, if already computed for `query_text`, skips embedding it again.
     """
-    if not collection:
-        print("ChromaDB collection not initialized.")
+    store = get_store()
+    if not store:
+        logger.error("Vector DB not initialized.")
         return []
 
-    query_embedding = llm_service.embed_text(query_text)
+    if query_embedding is None:
+        query_embedding = llm_service.embed_text(query_text)
     if not query_embedding:
-        print("Failed to generate embedding for retrieval query.")
+        logger.error("Failed to generate embedding for retrieval query.")
         return []
 
     try:
-        results = collection.query(
-            query_embeddings=[query_embedding],
-            n_results=n_results
-         
-        )
-        # extracting documents
-        retrieved_documents = results.get('documents', [[]])[0] if results else []
-        print(f"Retrieved {len(retrieved_documents)} documents from vector DB.")
-        # print(f"Retrieved Docs: {retrieved_documents}") 
+        with tracing.span("vector.query", n_results=n_results, scoped=bool(query_id)) as span:
+            if query_id:
+                row_ids = _result_set_row_ids(query_id)
+                retrieved_documents = store.query_result_set(query_id, row_ids, query_embedding, n_results) if row_ids else []
+            else:
+                retrieved_documents = store.query(query_embedding, n_results)
+            span.set(returned=len(retrieved_documents))
+        logger.info("Retrieved %d documents from vector DB.", len(retrieved_documents))
         return retrieved_documents
 
     except Exception as e:
-        print(f"Error querying ChromaDB: {e}")
-        return []
\ No newline at end of file
+        logger.error("Error querying vector DB: %s", e)
+        return []
+
+
+# --- Garbage collection ---
+def delete_result_set(query_id: str):
+    """Removes one result set's rows from the store and the registry."""
+    get_store().delete_result_set(query_id, _result_set_row_ids(query_id))
+    with _registry_lock:
+        _get_registry().execute("DELETE FROM result_sets WHERE query_id = ?", (query_id,))
+
+
+def collect_garbage(ttl_seconds: float | None = None, max_rows: int | None = None) -> dict:
+    """
+    Deletes result sets older than `ttl_seconds`, then the oldest remaining sets
+    until at most `max_rows` rows are stored. Defaults come from
+    VECTOR_RESULT_TTL_SECONDS and VECTOR_MAX_ROWS. Returns what was removed.
+    """
+    if not get_store():
+        return {"result_sets": 0, "rows": 0}
+    ttl_seconds = config.VECTOR_RESULT_TTL_SECONDS if ttl_seconds is None else ttl_seconds
+    max_rows = config.VECTOR_MAX_ROWS if max_rows is None else max_rows
+
+    with _registry_lock:
+        result_sets = _get_registry().execute(
+            "SELECT query_id, created_at, row_count FROM result_sets ORDER BY created_at"
+        ).fetchall()
+
+    cutoff = time.time() - ttl_seconds
+    stored_rows = sum(row_count for _, _, row_count in result_sets)
+    removed_sets = 0
+    removed_rows = 0
+    for query_id, created_at, row_count in result_sets:
+        if created_at >= cutoff and stored_rows <= max_rows:
+            break # Sorted oldest first: everything after is newer and within budget
+        try:
+            delete_result_set(query_id)
+        except Exception as e:
+            logger.error("Error deleting result set %s from vector DB: %s", query_id, e)
+            continue
+        stored_rows -= row_count
+        removed_sets += 1
+        removed_rows += row_count
+    if removed_sets:
+        logger.info("Vector DB garbage collection removed %d result sets (%d rows).", removed_sets, removed_rows)
+    return {"result_sets": removed_sets, "rows": removed_rows}
+
+
+def compact(page_size: int = 5000) -> dict:
+    """
+    Runs garbage collection, then deletes rows whose result set is not in the
+    registry (e.g. rows stored before the registry existed or left behind by an
+    interrupted write). Scans the whole store, so run it offline.
+    """
+    removed = collect_garbage()
+    store = get_store()
+    if not store:
+        return removed
+    with _registry_lock:
+        known = {query_id for (query_id,) in _get_registry().execute("SELECT query_id FROM result_sets")}
+
+    orphan_ids = []
+    orphan_sets = set()
+    for row_id, metadata in store.iter_metadata(page_size):
+        query_id = (metadata or {}).get("query_id")
+        if query_id not in known:
+            orphan_ids.append(row_id)
+            orphan_sets.add(query_id)
+
+    for start in range(0, len(orphan_ids), page_size):
+        store.delete(orphan_ids[start:start + page_size])
+    with _registry_lock:
+        _get_registry().execute("VACUUM")
+    logger.info("Compaction removed %d orphaned result sets (%d rows).", len(orphan_sets), len(orphan_ids))
+    return {**removed, "orphaned_result_sets": len(orphan_sets), "orphaned_rows": len(orphan_ids)}
+
+
+_gc_thread = None
+
+
+def start_background_gc(interval_seconds: float | None = None):
+    """Runs collect_garbage every `interval_seconds` on a daemon thread (once per process)."""
+    global _gc_thread
+    interval_seconds = config.VECTOR_GC_INTERVAL_SECONDS if interval_seconds is None else interval_seconds
+    if interval_seconds <= 0 or _gc_thread is not None:
+        return
+
+    def run():
+        while True:
+            time.sleep(interval_seconds)
+            try:
+                collect_garbage()
+            except Exception as e:
+                logger.error("Vector DB garbage collection failed: %s", e)
+
+    _gc_thread = threading.Thread(target=run, name="vector-db-gc", daemon=True)
+    _gc_thread.start()
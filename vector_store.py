@@ -0,0 +1,256 @@
+import threading
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    import numpy as np
+
+# numpy and hnswlib are imported on first use, so importing the service layer stays cheap
+_hnswlib = False # Not looked up yet; None once known to be missing
+
+
+def _load_hnswlib():
+    global _hnswlib
+    if _hnswlib is False:
+        try:
+            import hnswlib # Optional: approximate index for large in-memory result sets
+        except ImportError:
+            hnswlib = None
+        _hnswlib = hnswlib
+    return _hnswlib
+
+
+class VectorStore:
+    """
+    Storage interface used by vector_db_service.
+    Rows belong to result sets identified by the "query_id" metadata entry; a
+    result set's row ids are known to the caller, which lets backends look a set
+    up directly instead of filtering the whole store.
+    """
+
+    def add(self, ids: list[str], embeddings: list[list[float]], documents: list[str], metadatas: list[dict]):
+        raise NotImplementedError
+
+    def query_result_set(self, query_id: str, row_ids: list[str], query_embedding, n_results: int) -> list[str]:
+        """Documents of the `n_results` rows of one result set nearest to `query_embedding`."""
+        raise NotImplementedError
+
+    def query(self, query_embedding, n_results: int) -> list[str]:
+        """Nearest documents across everything stored."""
+        raise NotImplementedError
+
+    def delete_result_set(self, query_id: str, row_ids: list[str] | None = None):
+        raise NotImplementedError
+
+    def delete(self, ids: list[str]):
+        raise NotImplementedError
+
+    def iter_metadata(self, page_size: int = 5000):
+        """Yields (id, metadata) for every stored row; used for offline compaction."""
+        raise NotImplementedError
+
+    def count(self) -> int:
+        raise NotImplementedError
+
+
+class ChromaVectorStore(VectorStore):
+    """Persistent backend on a chromadb.PersistentClient collection."""
+
+    def __init__(self, path: str, collection_name: str = "sql_results", scoped_fetch_max_rows: int = 10000):
+        import chromadb # Imported here so the in-memory backend never pays for it
+        self.client = chromadb.PersistentClient(path=path)
+        self.collection = self.client.get_or_create_collection(name=collection_name)
+        self.scoped_fetch_max_rows = scoped_fetch_max_rows
+
+    def add(self, ids, embeddings, documents, metadatas):
+        self.collection.add(embeddings=embeddings, documents=documents, metadatas=metadatas, ids=ids)
+
+    def query_result_set(self, query_id, row_ids, query_embedding, n_results):
+        # Chroma's `where` filter cost grows with everything stored in the collection, so
+        # smaller result sets are fetched by id (a primary-key lookup) and ranked here by
+        # squared L2 distance, the collection's default metric.
+        if len(row_ids) > self.scoped_fetch_max_rows:
+            results = self.collection.query(
+                query_embeddings=[query_embedding], n_results=n_results, where={"query_id": query_id}
+            )
+            return results.get('documents', [[]])[0] if results else []
+
+        rows = self.collection.get(ids=row_ids, include=["embeddings", "documents"])
+        documents = rows.get("documents") or []
+        if not documents:
+            return []
+        import numpy as np
+        embeddings = np.asarray(rows["embeddings"], dtype=np.float32)
+        distances = ((embeddings - np.asarray(query_embedding, dtype=np.float32)) ** 2).sum(axis=1)
+        k = min(n_results, len(documents))
+        nearest = np.argpartition(distances, k - 1)[:k]
+        return [documents[i] for i in nearest[np.argsort(distances[nearest])]]
+
+    def query(self, query_embedding, n_results):
+        results = self.collection.query(query_embeddings=[query_embedding], n_results=n_results)
+        return results.get('documents', [[]])[0] if results else []
+
+    def delete_result_set(self, query_id, row_ids=None):
+        if row_ids:
+            self.collection.delete(ids=row_ids)
+        else:
+            self.collection.delete(where={"query_id": query_id})
+
+    def delete(self, ids):
+        self.collection.delete(ids=ids)
+
+    def iter_metadata(self, page_size=5000):
+        offset = 0
+        while True:
+            page = self.collection.get(include=["metadatas"], limit=page_size, offset=offset)
+            ids = page.get("ids") or []
+            if not ids:
+                return
+            yield from zip(ids, page.get("metadatas") or [{}] * len(ids))
+            offset += len(ids)
+
+    def count(self):
+        return self.collection.count()
+
+
+class _MatrixIndex:
+    """
+    Vectors of one result set in a contiguous float32 matrix (rows L2-normalized,
+    capacity doubled as it grows) with exact cosine top-k. Once the set reaches
+    `hnsw_threshold` rows and hnswlib is installed, an HNSW index takes over queries.
+    """
+
+    def __init__(self, dim: int, hnsw_threshold: int):
+        self.dim = dim
+        self.hnsw_threshold = hnsw_threshold
+        self.size = 0
+        self.ids = []
+        self.documents = []
+        self.metadatas = []
+        import numpy as np
+        self._matrix = np.empty((16, dim), dtype=np.float32)
+        self._hnsw = None
+
+    def add(self, vectors: "np.ndarray", ids, documents, metadatas):
+        import numpy as np
+        needed = self.size + len(vectors)
+        if needed > len(self._matrix):
+            grown = np.empty((max(needed, 2 * len(self._matrix)), self.dim), dtype=np.float32)
+            grown[:self.size] = self._matrix[:self.size]
+            self._matrix = grown
+        self._matrix[self.size:needed] = vectors
+        labels = np.arange(self.size, needed)
+        self.size = needed
+        self.ids.extend(ids)
+        self.documents.extend(documents)
+        self.metadatas.extend(metadatas)
+
+        if self._hnsw is not None:
+            if self.size > self._hnsw.get_max_elements():
+                self._hnsw.resize_index(2 * self.size)
+            self._hnsw.add_items(vectors, labels)
+        elif self.size >= self.hnsw_threshold and (hnswlib := _load_hnswlib()) is not None:
+            self._hnsw = hnswlib.Index(space="ip", dim=self.dim) # Inner product of unit vectors = cosine
+            self._hnsw.init_index(max_elements=2 * self.size, ef_construction=100, M=16)
+            self._hnsw.add_items(self._matrix[:self.size], np.arange(self.size))
+            self._hnsw.set_ef(64)
+
+    def search(self, query_vector: "np.ndarray", k: int) -> list[tuple[float, int]]:
+        """(cosine similarity, row position) pairs, best first."""
+        import numpy as np
+        k = min(k, self.size)
+        if k <= 0:
+            return []
+        if self._hnsw is not None:
+            self._hnsw.set_ef(max(64, k))
+            labels, distances = self._hnsw.knn_query(query_vector, k=k)
+            return [(1.0 - float(d), int(label)) for label, d in zip(labels[0], distances[0])]
+        scores = self._matrix[:self.size] @ query_vector
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(float(scores[i]), int(i)) for i in top]
+
+
+def _unit_rows(embeddings) -> "np.ndarray":
+    import numpy as np
+    vectors = np.asarray(embeddings, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+class InMemoryVectorStore(VectorStore):
+    """
+    Process-local backend for ephemeral per-question result sets: no persistence,
+    no client, one _MatrixIndex per result set so scoped queries only touch that set.
+    """
+
+    def __init__(self, hnsw_threshold: int = 20000):
+        self.hnsw_threshold = hnsw_threshold
+        self._sets = {} # query_id -> _MatrixIndex
+        self._lock = threading.RLock()
+
+    def add(self, ids, embeddings, documents, metadatas):
+        vectors = _unit_rows(embeddings)
+        groups = {}
+        for position, metadata in enumerate(metadatas):
+            groups.setdefault((metadata or {}).get("query_id"), []).append(position)
+        with self._lock:
+            for query_id, positions in groups.items():
+                index = self._sets.get(query_id)
+                if index is None:
+                    index = self._sets[query_id] = _MatrixIndex(vectors.shape[1], self.hnsw_threshold)
+                index.add(
+                    vectors[positions],
+                    [ids[p] for p in positions],
+                    [documents[p] for p in positions],
+                    [metadatas[p] for p in positions],
+                )
+
+    def query_result_set(self, query_id, row_ids, query_embedding, n_results):
+        with self._lock:
+            index = self._sets.get(query_id)
+            if index is None:
+                return []
+            return [index.documents[i] for _, i in index.search(_unit_rows(query_embedding), n_results)]
+
+    def query(self, query_embedding, n_results):
+        query_vector = _unit_rows(query_embedding)
+        with self._lock:
+            candidates = [
+                (score, index.documents[i])
+                for index in self._sets.values()
+                for score, i in index.search(query_vector, n_results)
+            ]
+        candidates.sort(key=lambda candidate: candidate[0], reverse=True)
+        return [document for _, document in candidates[:n_results]]
+
+    def delete_result_set(self, query_id, row_ids=None):
+        with self._lock:
+            self._sets.pop(query_id, None)
+
+    def delete(self, ids):
+        doomed = set(ids)
+        with self._lock:
+            for query_id, index in list(self._sets.items()):
+                keep = [i for i, row_id in enumerate(index.ids) if row_id not in doomed]
+                if len(keep) == index.size:
+                    continue
+                del self._sets[query_id]
+                if keep:
+                    rebuilt = _MatrixIndex(index.dim, self.hnsw_threshold)
+                    rebuilt.add(
+                        index._matrix[keep],
+                        [index.ids[i] for i in keep],
+                        [index.documents[i] for i in keep],
+                        [index.metadatas[i] for i in keep],
+                    )
+                    self._sets[query_id] = rebuilt
+
+    def iter_metadata(self, page_size=5000):
+        with self._lock:
+            rows = [(row_id, metadata) for index in self._sets.values() for row_id, metadata in zip(index.ids, index.metadatas)]
+        yield from rows
+
+    def count(self):
+        with self._lock:
+            return sum(index.size for index in self._sets.values())
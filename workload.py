@@ -0,0 +1,150 @@
+import hashlib
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+import config
+
+logger = logging.getLogger(__name__)
+
+# Literals and comments in one pass, so quotes inside comments (and dashes inside strings) are handled
+_LITERAL_OR_COMMENT = re.compile(r"'(?:[^']|'')*'|\"(?:[^\"]|\"\")*\"|--[^\n]*|/\*.*?(?:\*/|$)", re.S)
+_NUMBER = re.compile(r"(?<![\w.])\d+(?:\.\d+)?(?:[eE][-+]?\d+)?\b")
+_IN_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_WHITESPACE = re.compile(r"\s+")
+_OPERATOR_SPACING = re.compile(r"\s*([=<>!,])\s*|(?<=\()\s+|\s+(?=\))")
+
+
+def normalize_sql(sql: str, keep_literals: bool = False) -> str:
+    """
+    Canonical form of a query for grouping: comments dropped, string and numeric
+    literals replaced by ?, IN lists collapsed, whitespace and case folded.
+    Queries that differ only in their constants normalize to the same text.
+    With `keep_literals`, constants are kept verbatim (only layout and keyword
+    case are folded), so the result identifies the exact query, e.g. for caching.
+    """
+    kept = []
+
+    def replace(match):
+        token = match.group(0)
+        if token[0] in "'\"" and keep_literals:
+            # SQLite reads an unknown "quoted identifier" as a string, so both keep their case
+            kept.append(token)
+            return f"\x00{len(kept) - 1}\x00" # Restored after case folding
+        if token[0] == "'":
+            return "?"
+        if token[0] == '"':
+            return token # Quoted identifier
+        return " " # Comment
+
+    sql = _LITERAL_OR_COMMENT.sub(replace, sql)
+    if not keep_literals:
+        sql = _NUMBER.sub("?", sql)
+        sql = _IN_LIST.sub("(?)", sql)
+    sql = _WHITESPACE.sub(" ", sql).strip().rstrip(";").strip()
+    sql = _OPERATOR_SPACING.sub(lambda match: match.group(1) or "", sql)
+    sql = sql.lower()
+    if kept:
+        sql = re.sub("\x00(\\d+)\x00", lambda match: kept[int(match.group(1))], sql)
+    return sql
+
+
+def _fingerprint_normalized(normalized_sql: str) -> str:
+    return hashlib.sha1(normalized_sql.encode("utf-8")).hexdigest()[:16]
+
+
+def fingerprint(sql: str) -> str:
+    """Short stable id of a query's normalized form."""
+    return _fingerprint_normalized(normalize_sql(sql))
+
+
+class WorkloadLog:
+    """
+    Aggregated log of executed SQL stored in SQLite, one row per fingerprint.
+    Keeps the call count, error count, total/max SQLite time, rows returned and
+    the most recent concrete SQL (used to replay the query), so the log stays
+    small however many queries run. Result-cache hits count as calls with no
+    SQLite time.
+    """
+
+    def __init__(self, path: str):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute('''
+            CREATE TABLE IF NOT EXISTS queries (
+                fingerprint TEXT PRIMARY KEY,
+                normalized_sql TEXT NOT NULL,
+                example_sql TEXT NOT NULL,
+                calls INTEGER NOT NULL,
+                errors INTEGER NOT NULL,
+                total_seconds REAL NOT NULL,
+                max_seconds REAL NOT NULL,
+                total_rows INTEGER NOT NULL,
+                first_seen REAL NOT NULL,
+                last_seen REAL NOT NULL
+            )
+        ''')
+
+    def record(self, sql: str, seconds: float, rows: int, failed: bool = False):
+        normalized = normalize_sql(sql)
+        key = _fingerprint_normalized(normalized)
+        now = time.time()
+        with self._lock:
+            self._conn.execute('''
+                INSERT INTO queries VALUES (?, ?, ?, 1, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT(fingerprint) DO UPDATE SET
+                    example_sql = excluded.example_sql,
+                    calls = calls + 1,
+                    errors = errors + excluded.errors,
+                    total_seconds = total_seconds + excluded.total_seconds,
+                    max_seconds = max(max_seconds, excluded.max_seconds),
+                    total_rows = total_rows + excluded.total_rows,
+                    last_seen = excluded.last_seen
+            ''', (key, normalized, sql, int(failed), seconds, seconds, rows, now, now))
+
+    def entries(self, limit: int | None = None) -> list[dict]:
+        """Logged queries, most total SQLite time first."""
+        with self._lock:
+            cursor = self._conn.execute(
+                "SELECT * FROM queries ORDER BY total_seconds DESC LIMIT ?", (-1 if limit is None else limit,)
+            )
+            columns = [description[0] for description in cursor.description]
+            return [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM queries")
+
+
+_log = None
+_log_lock = threading.Lock()
+
+
+def get_log() -> WorkloadLog | None:
+    """Returns the process-wide workload log, or None when recording is disabled."""
+    global _log
+    if not config.WORKLOAD_LOG_ENABLED:
+        return None
+    if _log is None:
+        with _log_lock:
+            if _log is None:
+                _log = WorkloadLog(config.WORKLOAD_LOG_PATH)
+    return _log
+
+
+def record(sql: str, seconds: float, rows: int, failed: bool = False):
+    """Logs one executed query; never raises, recording must not break query execution."""
+    try:
+        log = get_log()
+        if log:
+            log.record(sql, seconds, rows, failed)
+    except Exception as e:
+        logger.warning("Could not record query in workload log: %s", e)